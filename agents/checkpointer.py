@@ -0,0 +1,64 @@
+import threading
+
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.memory import MemorySaver
+
+from agents.workout_store import MAX_THREADS, ThreadLimit
+
+
+# Checkpoints kept per thread. The graph only ever needs the latest one.
+MAX_CHECKPOINTS = 4
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    A MemorySaver that only keeps the latest max_checkpoints checkpoints per
+    thread, and the latest max_threads threads. MemorySaver stores every step
+    of every turn forever, and each of those holds the complete message list.
+
+    Pass a ThreadLimit as threads to evict together with other per-thread
+    state, e.g. the WorkoutStore.
+    """
+
+    def __init__(self, max_checkpoints: int = MAX_CHECKPOINTS, max_threads: int = MAX_THREADS, threads: ThreadLimit | None = None, **kwargs: Any):
+        super().__init__(**kwargs)
+        self.max_checkpoints = max(1, max_checkpoints)
+        self.threads = threads if threads is not None else ThreadLimit(max(1, max_threads))
+        self.max_threads = self.threads.max_threads
+        self.threads.on_evict(self._forget)
+        self._lock = threading.Lock()
+
+    def put(self, config: RunnableConfig, checkpoint, metadata, new_versions) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        with self._lock:
+            result = super().put(config, checkpoint, metadata, new_versions)
+            self._prune(thread_id, config["configurable"]["checkpoint_ns"])
+
+        # Forget the conversations nobody has touched in a while. Outside the
+        # lock, since that calls back into _forget.
+        self.threads.touch(thread_id)
+        return result
+
+    def _forget(self, thread_id: str):
+        with self._lock:
+            self.delete_thread(thread_id)
+
+    def _prune(self, thread_id: str, checkpoint_ns: str):
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        if len(checkpoints) <= self.max_checkpoints:
+            return
+
+        # Checkpoint ids sort in creation order
+        candidates = set()
+        for checkpoint_id in sorted(checkpoints.keys())[:-self.max_checkpoints]:
+            (saved, _, _) = checkpoints.pop(checkpoint_id)
+            candidates.update(self.serde.loads_typed(saved)["channel_versions"].items())
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        # Drop the channel values no remaining checkpoint points to
+        for (saved, _, _) in checkpoints.values():
+            candidates.difference_update(self.serde.loads_typed(saved)["channel_versions"].items())
+        for (channel, version) in candidates:
+            self.blobs.pop((thread_id, checkpoint_ns, channel, version), None)
@@ -0,0 +1,222 @@
+import json
+import threading
+
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+# langchain_core is slow to import. The messages only show up once the graph
+# runs, and it has loaded langchain_core by then.
+if TYPE_CHECKING:
+    from langchain_core.messages import BaseMessage, RemoveMessage, SystemMessage
+
+
+# Tokens the model sees per call. Llama 3.1 has a much bigger context, but
+# every token costs time and money and old turns rarely matter.
+MAX_PROMPT_TOKENS = 2048
+
+# Messages kept in the checkpointer per thread
+MAX_MESSAGES = 100
+
+# Lines in the summary of the dropped turns, and characters per line
+SUMMARY_LINES = 8
+SUMMARY_LINE_LENGTH = 160
+
+
+def approximate_tokens(message: 'BaseMessage') -> int:
+    """
+    Roughly four characters per token plus a few for the message framing.
+    Close enough for a budget. Llama's tokenizer isn't available locally.
+    """
+    content = message.content if isinstance(message.content, str) else json.dumps(message.content)
+    tokens = len(content) // 4 + 4
+    # Only AIMessages have tool calls
+    if getattr(message, 'tool_calls', None):
+        tokens += len(json.dumps(message.tool_calls, default=str)) // 4
+    return tokens
+
+
+class HistoryStats(object):
+
+    def __init__(self):
+        self.calls = 0
+        self.last_prompt_tokens = 0
+        self.last_prompt_messages = 0
+        self.max_prompt_tokens = 0
+        self.dropped_messages = 0
+        self.removed_messages = 0
+        self._lock = threading.Lock()
+
+    def record_prompt(self, tokens: int, messages: int, dropped: int):
+        with self._lock:
+            self.calls += 1
+            self.last_prompt_tokens = tokens
+            self.last_prompt_messages = messages
+            self.max_prompt_tokens = max(self.max_prompt_tokens, tokens)
+            self.dropped_messages += dropped
+
+    def record_removals(self, count: int):
+        with self._lock:
+            self.removed_messages += count
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'calls': self.calls,
+                'last_prompt_tokens': self.last_prompt_tokens,
+                'last_prompt_messages': self.last_prompt_messages,
+                'max_prompt_tokens': self.max_prompt_tokens,
+                'dropped_messages': self.dropped_messages,
+                'removed_messages': self.removed_messages,
+            }
+
+    def __repr__(self) -> str:
+        return f"HistoryStats {self.to_dict()}"
+
+
+class HistoryPolicy(object):
+    """
+    Decides which messages the model sees and which ones the checkpointer keeps.
+
+    prompt() keeps the system prompt, the current turn and the latest turn with
+    a tool exchange, then adds older turns, newest first, while they fit in
+    max_tokens. The tool results of the turns that didn't fit are summarized
+    in one short system message, on top of the budget, so the model still
+    knows what happened.
+
+    removals() returns RemoveMessages for the oldest turns once a thread holds
+    more than max_messages, so memory stays bounded too.
+
+    Both take the thread the messages belong to and keep HistoryStats for
+    each one. Call forget when a thread goes away.
+    """
+
+    def __init__(self, max_tokens: int = MAX_PROMPT_TOKENS, max_messages: int = MAX_MESSAGES, count_tokens: Callable[['BaseMessage'], int] = approximate_tokens):
+        self.max_tokens = max_tokens
+        self.max_messages = max_messages
+        self.count_tokens = count_tokens
+        self._stats: Dict[str | None, HistoryStats] = {}
+        self._lock = threading.Lock()
+
+    def stats(self, thread: str | None = None) -> HistoryStats:
+        """The stats of a thread. Threads without any prompts yet get empty ones."""
+        with self._lock:
+            stats = self._stats.get(thread)
+        return stats if stats is not None else HistoryStats()
+
+    def last_prompt_tokens(self, thread: str | None = None) -> int:
+        """Approximate size of the last prompt for the thread"""
+        return self.stats(thread).last_prompt_tokens
+
+    def forget(self, thread: str | None):
+        with self._lock:
+            self._stats.pop(thread, None)
+
+    def _recorder(self, thread: str | None) -> HistoryStats:
+        with self._lock:
+            stats = self._stats.get(thread)
+            if stats is None:
+                stats = self._stats[thread] = HistoryStats()
+            return stats
+
+    def prompt(self, messages: List['BaseMessage'], thread: str | None = None) -> List['BaseMessage']:
+        """The messages to send to the model"""
+        stats = self._recorder(thread)
+        (system, turns) = self._turns(messages)
+        if len(turns) == 0:
+            stats.record_prompt(sum(self.count_tokens(x) for x in system), len(system), 0)
+            return list(system)
+
+        # These are always kept, even over budget
+        keep = {len(turns) - 1}
+        tool_turn = self._latest_tool_turn(turns)
+        if tool_turn is not None:
+            keep.add(tool_turn)
+
+        used = sum(self.count_tokens(x) for x in system)
+        used += sum(self.count_tokens(x) for index in keep for x in turns[index])
+
+        for index in range(len(turns) - 2, -1, -1):
+            if index in keep:
+                continue
+            cost = sum(self.count_tokens(x) for x in turns[index])
+            if used + cost > self.max_tokens:
+                # Stop at the first turn that doesn't fit so the history has no holes
+                break
+            keep.add(index)
+            used += cost
+
+        dropped = [turn for (index, turn) in enumerate(turns) if index not in keep]
+        prompt = list(system)
+        if len(dropped) > 0:
+            summary = self._summary(dropped)
+            if summary is not None:
+                prompt.append(summary)
+                used += self.count_tokens(summary)
+        for (index, turn) in enumerate(turns):
+            if index in keep:
+                prompt.extend(turn)
+
+        stats.record_prompt(used, len(prompt), sum(len(x) for x in dropped))
+        return prompt
+
+    def removals(self, messages: List['BaseMessage'], thread: str | None = None) -> List['RemoveMessage']:
+        """RemoveMessages for the oldest turns once the thread is over max_messages"""
+        from langchain_core.messages import RemoveMessage
+
+        if len(messages) <= self.max_messages:
+            return []
+
+        (system, turns) = self._turns(messages)
+        excess = len(messages) - self.max_messages
+        removed = []
+        # Whole turns only, so a ToolMessage never loses its tool call. The
+        # current turn always stays.
+        for turn in turns[:-1]:
+            if excess <= 0:
+                break
+            removed.extend(RemoveMessage(id=x.id) for x in turn if x.id is not None)
+            excess -= len(turn)
+
+        self._recorder(thread).record_removals(len(removed))
+        return removed
+
+    @staticmethod
+    def _turns(messages: List['BaseMessage']) -> tuple[List['BaseMessage'], List[List['BaseMessage']]]:
+        """The system messages, and everything else split up by human message"""
+        from langchain_core.messages import HumanMessage, SystemMessage
+
+        system = []
+        turns = []
+        for message in messages:
+            if isinstance(message, SystemMessage):
+                system.append(message)
+            elif isinstance(message, HumanMessage) or len(turns) == 0:
+                turns.append([message])
+            else:
+                turns[-1].append(message)
+        return (system, turns)
+
+    @staticmethod
+    def _latest_tool_turn(turns: List[List['BaseMessage']]) -> int | None:
+        from langchain_core.messages import ToolMessage
+
+        for index in range(len(turns) - 1, -1, -1):
+            if any(isinstance(x, ToolMessage) for x in turns[index]):
+                return index
+        return None
+
+    @staticmethod
+    def _summary(turns: List[List['BaseMessage']]) -> 'SystemMessage | None':
+        from langchain_core.messages import SystemMessage, ToolMessage
+
+        lines = []
+        for turn in turns:
+            for message in turn:
+                if isinstance(message, ToolMessage) and isinstance(message.content, str):
+                    content = ' '.join(message.content.split())
+                    if len(content) > SUMMARY_LINE_LENGTH:
+                        content = content[:SUMMARY_LINE_LENGTH - 3] + '...'
+                    lines.append(f'- {message.name or "tool"}: {content}')
+        if len(lines) == 0:
+            return None
+        lines = lines[-SUMMARY_LINES:]
+        return SystemMessage(content='Summary of the earlier tool results in this conversation:\n' + '\n'.join(lines))
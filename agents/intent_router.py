@@ -0,0 +1,216 @@
+import re
+import threading
+import uuid
+
+from typing import Dict, List
+
+from tools.validation.workout.shorthand import LABELS, PACES, RECOVERIES, TIMES, UNITS, ShorthandParser
+
+
+# Tool names, as defined in PrimaryAgent._define_tools
+GET_NAME = 'get_name'
+SET_NAME = 'set_name'
+PARSE_WORKOUT = 'parse_workout'
+
+_WORKOUT = r"(?:the |this |my |that )?(?:workout|session|run)"
+
+# A pattern has to match before the router acts. The named groups become the
+# tool arguments.
+INTENT_PATTERNS: Dict[str, List[str]] = {
+    GET_NAME: [
+        rf"^(?:what(?:'s| is)|tell me) (?:the )?name of {_WORKOUT}\??$",
+        rf"^(?:what(?:'s| is)) {_WORKOUT}(?:'s)? (?:called|named|name)\??$",
+        rf"^(?:what(?:'s| is)) (?:the |its )?(?:workout'?s? )?name\??$",
+        rf"^does {_WORKOUT} have a name\??$",
+    ],
+    SET_NAME: [
+        rf"^(?:please )?(?:rename|call|name|title) (?:it|{_WORKOUT})(?: to| as)? (?P<name>.+)$",
+        rf"^(?:please )?(?:set|change|update) (?:the |its )?(?:workout'?s? )?name (?:to|as) (?P<name>.+)$",
+        rf"^(?:please )?(?:clear|remove|delete) (?:the |its )?(?:workout'?s? )?name(?P<name>)\.?$",
+    ],
+    PARSE_WORKOUT: [
+        rf"^(?:please )?(?:create|make|build|parse|add|give me) (?:me )?(?:a |an )?(?:new )?(?:workout|session)(?: for| of| from)?[:,]? (?P<input>.+)$",
+    ],
+}
+
+# The keyword model. Each word votes for the intents it suggests, and the
+# router only acts when the votes agree with the pattern that matched.
+INTENT_KEYWORDS: Dict[str, Dict[str, float]] = {
+    GET_NAME: {'what': 1.0, 'whats': 1.0, 'name': 1.0, 'called': 2.0, 'named': 1.5, 'tell': 0.5, 'does': 0.5, 'have': 0.5},
+    SET_NAME: {'rename': 3.0, 'call': 1.5, 'title': 1.0, 'set': 1.0, 'change': 1.0, 'update': 1.0, 'clear': 1.5, 'remove': 1.0, 'delete': 1.0, 'name': 1.0, 'to': 0.5, 'as': 0.5},
+    PARSE_WORKOUT: {
+        'create': 1.5, 'make': 1.0, 'build': 1.0, 'parse': 1.5, 'add': 0.5, 'give': 0.5,
+        'x': 1.0, 'warm': 1.0, 'cool': 1.0, 'mile': 1.0, 'miles': 1.0, 'min': 1.0, 'minutes': 1.0, 'pace': 1.0,
+        'repeat': 1.0, 'rest': 1.0, 'recovery': 1.0, 'jog': 1.0, 'easy': 0.5, 'tempo': 1.0, 'interval': 1.0,
+    },
+}
+
+# Any number in the text is a vote for a workout
+_NUMBER_WEIGHT = 1.0
+
+# parse_workout only takes an argument with a number and one of these, so
+# "make a workout for tomorrow" still goes to the model
+WORKOUT_VOCABULARY = frozenset(
+    {word for word in INTENT_KEYWORDS[PARSE_WORKOUT] if word not in ('create', 'make', 'build', 'parse', 'add', 'give')}
+    | {word for key in (*UNITS, *PACES, *LABELS, *RECOVERIES, *TIMES) for word in re.findall(r"[a-z]+", key)}
+    | {'run', 'runs', 'reps', 'repeats', 'stride', 'strides', 'hill', 'hills', 'fartlek'}
+)
+
+# Figures of speech that look like naming the workout: "call it a day",
+# "name it after my coach", "call it something fun"
+_NOT_NAMES = re.compile(
+    r"^(?:a day|a night|quits|even|off|a wrap|a draw|done|after\b.*|for\b.*|something\b.*|anything\b.*|whatever\b.*|what(?:ever)? you\b.*)$",
+    re.IGNORECASE,
+)
+
+# Names longer than this are more likely to be a sentence
+MAX_NAME_WORDS = 8
+
+# The votes a matching pattern gets
+_PATTERN_WEIGHT = 1.0
+
+# Hedged or compound requests always go to the model
+_HEDGES = re.compile(r"\b(?:not|don't|dont|never|instead|maybe|should|could|would|why|how|and then|also)\b", re.IGNORECASE)
+
+_WORDS = re.compile(r"[a-z]+|\d+(?:\.\d+)?")
+
+# Longer inputs are too likely to mean more than one thing
+MAX_WORDS = 40
+
+
+class Intent(object):
+    """A tool call the router is confident about"""
+
+    def __init__(self, tool: str, args: dict, confidence: float):
+        self.tool = tool
+        self.args = args
+        self.confidence = confidence
+
+    def tool_call(self) -> dict:
+        """The tool call for an AIMessage"""
+        return {'name': self.tool, 'args': self.args, 'id': f'local_{uuid.uuid4().hex}', 'type': 'tool_call'}
+
+    def __repr__(self) -> str:
+        return f"Intent <{self.tool} {self.args} @ {self.confidence:.2f}>"
+
+
+class RouterStats(object):
+
+    def __init__(self):
+        self.routed = {GET_NAME: 0, SET_NAME: 0, PARSE_WORKOUT: 0}
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def record(self, intent: Intent | None):
+        with self._lock:
+            if intent is None:
+                self.fallbacks += 1
+            else:
+                self.routed[intent.tool] = self.routed.get(intent.tool, 0) + 1
+
+    @property
+    def local_rate(self) -> float:
+        routed = sum(self.routed.values())
+        total = routed + self.fallbacks
+        if total == 0:
+            return 0.0
+        return routed / total
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {'routed': dict(self.routed), 'fallbacks': self.fallbacks, 'local_rate': self.local_rate}
+
+    def __repr__(self) -> str:
+        return f"RouterStats {self.to_dict()}"
+
+
+class IntentRouter(object):
+    """
+    Recognizes the requests that don't need the LLM to pick a tool.
+
+    An input is routed when one of the intent patterns matches, the keyword
+    model gives that intent at least threshold of the votes over the whole
+    input, and the arguments look like what the tool takes: a workout needs
+    a number and some workout vocabulary, and a name can't be an idiom such
+    as "call it a day". Coach shorthand the ShorthandParser understands with
+    at least shorthand_threshold confidence goes straight to parse_workout.
+    Everything else, including anything hedged or long, returns None and
+    should go to the model.
+    """
+
+    _THRESHOLD = 0.6
+    _SHORTHAND_THRESHOLD = 0.9
+
+    def __init__(self, threshold: float = _THRESHOLD, shorthand_threshold: float | None = _SHORTHAND_THRESHOLD):
+        self.threshold = threshold
+        self.shorthand_threshold = shorthand_threshold
+        self.patterns = {
+            intent: [re.compile(pattern, re.IGNORECASE) for pattern in patterns]
+            for (intent, patterns) in INTENT_PATTERNS.items()
+        }
+        self.shorthand = ShorthandParser()
+        self.stats = RouterStats()
+
+    def route(self, text: str) -> Intent | None:
+        intent = self._route(text)
+        self.stats.record(intent)
+        return intent
+
+    def _route(self, text: str) -> Intent | None:
+        text = ' '.join(text.split())
+        words = _WORDS.findall(text.lower().replace("'", ''))
+        if len(words) == 0 or len(words) > MAX_WORDS or _HEDGES.search(text) is not None:
+            return None
+
+        if self.shorthand_threshold is not None:
+            (parsed, confidence) = self.shorthand.parse(text)
+            if parsed is not None and confidence >= self.shorthand_threshold:
+                return Intent(PARSE_WORKOUT, {'input': text}, confidence)
+
+        for (intent, patterns) in self.patterns.items():
+            for pattern in patterns:
+                match = pattern.match(text)
+                if match is None:
+                    continue
+
+                confidence = self.confidence(intent, text)
+                if confidence < self.threshold:
+                    return None
+                args = self._arguments(intent, match)
+                if args is None:
+                    return None
+                return Intent(intent, args, confidence)
+        return None
+
+    def confidence(self, intent: str, text: str) -> float:
+        """Share of the keyword votes for intent, counting the pattern as one vote"""
+        scores = self.scores(_WORDS.findall(text.lower().replace("'", '')))
+        scores[intent] += _PATTERN_WEIGHT
+        return scores[intent] / sum(scores.values())
+
+    def scores(self, words: List[str]) -> Dict[str, float]:
+        """Keyword votes for each intent"""
+        scores = {intent: 0.0 for intent in INTENT_KEYWORDS.keys()}
+        for word in words:
+            if word[0].isdigit():
+                scores[PARSE_WORKOUT] += _NUMBER_WEIGHT
+                continue
+            for (intent, keywords) in INTENT_KEYWORDS.items():
+                scores[intent] += keywords.get(word, 0.0)
+        return scores
+
+    def _arguments(self, intent: str, match: re.Match) -> dict | None:
+        if intent == GET_NAME:
+            return {}
+        if intent == SET_NAME:
+            # Quotes and the final period aren't part of the name
+            name = match.group('name').strip().rstrip('.!').strip().strip('"\'“”‘’').strip()
+            if _NOT_NAMES.match(name) is not None or len(name.split()) > MAX_NAME_WORDS:
+                return None
+            return {'name': name}
+
+        workout = match.group('input').strip()
+        words = _WORDS.findall(workout.lower())
+        if not any(word[0].isdigit() for word in words) or WORKOUT_VOCABULARY.isdisjoint(words):
+            return None
+        return {'input': workout}
@@ -1,9 +1,17 @@
-from typing import List
+import threading
 
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_core.messages.base import BaseMessage
+from typing import TYPE_CHECKING, AsyncIterator, Iterator, List
+
+from agents.templated_responder import TemplatedResponder
+from tools import tracing
+from tools.clients import ClientFactory, shared_factory
+from tools.extraction.templates import FULL, POLITE_RESPONDER_TEMPLATES, get_template
+
+# langchain_core and langchain_openai are slow to import, so they wait for
+# the first LLM call
+if TYPE_CHECKING:
+    from langchain_core.messages.base import BaseMessage
+    from langchain_openai import ChatOpenAI
 
 
 class PoliteResponder(object):
@@ -11,23 +19,39 @@ class PoliteResponder(object):
     A polite assistant LLM to generate responses to the user
     """
 
-    def __init__(self, api_key: str):
-        self.chain = self._create_chain(api_key)
+    _DEFAULT_TEMPLATE = POLITE_RESPONDER_TEMPLATES[FULL]
+
+    _INSTRUCTION = "Generate a response for the user"
+
+    def __init__(self, api_key: str, template: str = FULL, clients: ClientFactory | None = None, templated: TemplatedResponder | None = None):
+        self.template = get_template(POLITE_RESPONDER_TEMPLATES, template)
+        self.clients = clients if clients is not None else shared_factory()
+
+        # Built on first use. Templated answers never need it.
+        self._api_key = api_key
+        self._chain = None
+        self._lock = threading.Lock()
 
-    def _create_chain(self, api_key: str) -> ChatOpenAI:
+        # Known tool results are answered locally. See templated_responder.py.
+        self.templated = templated if templated is not None else TemplatedResponder()
+
+    @property
+    def chain(self) -> 'ChatOpenAI':
+        with self._lock:
+            if self._chain is None:
+                self._chain = self._create_chain(self._api_key)
+            return self._chain
+
+    def _create_chain(self, api_key: str) -> 'ChatOpenAI':
         """Create a LangChain processing chain to generate polite feedback"""
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
 
         # 70B is more than enough for this task
-        model = ChatOpenAI(
-            base_url="https://api.sambanova.ai/v1/",  
-            api_key=api_key,
-            model="Meta-Llama-3.1-70B-Instruct", 
-            temperature=0.15,
-            streaming=False
-        )
+        model = self.clients.chat_openai(api_key, "Meta-Llama-3.1-70B-Instruct", 0.15)
 
         prompt_template = ChatPromptTemplate.from_messages(
-            [("system", self._DEFAULT_TEMPLATE), ("user", "{text}")]
+            [("system", self.template), ("user", "{text}")]
         )
 
         parser = StrOutputParser()
@@ -35,29 +59,101 @@ class PoliteResponder(object):
         chain = prompt_template | model | parser
         return chain
 
-    def call_llm(self, messages: List[BaseMessage]) -> str | None:
+    def call_llm(self, messages: List['BaseMessage']) -> str | None:
         """Call the LLM to generate a response"""
 
-        try:
-            return self.chain.invoke(messages)
-            return 
-        except Exception as e:
-            return None
-            #print(f"[CHAIN RESULT] is exception: {e}")
-        return None
-
-    # This template is a bit repetitive and verbose, but it currently passes
-    # internal tests.
-    _DEFAULT_TEMPLATE = """
-You are a helpful and polite assistant who responds to the user. 
-You do not ask questions.
-You only provide helpful statements.
-
-The user may talk about workouts using shorthand.  Here's some important abbreviations to know:
-    1. "wu" and "w/u" mean "warm-up"
-    2. "cd" and "c/d" mean "cool-down"
-    3. A common encoding system comprised of with "E", "L", "I", "R", "T", "JG", "ST", "MP", and "HMP".  Convert abbreviations and enter the expanded value in "notes" field as:
-        "E" => "easy pace", "L" => "long run pace", "I" => "interval pace", "R" => "repetition pace", "T" => "tempo pace", "JG" => "jog", "ST" => "stride", "MP" => "marathon pace", and "HMP" => "half marathon pace". If the units are not specified with these values, assume they are miles.
-
-If the user has previously asked a question, try to summarize and answer the user's question.
-"""
\ No newline at end of file
+        with tracing.span('responder.call_llm', tokens_in=self._prompt_tokens(messages)) as span:
+            try:
+                response = self.chain.invoke(messages)
+            except Exception as e:
+                #print(f"[CHAIN RESULT] is exception: {e}")
+                span.fail()
+                return None
+            span.set(tokens_out=tracing.approximate_tokens(response))
+            return response
+
+    async def acall_llm(self, messages: List['BaseMessage']) -> str | None:
+        """Asynchronous version of call_llm with the same error semantics"""
+
+        with tracing.span('responder.call_llm', tokens_in=self._prompt_tokens(messages)) as span:
+            try:
+                response = await self.chain.ainvoke(messages)
+            except Exception as e:
+                span.fail()
+                return None
+            span.set(tokens_out=tracing.approximate_tokens(response))
+            return response
+
+    def stream_llm(self, messages: List['BaseMessage']) -> Iterator[str]:
+        """
+        Streaming version of call_llm. Yields the response a few tokens at a
+        time. On an error the stream just ends, so check for an empty result.
+        """
+        # The span stays inactive so it doesn't adopt the consumer's spans
+        with tracing.span('responder.stream_llm', activate=False, tokens_in=self._prompt_tokens(messages)) as span:
+            text = []
+            try:
+                for chunk in self.chain.stream(messages):
+                    text.append(chunk)
+                    yield chunk
+            except Exception as e:
+                span.fail()
+                return
+            finally:
+                span.set(chunks=len(text), tokens_out=tracing.approximate_tokens(''.join(text)))
+
+    async def astream_llm(self, messages: List['BaseMessage']) -> AsyncIterator[str]:
+        """Asynchronous version of stream_llm"""
+        with tracing.span('responder.stream_llm', activate=False, tokens_in=self._prompt_tokens(messages)) as span:
+            text = []
+            try:
+                async for chunk in self.chain.astream(messages):
+                    text.append(chunk)
+                    yield chunk
+            except Exception as e:
+                span.fail()
+                return
+            finally:
+                span.set(chunks=len(text), tokens_out=tracing.approximate_tokens(''.join(text)))
+
+    def _prompt_tokens(self, messages: List['BaseMessage']) -> int:
+        return tracing.approximate_tokens(self.template) + sum(tracing.approximate_tokens(str(x.content)) for x in messages)
+
+    def _instructed(self, message: 'BaseMessage') -> List['BaseMessage']:
+        from langchain_core.messages import AIMessage
+
+        return [message, AIMessage(content=self._INSTRUCTION)]
+
+    def respond_to(self, message: 'BaseMessage') -> str | None:
+        """
+        Generate a response to a single message. Tool results the templates
+        know about skip the LLM entirely.
+        """
+        response = self.templated.respond(message.content)
+        if response is not None:
+            return response
+        return self.call_llm(self._instructed(message))
+
+    async def arespond_to(self, message: 'BaseMessage') -> str | None:
+        """Asynchronous version of respond_to"""
+        response = self.templated.respond(message.content)
+        if response is not None:
+            return response
+        return await self.acall_llm(self._instructed(message))
+
+    def stream_response_to(self, message: 'BaseMessage') -> Iterator[str]:
+        """Streaming version of respond_to. Templated responses come in one piece."""
+        response = self.templated.respond(message.content)
+        if response is not None:
+            yield response
+            return
+        yield from self.stream_llm(self._instructed(message))
+
+    async def astream_response_to(self, message: 'BaseMessage') -> AsyncIterator[str]:
+        """Asynchronous version of stream_response_to"""
+        response = self.templated.respond(message.content)
+        if response is not None:
+            yield response
+            return
+        async for chunk in self.astream_llm(self._instructed(message)):
+            yield chunk
@@ -1,21 +1,12 @@
-import getpass
+import asyncio
+import functools
+import inspect
 import os
 import sys
+import threading
+import uuid
 
-from typing import Any, Iterator, List, Tuple
-
-from dotenv import load_dotenv
-from pydantic import BaseModel, Field
-
-from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage, ToolMessage
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_core.tools import tool
-from langchain.globals import set_verbose
-from langgraph.checkpoint.memory import MemorySaver
-from langgraph.graph import END, StateGraph
-from langgraph.graph import MessagesState, START
-from langgraph.prebuilt import ToolNode
-from langchain_core.tools import StructuredTool
+from typing import TYPE_CHECKING, Any, AsyncIterator, Callable, Iterator, List, Tuple
 
 # Get absolute paths for ai-starter-kit. Your location may vary
 current_dir = os.getcwd()
@@ -26,101 +17,173 @@ env_dir = repo_dir
 sys.path.append(workout_dir)
 sys.path.append(ai_kit_dir)
 
+from agents.history import HistoryPolicy
+from agents.intent_router import IntentRouter
+from agents.workout_store import MAX_THREADS, ThreadLimit, WorkoutStore, thread_id
+from tools import tracing
+from tools.clients import SAMBANOVA_BASE_URL, ClientFactory, shared_factory
+from tools.extraction.cache import ResponseCache
 from tools.extraction.json_extractor import JSONExtractor
+from tools.extraction.routing import RoutingPolicy
 from tools.extraction.image_extractor import ImageExtractor
 from tools.validation.workout.workout import Workout
 
-from utils.model_wrappers.langchain_chat_models import ChatSambaNovaCloud
-
+# pydantic, langchain_core and langgraph take a second or more to import, so
+# they're only loaded when a runtime builds its graph. The ai-starter-kit
+# wrappers are only loaded when the model is created.
+if TYPE_CHECKING:
+    from langchain_core.language_models import BaseChatModel
+    from langchain_core.messages import AIMessage, BaseMessage, ToolMessage
+    from langchain_core.runnables import RunnableConfig
+    from langchain_core.tools import StructuredTool
+    from utils.model_wrappers.langchain_chat_models import ChatSambaNovaCloud
 
-# Argument schema
-class ParseWorkoutSchema(BaseModel):
-    """Parse a workout from a given input string"""
 
-    input: str = Field(description='The input string representing the workout. It should have some combination of shorthand, such as E, L, T, R, ST, MP, HMP or describe steps, such as Run, Recover, Rest, Repeat, Warm-up and Cool-down.')
-
-class GetNameSchema(BaseModel):
-    """
-    Gets the name of the workout.
+class AgentRuntime(object):
     """
+    The parts of the agent every conversation shares: the models, the tools,
+    the compiled graph and its checkpointer. Conversations are told apart by
+    their LangGraph thread_id, which also keys the current workout in the
+    WorkoutStore, so one runtime can serve any number of threads at once.
 
-class SetNameSchema(BaseModel):
-    """Set a workout's name using a given input string. The workout's name can be cleared by sending either an empty or whitespace only string."""
-
-    name: str = Field(description="The new name for the workout. If the name is \"\" or whitespace only, then the workout's name will be deleted.")
-
-
-class PrimaryAgent(object):
+    Use AgentRuntime.shared to get the process-wide runtime for a set of
+    options, and PrimaryAgent for a single conversation.
+    """
 
-    def __init__(self, api_key: str, user_id: str = '13542'):
-        """Create the primary agent"""
+    def __init__(self, api_key: str, cache: ResponseCache | None = None, routing: RoutingPolicy | None = None, clients: ClientFactory | None = None, streaming: bool = False, intent_threshold: float | None = IntentRouter._THRESHOLD, history: HistoryPolicy | None = None, max_threads: int = MAX_THREADS, model: 'BaseChatModel | None' = None):
+        """
+        Create the shared agent. Pass model to use another chat model than
+        ChatSambaNovaCloud, e.g. ClientFactory.chat_openai against a stub.
+        """
 
         #print("[DIAGNOSTIC] creating agent")
-        # Create the extractor and validator objects. We'll wrap these in a moment.
-        self.workout_agent = JSONExtractor(api_key)
-        self.image_agent = ImageExtractor(api_key)
-
-        self._workout = None
-
-        model = self._create_model(api_key)
+        # The extractors are created the first time a tool needs them. Plenty
+        # of conversations only chat or rename.
+        self._api_key = api_key
+        self._cache = cache
+        self._routing = routing
+        # Every model, including the agent's own, talks to clients.base_url
+        self._clients = clients if clients is not None else shared_factory()
+        self._workout_agent = None
+        self._image_agent = None
+        self._lock = threading.Lock()
+
+        # The current workout of each thread. It forgets a thread together
+        # with the checkpointer, through the same ThreadLimit.
+        self.threads = ThreadLimit(max_threads)
+        self.workouts = WorkoutStore(threads=self.threads)
+
+        # Threads that came back without a system prompt, e.g. after eviction
+        self.reseeded = 0
+
+        # Obvious requests skip the tool-selection call. Set intent_threshold
+        # to None to always ask the model.
+        self.intent_router = IntentRouter(intent_threshold) if intent_threshold is not None else None
+
+        # Keeps the prompt inside a token budget and the thread inside a
+        # message cap. See history.py.
+        self.history = history if history is not None else HistoryPolicy()
+        self.threads.on_evict(self.history.forget)
+
+        if model is None:
+            model = self._create_model(api_key, streaming, self._clients.base_url)
         self.tools = self._define_tools()
 
         # Bind the tools.
         self.model = model.bind_tools(self.tools, parallel_tool_calls=False)
 
         self.agent = self._create_workflow()
-        
-         # For the configuration, any thread id will work. Just invent something.
-        self.config = {"configurable": {"thread_id": user_id}}
-        
-        chat_template = ChatPromptTemplate.from_messages([('system', self._DEFAULT_PROMPT)])
-        _ =  self.agent.update_state(self.config, {"messages": chat_template.format_prompt().to_messages()})
+
+    _shared = {}
+    _shared_lock = threading.Lock()
 
     @property
-    def workout(self) -> Workout | None:
-        #print("[DIAGNOSTIC] Getting workout value")
-        return self._workout
+    def workout_agent(self) -> JSONExtractor:
+        with self._lock:
+            if self._workout_agent is None:
+                self._workout_agent = JSONExtractor(self._api_key, cache=self._cache, routing=self._routing, clients=self._clients)
+            return self._workout_agent
 
-    @workout.setter
-    def workout(self, value: Workout | None):
-        #print(f"[DIAGNOSTIC] Setting workout to {value}...")
-        self._workout = value
+    @property
+    def image_agent(self) -> ImageExtractor:
+        with self._lock:
+            if self._image_agent is None:
+                self._image_agent = ImageExtractor(self._api_key, clients=self._clients)
+            return self._image_agent
+
+    @classmethod
+    def shared(cls, api_key: str, **kwargs: Any) -> 'AgentRuntime':
+        """
+        The process-wide runtime for these arguments, created on first use.
+        The cache, routing, clients, history and model objects are matched
+        by identity, so pass the same instances to share a runtime.
+        """
+        # Chat models are pydantic objects, which don't hash
+        key = (api_key,) + tuple((name, id(value) if name == 'model' else value) for (name, value) in sorted(kwargs.items()))
+        with cls._shared_lock:
+            runtime = cls._shared.get(key)
+            if runtime is None:
+                runtime = cls(api_key, **kwargs)
+                cls._shared[key] = runtime
+            return runtime
+
+    def start_thread(self, config: 'RunnableConfig'):
+        """Give a new thread the system prompt. Existing threads are left alone."""
+        if len(self.agent.get_state(config).values.get('messages', [])) > 0:
+            return
+        _ =  self.agent.update_state(config, {"messages": self._system_messages()})
+
+    def _system_messages(self) -> List['BaseMessage']:
+        from langchain_core.prompts import ChatPromptTemplate
 
-    # ------------------------------
-    # PUBLICLY CALLABLE METHODS
-    # ------------------------------
+        chat_template = ChatPromptTemplate.from_messages([('system', self._DEFAULT_PROMPT)])
+        return chat_template.format_prompt().to_messages()
 
-    def invoke(self, messages: List[BaseMessage]) -> (dict[str, Any] | Any):
-        return self.agent.invoke({'messages': messages}, self.config)
-    
-    def stream(self, input, **kwargs: Any | None) -> Iterator:
-        return self.agent.stream(input, self.config, **kwargs)
+    def _reseed(self, messages: List['BaseMessage'], span) -> List['BaseMessage']:
+        """
+        The system prompt for a thread that lost it. start_thread only runs
+        when a PrimaryAgent is created, and an evicted thread comes back with
+        no messages at all. HistoryPolicy puts system messages first, so it
+        doesn't matter that this one lands after the user's message.
+        """
+        from langchain_core.messages import SystemMessage
 
-    # If you call the tool function directly without using 'invoke', the LLM
-    # won't have a tool message in the history, which is bad.
-    def parse_workout(self, input: str) -> str:
-        """Get a workout from an input string"""
-        return self.parse_workout_tool.invoke(input)
-    
+        if any(isinstance(x, SystemMessage) for x in messages):
+            return []
+        with self._lock:
+            self.reseeded += 1
+        span.set(reseeded=True)
+        return self._system_messages()
 
     # ------------------------------
     # SETUP
     # ------------------------------
 
-    def _create_model(self, api_key: str) -> ChatSambaNovaCloud:
+    def _create_model(self, api_key: str, streaming: bool = False, base_url: str = SAMBANOVA_BASE_URL) -> 'ChatSambaNovaCloud':
         """This creates the agent"""
+        from utils.model_wrappers.langchain_chat_models import ChatSambaNovaCloud
+
         # Get the SambaNova chat client.
         # Here, I've chosen to use the 70B version to have more context
+        # ChatSambaNovaCloud makes its own requests calls, so it can't use the
+        # shared connection pool from tools.clients. It does use the same
+        # base_url, so the replay stub in tools/replay can stand in for it.
         return ChatSambaNovaCloud(
-            base_url="https://api.sambanova.ai/v1/",  
+            base_url=base_url,
             api_key=api_key,
-            streaming=False,
+            # With streaming on, invoke streams under the hood so stream_reply
+            # can hand out tokens while the reply is generated
+            streaming=streaming,
             temperature=0.01,
             model="Meta-Llama-3.1-70B-Instruct",
         )
 
-    def _define_tools(self) -> List[StructuredTool]:
+    def _define_tools(self) -> List['StructuredTool']:
         """Create the tool definitions"""
+        from langchain_core.runnables import RunnableConfig
+        from langchain_core.tools import StructuredTool
+
+        from agents.tool_schemas import GetNameSchema, ParseWorkoutSchema, SetNameSchema
 
         # request_photo = StructuredTool.from_function(
         #     func=self.request_photo,
@@ -129,7 +192,8 @@ class PrimaryAgent(object):
         # )
 
         self.parse_workout_tool = StructuredTool.from_function(
-            func=self._parse_workout,
+            func=self._with_config(self._parse_workout, RunnableConfig),
+            coroutine=self._with_config(self._aparse_workout, RunnableConfig),
             name='parse_workout',
             args_schema=ParseWorkoutSchema,
             #response_format='content_and_artifact', #it should be and artifact...
@@ -137,14 +201,14 @@ class PrimaryAgent(object):
         )
 
         self.get_workout_name_tool = StructuredTool.from_function(
-            func=self._get_workout_name,
+            func=self._with_config(self._get_workout_name, RunnableConfig),
             name='get_name',
             args_schema=GetNameSchema,
             return_direct=True
         )
 
         self.set_workout_name_tool = StructuredTool.from_function(
-            func=self._set_workout_name,
+            func=self._with_config(self._set_workout_name, RunnableConfig),
             name='set_name',
             args_schema=SetNameSchema,
             return_direct=True
@@ -157,6 +221,24 @@ class PrimaryAgent(object):
         ]
         return tools
 
+    @staticmethod
+    def _with_config(method: Callable, config_type: type) -> Callable:
+        """
+        The tool method with its config argument annotated as config_type.
+        StructuredTool only passes the graph's config to an argument it can
+        see is a RunnableConfig, and the methods can't say so themselves
+        without importing langchain_core with this module.
+        """
+        if inspect.iscoroutinefunction(method):
+            async def function(*args, **kwargs):
+                return await method(*args, **kwargs)
+        else:
+            def function(*args, **kwargs):
+                return method(*args, **kwargs)
+        functools.update_wrapper(function, method)
+        function.__annotations__ = dict(method.__annotations__, config=config_type)
+        return function
+
     # ------------------------------
     # PRIMARY TOOLS
     # ------------------------------
@@ -167,7 +249,7 @@ class PrimaryAgent(object):
     #     return "Requesting photo! Here's the photo."
     
     # @tool(args_schema=ParseWorkoutSchema)
-    def _parse_workout(self, input: str) -> str: #Tuple[str, Workout | None]:
+    def _parse_workout(self, input: str, config: 'RunnableConfig') -> str: #Tuple[str, Workout | None]:
         """
         Returns a workout in JSON format parsed from the input string.
 
@@ -177,19 +259,31 @@ class PrimaryAgent(object):
         Returns:
             str: JSON formatted version of the workout
         """
-        try:
-            workout = self.workout_agent.from_string(input)
-            if workout is not None:
-                #print(f"RESULT: {workout}")
-                # So this is a dirty hack because I don't have time to figure
-                # out the proper serialization / deserialization with LangGraph
-                self.workout = workout
-                return self._workout_success_message(input)
-            else:
+        with tracing.span('agent.parse_workout', session=thread_id(config)):
+            try:
+                workout = self.workout_agent.from_string(input)
+            except:
+                # TODO: better reason
                 return self._workout_failure_message(input)
-        except:
-            # TODO: better reason
-            return self._workout_failure_message(input)
+            return self._parsed_workout_message(input, workout, config)
+
+    async def _aparse_workout(self, input: str, config: 'RunnableConfig') -> str:
+        """Asynchronous version of _parse_workout used by the async graph"""
+        with tracing.span('agent.parse_workout', session=thread_id(config)):
+            try:
+                workout = await self.workout_agent.afrom_string(input)
+            except:
+                return self._workout_failure_message(input)
+            return self._parsed_workout_message(input, workout, config)
+
+    def _parsed_workout_message(self, input: str, workout: Workout | None, config: 'RunnableConfig') -> str:
+        if workout is not None:
+            #print(f"RESULT: {workout}")
+            # The tools get the graph's config, so the workout is stored
+            # under the thread that asked for it
+            self.workouts.set(thread_id(config), workout)
+            return self._workout_success_message(input)
+        return self._workout_failure_message(input)
         
     def _workout_success_message(self, input: str) -> str:
         return f"Successfully created the workout from {input}"
@@ -200,7 +294,7 @@ class PrimaryAgent(object):
 
     _no_workout_message = "Failure. No workout available. Create a workout first."
 
-    def _get_workout_name(self) -> str:
+    def _get_workout_name(self, config: 'RunnableConfig') -> str:
         """
         Gets the name of the workout.
         
@@ -208,15 +302,16 @@ class PrimaryAgent(object):
             str: Acknowledgement of the whether the tool successfully retrieved the workout name.
         """
         #print(f"Calling get name")
-        #print(f"Current workout is {self.workout}")
-        if self.workout is None:
+        workout = self.workouts.get(thread_id(config))
+        #print(f"Current workout is {workout}")
+        if workout is None:
             return self._no_workout_message
-        name = self.workout.name
+        name = workout.name
         if name is None:
             name = 'unnamed workout'
         return f"Success. The workout's name is \"{name}\"."
 
-    def _set_workout_name(self, name: str) -> str:
+    def _set_workout_name(self, name: str, config: 'RunnableConfig') -> str:
         """
         Set a workout's name using a given input string. The workout's name can be cleared by sending either an empty or whitespace only string.
     
@@ -227,16 +322,17 @@ class PrimaryAgent(object):
             str: Acknowledgement of the whether the tool updated the workout name successfully.
         """
         #print(f"Calling set name with {name}")
-        #print(f"Current workout is {self.workout}")
-        if self.workout is None:
+        workout = self.workouts.get(thread_id(config))
+        #print(f"Current workout is {workout}")
+        if workout is None:
             return self._no_workout_message
         
         trimmed = name.strip()
         if len(trimmed) > 0:
-            self.workout.name = trimmed
+            workout.name = trimmed
             return f"Success. Workout name set to {trimmed}."
         else:
-            self.workout.name = None
+            workout.name = None
             return "Success. Workout name was cleared."
 
         
@@ -251,12 +347,18 @@ class PrimaryAgent(object):
     # Define the function that determines whether to continue or not
     @staticmethod
     def _should_continue(state) -> str:
+        from langchain_core.messages import AIMessage, ToolMessage
+
         messages = state["messages"]
         last_message = messages[-1]
         
         # If there is a tool call, then we finish
         if isinstance(last_message, ToolMessage):
             return "end"
+        # A plain answer for the user is finished too. Sending it to the tool
+        # node would just call the model again.
+        elif isinstance(last_message, AIMessage) and not last_message.tool_calls:
+            return "end"
         # Otherwise if there is, we continue
         else:
             return "continue"
@@ -264,24 +366,92 @@ class PrimaryAgent(object):
         # The values "end" and "continue" are condition names in the graph
 
     # Define the function that calls the model
-    def _call_model(self, state):
+    def _call_model(self, state, config: 'RunnableConfig'):
+        from langchain_core.messages import ToolMessage
+
         messages = state["messages"]
         if isinstance(messages[-1], ToolMessage):
             return None
-        else:
-            response = self.model.invoke(messages)
-            
-        # We return a list, because this will get added to the existing list
-        return {"messages": [response]}
+
+        with tracing.span('agent.call_model', session=thread_id(config)) as span:
+            seed = self._reseed(messages, span)
+            messages = seed + messages
+            if (routed := self._routed_tool_call(messages)) is not None:
+                response = routed
+                span.set(routed=True)
+            else:
+                prompt = self.history.prompt(messages, thread_id(config))
+                response = self.model.invoke(prompt)
+                self._trace_model_call(span, prompt, response)
+
+        # We return a list, because this will get added to the existing list.
+        # The removals trim the oldest turns once the thread gets too long.
+        return {"messages": seed + self.history.removals(messages, thread_id(config)) + [response]}
+
+    async def _acall_model(self, state, config: 'RunnableConfig'):
+        from langchain_core.messages import ToolMessage
+
+        messages = state["messages"]
+        if isinstance(messages[-1], ToolMessage):
+            return None
+
+        with tracing.span('agent.call_model', session=thread_id(config)) as span:
+            seed = self._reseed(messages, span)
+            messages = seed + messages
+            if (routed := self._routed_tool_call(messages)) is not None:
+                response = routed
+                span.set(routed=True)
+            else:
+                prompt = self.history.prompt(messages, thread_id(config))
+                response = await self.model.ainvoke(prompt)
+                self._trace_model_call(span, prompt, response)
+
+        return {"messages": seed + self.history.removals(messages, thread_id(config)) + [response]}
+
+    def _trace_model_call(self, span, prompt: List['BaseMessage'], response: 'AIMessage'):
+        if not span.recording:
+            return
+        # The model's own counts when it reports them, otherwise the estimate
+        usage = getattr(response, 'usage_metadata', None) or {}
+        span.set(
+            routed=False,
+            messages=len(prompt),
+            tokens_in=usage.get('input_tokens') or sum(self.history.count_tokens(x) for x in prompt),
+            tokens_out=usage.get('output_tokens') or self.history.count_tokens(response),
+            tool_calls=len(response.tool_calls),
+        )
+
+    def _routed_tool_call(self, messages: List['BaseMessage']) -> 'AIMessage | None':
+        """
+        The tool call the model would have made, when the intent router is sure
+        about it. The action node then runs the tool as usual, so the history
+        looks the same as if the model had picked it.
+        """
+        from langchain_core.messages import AIMessage, HumanMessage
+
+        if self.intent_router is None or not isinstance(messages[-1], HumanMessage):
+            return None
+        if not isinstance(messages[-1].content, str):
+            return None
+        intent = self.intent_router.route(messages[-1].content)
+        if intent is None:
+            return None
+        return AIMessage(content='', tool_calls=[intent.tool_call()])
 
     def _create_workflow(self):
         """Get a new LangGraph workflow"""
+        from langchain_core.runnables import RunnableLambda
+        from langgraph.graph import END, START, MessagesState, StateGraph
+        from langgraph.prebuilt import ToolNode
+
+        from agents.checkpointer import BoundedMemorySaver
 
         # Define a new graph
         workflow = StateGraph(MessagesState)
 
         # Define the two nodes we will cycle between
-        workflow.add_node("agent", self._call_model)
+        # The node carries both versions so the graph works with invoke and ainvoke
+        workflow.add_node("agent", RunnableLambda(self._call_model, afunc=self._acall_model, name="agent"))
 
         tool_node = ToolNode(self.tools)
         workflow.add_node("action", tool_node)
@@ -315,8 +485,9 @@ class PrimaryAgent(object):
         # This means that after `tools` is called, `agent` node is called next.
         workflow.add_edge("action", "agent")
 
-        # Set up memory
-        memory = MemorySaver()
+        # Set up memory. Only the latest checkpoints are needed, and threads
+        # are forgotten together with their workout.
+        memory = BoundedMemorySaver(threads=self.threads)
 
         # Finally, we compile it!
         # This compiles it into a LangChain Runnable,
@@ -342,7 +513,149 @@ class PrimaryAgent(object):
     """
 
 
+class PrimaryAgent(object):
+    """
+    One conversation with the agent.
+
+    Creating one is cheap: the models, tools and compiled graph live in a
+    shared AgentRuntime, and all a PrimaryAgent holds is its thread id. Every
+    agent needs its own user_id (a new one is made up if it's left out).
+    Agents with different ids can be used from different threads at once.
+    """
+
+    def __init__(self, api_key: str, user_id: str | None = None, cache: ResponseCache | None = None, routing: RoutingPolicy | None = None, clients: ClientFactory | None = None, streaming: bool = False, intent_threshold: float | None = IntentRouter._THRESHOLD, history: HistoryPolicy | None = None, model: 'BaseChatModel | None' = None, runtime: AgentRuntime | None = None):
+        """Create the primary agent"""
+        if runtime is None:
+            runtime = AgentRuntime.shared(api_key, cache=cache, routing=routing, clients=clients, streaming=streaming, intent_threshold=intent_threshold, history=history, model=model)
+        self.runtime = runtime
+
+        # Kept for callers that reach into the agent
+        self.agent = runtime.agent
+
+        if user_id is None:
+            user_id = uuid.uuid4().hex
+        self.config = {"configurable": {"thread_id": user_id}}
+        runtime.start_thread(self.config)
+
+    @property
+    def workout_agent(self) -> JSONExtractor:
+        return self.runtime.workout_agent
+
+    @property
+    def image_agent(self) -> ImageExtractor:
+        return self.runtime.image_agent
+
+    @property
+    def last_prompt_tokens(self) -> int:
+        """Approximate size of the last prompt this conversation sent to the model"""
+        return self.runtime.history.last_prompt_tokens(thread_id(self.config))
+
+    @property
+    def workout(self) -> Workout | None:
+        #print("[DIAGNOSTIC] Getting workout value")
+        return self.runtime.workouts.get(thread_id(self.config))
+
+    @workout.setter
+    def workout(self, value: Workout | None):
+        #print(f"[DIAGNOSTIC] Setting workout to {value}...")
+        self.runtime.workouts.set(thread_id(self.config), value)
+
+    # ------------------------------
+    # PUBLICLY CALLABLE METHODS
+    # ------------------------------
+
+    def invoke(self, messages: List['BaseMessage']) -> (dict[str, Any] | Any):
+        return self.runtime.agent.invoke({'messages': messages}, self.config)
+    
+    def stream(self, input, **kwargs: Any | None) -> Iterator:
+        return self.runtime.agent.stream(input, self.config, **kwargs)
+
+    async def ainvoke(self, messages: List['BaseMessage']) -> (dict[str, Any] | Any):
+        return await self.runtime.agent.ainvoke({'messages': messages}, self.config)
+
+    def astream(self, input, **kwargs: Any | None) -> AsyncIterator:
+        return self.runtime.agent.astream(input, self.config, **kwargs)
+
+    def stream_reply(self, messages: List['BaseMessage']) -> Iterator['str | ToolMessage']:
+        """
+        Run the agent and yield its reply as it is generated: text chunks for a
+        direct answer, or the ToolMessage as soon as a tool finishes. Create the
+        agent with streaming=True to get more than one chunk per reply.
+        """
+        for (message, metadata) in self.runtime.agent.stream({'messages': messages}, self.config, stream_mode='messages'):
+            if (item := self._reply_item(message, metadata)) is not None:
+                yield item
+
+    async def astream_reply(self, messages: List['BaseMessage']) -> AsyncIterator['str | ToolMessage']:
+        """Asynchronous version of stream_reply"""
+        async for (message, metadata) in self.runtime.agent.astream({'messages': messages}, self.config, stream_mode='messages'):
+            if (item := self._reply_item(message, metadata)) is not None:
+                yield item
+
+    @staticmethod
+    def _reply_item(message: 'BaseMessage', metadata: dict) -> 'str | ToolMessage | None':
+        from langchain_core.messages import AIMessage, ToolMessage
+
+        if isinstance(message, ToolMessage):
+            return message
+        # Only the text the agent writes for the user, not its tool calls
+        if isinstance(message, AIMessage) and metadata.get('langgraph_node') == 'agent':
+            if not message.tool_calls and not getattr(message, 'tool_call_chunks', None):
+                if isinstance(message.content, str) and len(message.content) > 0:
+                    return message.content
+        return None
+
+    # If you call the tool function directly without using 'invoke', the LLM
+    # won't have a tool message in the history, which is bad.
+    def parse_workout(self, input: str) -> str:
+        """Get a workout from an input string"""
+        return self.runtime.parse_workout_tool.invoke(input, self.config)
+
+    async def aparse_workout(self, input: str) -> str:
+        """Asynchronous version of parse_workout"""
+        return await self.runtime.parse_workout_tool.ainvoke(input, self.config)
+
+    def parse_workouts(self, inputs: List[str], max_concurrency: int = 4) -> List[Workout]:
+        """
+        Parse several workouts at once, e.g. everything found in an image.
+
+        At most max_concurrency extractions run at the same time. Returns the
+        workouts that parsed, in the order of the inputs. The first one becomes
+        the current workout.
+        """
+        results = [None] * len(inputs)
+        with tracing.span('agent.parse_workouts', session=thread_id(self.config), inputs=len(inputs)):
+            # No retries so the wait is the slowest single extraction, like parse_workout
+            for (index, result) in self.runtime.workout_agent.from_strings(inputs, max_concurrency=max_concurrency, retries=0):
+                if isinstance(result, Workout):
+                    results[index] = result
+        return self._parsed_workouts(results)
+
+    async def aparse_workouts(self, inputs: List[str], max_concurrency: int = 4) -> List[Workout]:
+        """Asynchronous version of parse_workouts"""
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def parse(input: str) -> Workout | None:
+            async with semaphore:
+                return await self.runtime.workout_agent.afrom_string(input)
+
+        with tracing.span('agent.parse_workouts', session=thread_id(self.config), inputs=len(inputs)):
+            results = await asyncio.gather(*[parse(input) for input in inputs])
+        return self._parsed_workouts(results)
+
+    def _parsed_workouts(self, results: List[Workout | None]) -> List[Workout]:
+        workouts = [workout for workout in results if workout is not None]
+        if len(workouts) > 0:
+            self.workout = workouts[0]
+        return workouts
+
+
 if __name__ == '__main__':
+    import getpass
+
+    from dotenv import load_dotenv
+    from langchain_core.messages import HumanMessage
+
     # load env variables from a .env file into Python environment 
     if load_dotenv(os.path.join(env_dir, '.env')):
         api_key = os.getenv('SAMBANOVA_API_KEY') 
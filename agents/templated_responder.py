@@ -0,0 +1,114 @@
+import random
+import re
+import threading
+
+from typing import Dict, List, Tuple
+
+
+# The tool results PrimaryAgent produces and some ways to tell the user about
+# them. The patterns have to be kept in sync with the messages in
+# primary_agent.py. Named groups are available to the templates. Like the
+# polite responder's prompt, the answers are statements, never questions.
+RESPONSE_TEMPLATES: List[Tuple[str, List[str]]] = [
+    (r'^Successfully created the workout from (?P<input>.*)$', [
+        "Your workout is ready! Here it is.",
+        "Done! I've turned that into a workout for you.",
+        "Great, I've created your workout. Take a look below.",
+        "All set. Here's the workout I put together.",
+    ]),
+    (r'^Successfully created (?P<count>one workout|\d+ workouts) from (?P<input>.*)\.$', [
+        "I found {count} in your image. Here they are.",
+        "Done! I created {count} from your image.",
+        "Great news, I was able to create {count}. Take a look below.",
+    ]),
+    (r'^Failed to create a workout from (?P<input>.*)$', [
+        "Sorry, I couldn't turn that into a workout. Try describing it with distances or times, like '6 x 400m with 200m jog'.",
+        "I wasn't able to make a workout from that. Rephrasing it with distances or times, like '3 miles easy', usually helps.",
+        "I couldn't understand that workout. A little more detail, such as the distance or time of each part, will help.",
+    ]),
+    (r'^Failure\. No workout available\. Create a workout first\.$', [
+        "There's no workout yet. Describe one and I'll create it first.",
+        "I don't have a workout to work with yet. Describe one, like '2 mile warm-up, 4 x 800m, 1 mile cool-down', and I'll create it.",
+        "Let's create a workout first. Tell me what you'd like to do and I'll build it.",
+    ]),
+    (r'^Success\. The workout\'s name is "(?P<name>.*)"\.$', [
+        'The workout is called "{name}".',
+        'This workout\'s name is "{name}".',
+        'It\'s named "{name}".',
+    ]),
+    (r'^Success\. Workout name set to (?P<name>.*)\.$', [
+        'Done! The workout is now called "{name}".',
+        'Got it. I\'ve renamed the workout to "{name}".',
+        'The workout\'s name is now "{name}".',
+    ]),
+    (r'^Success\. Workout name was cleared\.$', [
+        "Done! The workout no longer has a name.",
+        "I've cleared the workout's name.",
+        "The workout's name has been removed.",
+    ]),
+]
+
+
+class ResponderStats(object):
+    """How often the templates answered instead of the LLM"""
+
+    def __init__(self):
+        self.templated = 0
+        self.fallbacks = 0
+        self._lock = threading.Lock()
+
+    def record(self, templated: bool):
+        with self._lock:
+            if templated:
+                self.templated += 1
+            else:
+                self.fallbacks += 1
+
+    @property
+    def fast_path_rate(self) -> float:
+        total = self.templated + self.fallbacks
+        if total == 0:
+            return 0.0
+        return self.templated / total
+
+    def to_dict(self) -> Dict[str, int | float]:
+        with self._lock:
+            return {
+                'templated': self.templated,
+                'fallbacks': self.fallbacks,
+                'fast_path_rate': self.fast_path_rate,
+            }
+
+    def __repr__(self) -> str:
+        return f"ResponderStats {self.to_dict()}"
+
+
+class TemplatedResponder(object):
+    """
+    Answers the predictable tool results locally.
+
+    respond returns a randomly chosen template for messages that match one of
+    the known tool results, and None for anything else so the caller can fall
+    back to the LLM.
+    """
+
+    def __init__(self, templates: List[Tuple[str, List[str]]] = RESPONSE_TEMPLATES, seed: int | None = None):
+        self.templates = [(re.compile(pattern, re.DOTALL), choices) for (pattern, choices) in templates]
+        self.stats = ResponderStats()
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def respond(self, content: str) -> str | None:
+        response = self._match(content.strip()) if isinstance(content, str) else None
+        self.stats.record(response is not None)
+        return response
+
+    def _match(self, content: str) -> str | None:
+        for (pattern, choices) in self.templates:
+            match = pattern.match(content)
+            if match is not None:
+                # random.Random isn't safe to share between threads
+                with self._lock:
+                    template = self._random.choice(choices)
+                return template.format(**match.groupdict())
+        return None
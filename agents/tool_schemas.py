@@ -0,0 +1,19 @@
+from pydantic import BaseModel, Field
+
+
+# Argument schemas for the PrimaryAgent tools. pydantic is slow to import, so
+# this module is only loaded when the tools are defined.
+class ParseWorkoutSchema(BaseModel):
+    """Parse a workout from a given input string"""
+
+    input: str = Field(description='The input string representing the workout. It should have some combination of shorthand, such as E, L, T, R, ST, MP, HMP or describe steps, such as Run, Recover, Rest, Repeat, Warm-up and Cool-down.')
+
+class GetNameSchema(BaseModel):
+    """
+    Gets the name of the workout.
+    """
+
+class SetNameSchema(BaseModel):
+    """Set a workout's name using a given input string. The workout's name can be cleared by sending either an empty or whitespace only string."""
+
+    name: str = Field(description="The new name for the workout. If the name is \"\" or whitespace only, then the workout's name will be deleted.")
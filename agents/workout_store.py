@@ -0,0 +1,105 @@
+import threading
+
+from typing import TYPE_CHECKING, Callable, Dict, List
+
+from tools.validation.workout.workout import Workout
+
+if TYPE_CHECKING:
+    from langchain_core.runnables import RunnableConfig
+
+
+# Conversations the agent remembers. The least recently used one is
+# forgotten first.
+MAX_THREADS = 1024
+
+
+def thread_id(config: 'RunnableConfig') -> str:
+    """The LangGraph thread id in a config"""
+    return config["configurable"]["thread_id"]
+
+
+class ThreadLimit(object):
+    """
+    The threads the agent remembers, least recently used first.
+
+    Once there are more than max_threads, the oldest one is forgotten
+    everywhere at once: every callback given to on_evict gets its id. The
+    checkpointer and the WorkoutStore share one of these, so a conversation
+    never keeps its messages but loses its workout, or the other way around.
+    """
+
+    def __init__(self, max_threads: int = MAX_THREADS):
+        if max_threads < 1:
+            raise ValueError('max_threads must be at least 1')
+
+        self.max_threads = max_threads
+        self.evicted = 0
+        self._threads: Dict[str, None] = {}
+        self._callbacks: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+
+    def on_evict(self, callback: Callable[[str], None]):
+        self._callbacks.append(callback)
+
+    def touch(self, thread: str):
+        """Mark the thread as just used, and evict the oldest ones over the limit"""
+        with self._lock:
+            self._threads.pop(thread, None)
+            self._threads[thread] = None
+            evicted = []
+            while len(self._threads) > self.max_threads:
+                oldest = next(iter(self._threads))
+                del self._threads[oldest]
+                evicted.append(oldest)
+            self.evicted += len(evicted)
+
+        # Outside the lock, since the callbacks take their own
+        for thread in evicted:
+            for callback in self._callbacks:
+                callback(thread)
+
+    def __contains__(self, thread: str) -> bool:
+        return thread in self._threads
+
+    def __len__(self) -> int:
+        return len(self._threads)
+
+
+class WorkoutStore(object):
+    """
+    The current workout of every conversation, keyed by LangGraph thread id.
+
+    This replaces the workout attribute on the agent, so one agent can serve
+    many conversations at once. Workouts are mutable (e.g., set_name changes
+    the name in place), and each thread only ever touches its own. Pass the
+    checkpointer's ThreadLimit as threads to forget both together.
+    """
+
+    def __init__(self, max_threads: int = MAX_THREADS, threads: ThreadLimit | None = None):
+        self.threads = threads if threads is not None else ThreadLimit(max_threads)
+        self.max_threads = self.threads.max_threads
+        self.threads.on_evict(self._forget)
+        self._workouts: Dict[str, Workout] = {}
+        self._lock = threading.Lock()
+
+    def get(self, thread: str) -> Workout | None:
+        with self._lock:
+            workout = self._workouts.get(thread)
+        if workout is not None:
+            self.threads.touch(thread)
+        return workout
+
+    def set(self, thread: str, workout: Workout | None):
+        with self._lock:
+            if workout is None:
+                self._workouts.pop(thread, None)
+                return
+            self._workouts[thread] = workout
+        self.threads.touch(thread)
+
+    def _forget(self, thread: str):
+        with self._lock:
+            self._workouts.pop(thread, None)
+
+    def __len__(self) -> int:
+        return len(self._workouts)
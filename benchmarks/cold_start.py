@@ -0,0 +1,231 @@
+"""
+Measure the cold-start cost of the validation package, the agent and the app.
+
+Every measurement runs in a fresh interpreter started with
+`python -X importtime`, so nothing is already imported or cached. For each
+target this reports the total import time, the time to construct the
+objects a session needs, and the slowest top-level imports. Run it from the
+repository root:
+
+    python -m benchmarks.cold_start [--runs 5] [--top 8] [--baseline REV]
+
+With --baseline, the same measurements are also made on a copy of the tree
+at that git revision (e.g. HEAD~1) so the two can be compared. Constructing
+the agent needs the ai-starter-kit wrappers, and the Streamlit target only
+covers the app's own imports and objects because the app itself needs
+Streamlit secrets. Construction that fails is reported, and targets that
+can't be imported at all are reported as unavailable.
+
+The agent and the app must not load pydantic, langchain_core or langgraph
+until an agent is constructed. If importing them does, the module that was
+loaded too early is reported and the exit status is 1.
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tarfile
+import tempfile
+
+from typing import Dict, List
+
+
+REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+_SAMPLE_WORKOUT = '{"type": "workout", "name": "Easy", "steps": [{"type": "run", "length": {"unit": "mi", "value": 3}}]}'
+
+# name -> (imports, construction code)
+TARGETS: Dict[str, tuple[List[str], str]] = {
+    'validation': (
+        ['tools.validation.workout'],
+        f'tools.validation.workout.WorkoutDecoder().decode({_SAMPLE_WORKOUT!r})',
+    ),
+    'agent': (
+        ['agents.primary_agent'],
+        "agents.primary_agent.PrimaryAgent(api_key='benchmark')",
+    ),
+    'streamlit': (
+        [
+            'agents.polite_responder',
+            'agents.primary_agent',
+            'agents.templated_responder',
+            'tools.clients',
+            'tools.extraction.cache',
+            'tools.extraction.routing',
+            'tools.extraction.image_extractor',
+            'tools.validation.workout.htmlwriter',
+        ],
+        '\n'.join([
+            "clients = tools.clients.ClientFactory()",
+            "agents.polite_responder.PoliteResponder('benchmark', clients=clients, templated=agents.templated_responder.TemplatedResponder())",
+            "tools.extraction.image_extractor.ImageExtractor('benchmark', clients=clients)",
+            "agents.primary_agent.PrimaryAgent(api_key='benchmark', cache=tools.extraction.cache.ResponseCache(), routing=tools.extraction.routing.RoutingPolicy.tiered(), clients=clients)",
+            "tools.validation.workout.htmlwriter.HTMLWriter()",
+        ]),
+    ),
+}
+
+# Modules that importing a target must leave for construction to load
+_HEAVY = ['pydantic', 'langchain_core', 'langgraph']
+LAZY_MODULES: Dict[str, List[str]] = {
+    'agent': _HEAVY,
+    'streamlit': _HEAVY,
+}
+
+# The script each measurement runs. The construction time goes to stdout and
+# the import times to stderr, after a marker so the interpreter's own startup
+# imports aren't counted.
+_MARKER = '# cold start'
+_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+print({marker!r}, file=sys.stderr, flush=True)
+{imports}
+eager = [module for module in {lazy!r} if module in sys.modules]
+start = time.perf_counter()
+try:
+{construct}
+    result = {{'construct': time.perf_counter() - start}}
+except Exception as e:
+    result = {{'construct': None, 'error': f'{{type(e).__name__}}: {{e}}'}}
+result['eager'] = eager
+print(json.dumps(result))
+"""
+
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$')
+
+
+def parse_importtime(stderr: str) -> Dict[str, int]:
+    """Cumulative microseconds for each top-level import"""
+    totals = {}
+    if _MARKER in stderr:
+        stderr = stderr[stderr.index(_MARKER):]
+    for line in stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        if match is not None and len(match.group(3)) == 1:
+            totals[match.group(4)] = int(match.group(2))
+    return totals
+
+
+def measure_once(root: str, imports: List[str], construct: str, lazy: List[str]) -> dict:
+    script = _SCRIPT.format(
+        root=root,
+        marker=_MARKER,
+        imports='\n'.join(f'import {module}' for module in imports),
+        lazy=lazy,
+        construct='\n'.join(f'    {line}' for line in construct.splitlines()),
+    )
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', script],
+        cwd=root, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        errors = [line for line in result.stderr.splitlines() if not line.startswith('import time:')]
+        return {'error': errors[-1] if errors else f'exit code {result.returncode}'}
+
+    imports_us = parse_importtime(result.stderr)
+    constructed = json.loads(result.stdout.strip().splitlines()[-1])
+    return {
+        'import': sum(imports_us.values()) / 1e6,
+        'construct': constructed['construct'],
+        'construct_error': constructed.get('error'),
+        'eager': constructed['eager'],
+        'modules': imports_us,
+    }
+
+
+def measure(root: str, imports: List[str], construct: str, runs: int, lazy: List[str]) -> dict:
+    """Medians over runs fresh interpreters"""
+    results = []
+    for _ in range(runs):
+        result = measure_once(root, imports, construct, lazy)
+        if 'error' in result:
+            return result
+        results.append(result)
+
+    modules = {}
+    for name in results[0]['modules'].keys():
+        modules[name] = statistics.median(result['modules'].get(name, 0) for result in results) / 1e6
+    constructs = [result['construct'] for result in results if result['construct'] is not None]
+    return {
+        'import': statistics.median(result['import'] for result in results),
+        'construct': statistics.median(constructs) if len(constructs) > 0 else None,
+        'construct_error': results[0]['construct_error'],
+        'eager': results[0]['eager'],
+        'modules': modules,
+    }
+
+
+def extract_revision(revision: str, directory: str):
+    """Write the tree at revision into directory"""
+    archive = os.path.join(directory, 'tree.tar')
+    subprocess.run(['git', 'archive', '--format=tar', '-o', archive, revision], cwd=REPO_DIR, check=True)
+    with tarfile.open(archive) as tar:
+        tar.extractall(directory, filter='data')
+    os.remove(archive)
+
+
+def milliseconds(seconds: float | None) -> str:
+    if seconds is None:
+        return '-'
+    return f'{1000 * seconds:.0f} ms'
+
+
+def report(name: str, current: dict, baseline: dict | None, top: int):
+    print(f'{name}')
+    if 'error' in current:
+        print(f'  unavailable: {current["error"]}')
+        return
+
+    rows = [('import', 'import'), ('construct', 'construct')]
+    if baseline is not None and 'error' not in baseline:
+        print(f'  {"":<12}{"baseline":>12}{"current":>12}')
+        for (label, key) in rows:
+            print(f'  {label:<12}{milliseconds(baseline[key]):>12}{milliseconds(current[key]):>12}')
+    else:
+        if baseline is not None:
+            print(f'  baseline unavailable: {baseline["error"]}')
+        for (label, key) in rows:
+            print(f'  {label:<12}{milliseconds(current[key]):>12}')
+
+    if current['construct_error'] is not None:
+        print(f'  construction failed: {current["construct_error"]}')
+    if len(current['eager']) > 0:
+        print(f'  imported too early: {", ".join(current["eager"])}')
+
+    slowest = sorted(current['modules'].items(), key=lambda x: x[1], reverse=True)[:top]
+    print('  slowest imports:')
+    for (module, seconds) in slowest:
+        print(f'    {module:<40}{milliseconds(seconds):>10}')
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.cold_start', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--runs', type=int, default=5, help='fresh interpreters per measurement')
+    parser.add_argument('--top', type=int, default=8, help='slowest imports to list per target')
+    parser.add_argument('--baseline', help='git revision to compare against, e.g. HEAD~1')
+    parser.add_argument('--target', choices=list(TARGETS.keys()), action='append', help='only measure these targets')
+    arguments = parser.parse_args(argv)
+
+    targets = arguments.target or list(TARGETS.keys())
+    eager = False
+    with tempfile.TemporaryDirectory() as directory:
+        if arguments.baseline is not None:
+            extract_revision(arguments.baseline, directory)
+
+        for name in targets:
+            (imports, construct) = TARGETS[name]
+            lazy = LAZY_MODULES.get(name, [])
+            current = measure(REPO_DIR, imports, construct, arguments.runs, lazy)
+            baseline = measure(directory, imports, construct, arguments.runs, lazy) if arguments.baseline is not None else None
+            report(name, current, baseline, arguments.top)
+            eager = eager or len(current.get('eager', [])) > 0
+    return 1 if eager else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
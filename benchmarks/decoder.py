@@ -0,0 +1,104 @@
+"""
+Compare WorkoutDecoder with CompiledWorkoutDecoder.
+
+Both decoders read the same generated workouts: a small one like the LLM
+produces and very large ones with nested repetitions, goals, aliased keys
+and misspelled types. The script first checks that they build identical
+Workout trees, then reports the time per decode and the speedup. Run it
+from the repository root:
+
+    python -m benchmarks.decoder [--steps 10,1000,20000] [--repeat 5]
+"""
+
+import argparse
+import json
+import random
+import sys
+import timeit
+
+from typing import List
+
+from tools.validation.workout.compiled import CompiledWorkoutDecoder
+from tools.validation.workout.json import WorkoutDecoder
+
+
+# What the LLM writes for a step type, now and then
+STEP_TYPES = ['run', 'run', 'run', 'Run', 'recover', 'recovery', 'rest', 'warm-up', 'warmup', 'cool-down', 'cooldwn', 'work']
+GOAL_TYPES = ['speed', 'pace', 'heart_rate', 'hr', 'heart_rate_zone', 'cadence', 'lap_time', 'lap']
+UNITS = ['seconds', 'meters', 'miles', ' minutes ', 'km']
+
+
+def generate(steps: int, seed: int = 0) -> str:
+    """A workout with about this many steps, as the JSON text"""
+    rng = random.Random(seed)
+
+    def step() -> dict:
+        data = {'type': rng.choice(STEP_TYPES), rng.choice(['unit', 'units']): rng.choice(UNITS)}
+        if rng.random() < 0.3:
+            (low, high) = sorted(rng.sample(range(60, 1200), 2))
+            data.update({'min': high, 'max': low} if rng.random() < 0.2 else {'minimum': low, 'maximum': high})
+        else:
+            data['value'] = rng.randint(1, 3600)
+        if rng.random() < 0.5:
+            data[rng.choice(['notes', 'note'])] = rng.choice(['E pace', 'T pace ', '', 'hard', '  '])
+        return data
+
+    def repetition(count: int) -> dict:
+        data = {'type': rng.choice(['repetition', 'repetition', 'Repetition', 'repetitions']), 'value': rng.randint(2, 10), 'steps': [step() for _ in range(count)]}
+        if rng.random() < 0.3:
+            data['goals'] = [{'type': rng.choice(GOAL_TYPES), 'minimum': 150, 'maximum': 170}]
+        return data
+
+    items = []
+    total = 0
+    while total < steps:
+        if rng.random() < 0.2:
+            count = rng.randint(2, 4)
+            items.append(repetition(count))
+            total += count + 1
+        else:
+            items.append(step())
+            total += 1
+    return json.dumps({'type': 'workout', 'name': 'Generated', 'steps': items})
+
+
+def tree(value):
+    """Everything about a decoded workout except the generated uuids"""
+    if isinstance(value, list):
+        return [tree(item) for item in value]
+    fields = [name for cls in type(value).__mro__ for name in getattr(cls, '__slots__', ()) if name != '_uuid']
+    if len(fields) > 0:
+        return (type(value).__name__, {name: tree(getattr(value, name)) for name in fields})
+    return value
+
+
+def measure(decoder, text: str, repeat: int) -> float:
+    """Best seconds per decode"""
+    number = max(1, 20000 // max(1, len(text) // 100))
+    return min(timeit.repeat(lambda: decoder.decode(text), number=number, repeat=repeat)) / number
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.decoder', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--steps', default='10,1000,20000', help='comma-separated workout sizes in steps (default: %(default)s)')
+    parser.add_argument('--repeat', type=int, default=5, help='timing runs per size, the best one counts (default: %(default)s)')
+    arguments = parser.parse_args(argv)
+
+    legacy = WorkoutDecoder()
+    compiled = CompiledWorkoutDecoder()
+
+    print(f'{"steps":>8}{"bytes":>11}{"decoder µs":>13}{"compiled µs":>13}{"speedup":>9}')
+    for steps in [int(x) for x in arguments.steps.split(',') if x.strip()]:
+        text = generate(steps)
+        if tree(legacy.decode(text)) != tree(compiled.decode(text)):
+            print(f'{steps:>8}  the decoders build different workouts', file=sys.stderr)
+            return 1
+
+        before = measure(legacy, text, arguments.repeat)
+        after = measure(compiled, text, arguments.repeat)
+        print(f'{steps:>8}{len(text):>11}{1e6 * before:>13.1f}{1e6 * after:>13.1f}{before / after:>8.2f}x')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,427 @@
+"""
+Load test the agent pipeline with many simultaneous editing sessions.
+
+Every simulated user gets the same objects a Streamlit session holds: a
+PrimaryAgent, a PoliteResponder, an ImageExtractor and an HTMLWriter. The
+shared objects (connection pool, routing policy, templates and agent
+runtime) are created once, as in the app. Each user plays the same
+conversation: create a workout, rename it, ask for its name, chat, then
+upload an image of two more workouts. Run it from the repository root:
+
+    python -m benchmarks.load_test --users 1,8,32 --conversations 3 --latency 0.3 --token-delay 0.01
+
+By default the model is a local stub (tools/replay) with scripted answers
+and the given latency, so no network or API key is needed. --recordings
+replays recorded traffic first, and --base-url sends everything to another
+server instead, e.g. a stub started with `python -m tools.replay serve`.
+The agent's chat model is ChatOpenAI on the shared pool unless
+--agent-model sambanova is given, which needs the ai-starter-kit wrappers.
+
+For each number of users this reports the throughput, latency percentiles
+and error rate per turn type, and the peak resident memory while they ran.
+"""
+
+import argparse
+import io
+import json
+import math
+import os
+import sys
+import threading
+import time
+import uuid
+
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List
+
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+
+from agents.polite_responder import PoliteResponder
+from agents.primary_agent import PrimaryAgent
+from agents.templated_responder import TemplatedResponder
+from tools import tracing
+from tools.clients import ClientFactory
+from tools.extraction.image_extractor import ImageExtractor
+from tools.extraction.routing import RoutingPolicy
+from tools.replay.recordings import RecordingStore
+from tools.replay.server import ReplayServer
+from tools.validation.workout.htmlwriter import HTMLWriter
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+
+# The scripted conversation: (turn type, what the user says)
+SCRIPT = [
+    ('create', "Create a workout: easy warm up for fifteen minutes, then six hill repeats of ninety seconds with a jog back down, then cool down"),
+    ('rename', "Rename it to {name}"),
+    ('query', "What's the workout called?"),
+    ('chat', "Thanks! How should the hill repeats feel?"),
+    ('image', None),
+]
+
+TURN_TYPES = [turn for (turn, _) in SCRIPT]
+
+# What the scripted stub answers
+WORKOUT_ANSWER = json.dumps({
+    'type': 'workout',
+    'steps': [
+        {'type': 'warm-up', 'value': 900, 'unit': 'seconds', 'notes': 'easy'},
+        {'type': 'repetition', 'value': 6, 'steps': [
+            {'type': 'run', 'value': 90, 'unit': 'seconds', 'notes': 'uphill, hard'},
+            {'type': 'recover', 'value': 90, 'unit': 'seconds', 'notes': 'jog back down'},
+        ]},
+        {'type': 'cool-down', 'value': 600, 'unit': 'seconds', 'notes': 'easy'},
+    ],
+}, indent=2)
+IMAGE_ANSWER = json.dumps([
+    '2 mile warm up, 4 x 1 mile at threshold pace with 2 minutes rest, 2 mile cool down',
+    '45 minute easy run with 6 strides at the end',
+])
+CHAT_ANSWER = "Great question! The hill repeats should feel hard but controlled, about your 5k effort. Keep your form tall and relaxed on the way up."
+
+
+def scripted_answer(body: dict) -> str:
+    """The stub's answer, based on which component is asking"""
+    for message in body.get('messages') or []:
+        content = message.get('content')
+        if isinstance(content, list) and any(part.get('type') == 'image_url' for part in content if isinstance(part, dict)):
+            return IMAGE_ANSWER
+        if isinstance(content, str) and content.startswith('Essentially: '):
+            return WORKOUT_ANSWER
+    return CHAT_ANSWER
+
+
+def sample_image() -> bytes:
+    """A page with some handwriting-sized text, or just JPEG-looking bytes without Pillow"""
+    try:
+        from PIL import Image, ImageDraw
+    except ImportError:
+        return b'\xff\xd8\xff' + bytes(64 * 1024)
+
+    image = Image.new('RGB', (2400, 1800), 'white')
+    draw = ImageDraw.Draw(image)
+    for (index, line) in enumerate(json.loads(IMAGE_ANSWER)):
+        draw.text((200, 300 + 120 * index), line, fill='black')
+    output = io.BytesIO()
+    image.save(output, format='JPEG', quality=90)
+    return output.getvalue()
+
+
+def current_rss() -> int:
+    """Resident memory of this process in bytes"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open('/proc/self/statm') as file:
+            return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        import resource
+        # Only the lifetime peak is available here. Linux reports KiB.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+class PeakMemory(object):
+    """Samples the RSS on a background thread and keeps the highest value"""
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='rss-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self) -> 'PeakMemory':
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class Shared(object):
+    """The objects the app creates once per process"""
+
+    def __init__(self, api_key: str, clients: ClientFactory, agent_model: str, streaming: bool, templates: bool):
+        self.api_key = api_key
+        self.clients = clients
+        self.routing = RoutingPolicy.tiered()
+        self.streaming = streaming
+        # Without templates every reply goes through the LLM
+        self.templated = TemplatedResponder() if templates else TemplatedResponder(templates=[])
+        self.model = None
+        if agent_model == 'openai':
+            self.model = clients.chat_openai(api_key, 'Meta-Llama-3.1-70B-Instruct', 0.01, streaming=streaming)
+
+
+class Session(object):
+    """One simulated user, holding what a Streamlit session holds"""
+
+    def __init__(self, shared: Shared, image: bytes):
+        self.shared = shared
+        self.image = image
+        self.user_id = f'load-{uuid.uuid4().hex}'
+        self.agent = PrimaryAgent(
+            api_key=shared.api_key,
+            user_id=self.user_id,
+            routing=shared.routing,
+            clients=shared.clients,
+            streaming=shared.streaming,
+            model=shared.model,
+        )
+        self.responder = PoliteResponder(shared.api_key, clients=shared.clients, templated=shared.templated)
+        self.images = ImageExtractor(shared.api_key, clients=shared.clients)
+        self.html = HTMLWriter()
+        self.name = None
+
+    def run(self, turn: str, text: str | None) -> float | None:
+        """Play one turn. Returns the time to the first reply chunk when streaming."""
+        if turn == 'image':
+            return self._image_turn()
+        if turn == 'rename':
+            self.name = f'Hills {uuid.uuid4().hex[:6]}'
+            text = text.format(name=self.name)
+        return self._text_turn(turn, text)
+
+    def _text_turn(self, turn: str, text: str) -> float | None:
+        started = time.perf_counter()
+        first = None
+        if self.shared.streaming:
+            tool_message = None
+            reply = []
+            for item in self.agent.stream_reply([HumanMessage(text)]):
+                if isinstance(item, ToolMessage):
+                    tool_message = item
+                else:
+                    first = first if first is not None else time.perf_counter() - started
+                    reply.append(item)
+            reply = ''.join(reply)
+        else:
+            last = self.agent.invoke([HumanMessage(text)])['messages'][-1]
+            tool_message = last if isinstance(last, ToolMessage) else None
+            reply = last.content if tool_message is None else ''
+
+        if tool_message is None:
+            _check(len(reply) > 0, 'empty reply')
+            return first
+
+        if turn == 'create':
+            _check(self.agent.workout is not None, tool_message.content)
+            self.html.to_html(self.agent.workout)
+        elif turn == 'rename':
+            _check(self.agent.workout is not None and self.agent.workout.name == self.name, tool_message.content)
+            self.html.to_html(self.agent.workout)
+        elif turn == 'query':
+            _check(self.name is not None and self.name in tool_message.content, tool_message.content)
+
+        (answer, first_at) = self._reply(tool_message)
+        _check(answer, 'no reply to the tool result')
+        return first_at - started if first_at is not None else None
+
+    def _image_turn(self) -> float | None:
+        strings = self.images.from_file(self.image)
+        _check(strings, 'nothing extracted from the image')
+        workouts = self.agent.parse_workouts(strings)
+        _check(len(workouts) > 0, f'no workouts parsed from {strings}')
+        ''.join(self.html.to_html(workout) for workout in workouts)
+        count = 'one workout' if len(workouts) == 1 else f'{len(workouts)} workouts'
+        (answer, _) = self._reply(AIMessage(content=f'Successfully created {count} from {strings}.'))
+        _check(answer, 'no reply to the image')
+        return None
+
+    def _reply(self, message) -> tuple[str | None, float | None]:
+        """The polite reply, and when its first chunk arrived"""
+        if not self.shared.streaming:
+            return (self.responder.respond_to(message), None)
+        first_at = None
+        chunks = []
+        for chunk in self.responder.stream_response_to(message):
+            first_at = first_at if first_at is not None else time.perf_counter()
+            chunks.append(chunk)
+        return (''.join(chunks) or None, first_at)
+
+
+class TurnFailed(Exception):
+    pass
+
+
+def _check(condition, message: str):
+    if not condition:
+        raise TurnFailed(message)
+
+
+class Results(object):
+    """Latencies and failures per turn type, for one number of users"""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = {turn: [] for turn in TURN_TYPES}
+        self.first_chunks: Dict[str, List[float]] = {turn: [] for turn in TURN_TYPES}
+        self.errors: Dict[str, int] = {turn: 0 for turn in TURN_TYPES}
+        self.examples: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def record(self, turn: str, latency: float, first: float | None, error: Exception | None):
+        with self._lock:
+            self.latencies[turn].append(latency)
+            if first is not None:
+                self.first_chunks[turn].append(first)
+            if error is not None:
+                self.errors[turn] += 1
+                self.examples.setdefault(turn, f'{type(error).__name__}: {error}'[:200])
+
+    @property
+    def turns(self) -> int:
+        return sum(len(x) for x in self.latencies.values())
+
+
+def percentile(values: List[float], q: float) -> float | None:
+    if len(values) == 0:
+        return None
+    values = sorted(values)
+    return values[max(0, math.ceil(q * len(values)) - 1)]
+
+
+def run_level(shared: Shared, users: int, conversations: int, think: float, image: bytes) -> dict:
+    results = Results()
+
+    def user():
+        session = Session(shared, image)
+        with tracing.session(session.user_id):
+            for _ in range(conversations):
+                for (turn, text) in SCRIPT:
+                    started = time.perf_counter()
+                    (first, error) = (None, None)
+                    try:
+                        first = session.run(turn, text)
+                    except Exception as e:
+                        error = e
+                    results.record(turn, time.perf_counter() - started, first, error)
+                    if think > 0:
+                        time.sleep(think)
+
+    started = time.perf_counter()
+    with PeakMemory() as memory:
+        with ThreadPoolExecutor(max_workers=users) as executor:
+            for future in [executor.submit(user) for _ in range(users)]:
+                future.result()
+    elapsed = time.perf_counter() - started
+
+    return {
+        'users': users,
+        'seconds': elapsed,
+        'turns': results.turns,
+        'throughput': results.turns / elapsed if elapsed > 0 else 0.0,
+        'peak_rss_mb': memory.peak / (1024 * 1024),
+        'turn_types': {
+            turn: {
+                'count': len(results.latencies[turn]),
+                'error_rate': results.errors[turn] / len(results.latencies[turn]) if results.latencies[turn] else 0.0,
+                'p50': percentile(results.latencies[turn], 0.5),
+                'p95': percentile(results.latencies[turn], 0.95),
+                'p99': percentile(results.latencies[turn], 0.99),
+                'first_chunk_p50': percentile(results.first_chunks[turn], 0.5),
+                'example_error': results.examples.get(turn),
+            }
+            for turn in TURN_TYPES
+        },
+    }
+
+
+def milliseconds(seconds: float | None) -> str:
+    if seconds is None:
+        return '-'
+    return f'{1000 * seconds:.0f}'
+
+
+def report(level: dict, streaming: bool):
+    print(f'{level["users"]} users: {level["turns"]} turns in {level["seconds"]:.1f}s, '
+          f'{level["throughput"]:.2f} turns/s, peak RSS {level["peak_rss_mb"]:.0f} MB')
+    header = f'  {"turn":<8}{"count":>7}{"errors":>8}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+    if streaming:
+        header += f'{"first ms":>10}'
+    print(header)
+    for (turn, stats) in level['turn_types'].items():
+        line = (f'  {turn:<8}{stats["count"]:>7}{100 * stats["error_rate"]:>7.1f}%'
+                f'{milliseconds(stats["p50"]):>9}{milliseconds(stats["p95"]):>9}{milliseconds(stats["p99"]):>9}')
+        if streaming:
+            line += f'{milliseconds(stats["first_chunk_p50"]):>10}'
+        print(line)
+    for (turn, stats) in level['turn_types'].items():
+        if stats['example_error'] is not None:
+            print(f'  {turn} failed, e.g. {stats["example_error"]}')
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.load_test', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--users', default='1,4,16', help='comma-separated numbers of simultaneous users (default: %(default)s)')
+    parser.add_argument('--conversations', type=int, default=2, help='conversations per user (default: %(default)s)')
+    parser.add_argument('--think', type=float, default=0.0, help='seconds each user waits between turns (default: 0)')
+    parser.add_argument('--streaming', action='store_true', help='stream the replies like the app does by default')
+    parser.add_argument('--no-templates', action='store_true', help='send every reply through the LLM')
+    parser.add_argument('--agent-model', choices=['openai', 'sambanova'], default='openai', help='chat model behind the agent (default: %(default)s)')
+    parser.add_argument('--max-connections', type=int, default=64, help='size of the shared connection pool (default: %(default)s)')
+
+    backend = parser.add_argument_group('model backend')
+    backend.add_argument('--base-url', help='use this OpenAI-compatible endpoint instead of the built-in stub')
+    backend.add_argument('--api-key', default=os.getenv('SAMBANOVA_API_KEY', 'load-test'), help='API key for --base-url')
+    backend.add_argument('--recordings', help='JSONL recordings for the built-in stub to replay first')
+    backend.add_argument('--latency', type=float, default=0.2, help='stub seconds before each answer (default: %(default)s)')
+    backend.add_argument('--jitter', type=float, default=0.1, help='stub extra random latency (default: %(default)s)')
+    backend.add_argument('--token-delay', type=float, default=0.0, help='stub seconds between streamed chunks (default: 0)')
+    backend.add_argument('--error-rate', type=float, default=0.0, help='share of stub requests that fail (default: 0)')
+
+    parser.add_argument('--trace', help='also write the tracing spans to this JSONL file')
+    parser.add_argument('--json', help='write the results to this JSON file')
+    arguments = parser.parse_args(argv)
+
+    levels = [int(x) for x in arguments.users.split(',') if x.strip()]
+    if arguments.trace is not None:
+        tracing.configure(arguments.trace)
+
+    stub = None
+    base_url = arguments.base_url
+    if base_url is None:
+        stub = ReplayServer(
+            RecordingStore(arguments.recordings),
+            port=0,
+            latency=arguments.latency,
+            jitter=arguments.jitter,
+            token_delay=arguments.token_delay,
+            error_rate=arguments.error_rate,
+            fallback=scripted_answer,
+        ).start()
+        base_url = stub.base_url
+
+    image = sample_image()
+    results = []
+    try:
+        clients = ClientFactory(base_url=base_url, max_connections=arguments.max_connections)
+        shared = Shared(arguments.api_key, clients, arguments.agent_model, arguments.streaming, not arguments.no_templates)
+        print(f'Backend {base_url}, agent model {arguments.agent_model}, {"streaming" if arguments.streaming else "not streaming"}')
+        for users in levels:
+            level = run_level(shared, users, arguments.conversations, arguments.think, image)
+            results.append(level)
+            report(level, arguments.streaming)
+        if stub is not None:
+            print(f'Stub: {stub.stats}')
+        print(f'Pool: {clients.stats()}')
+    finally:
+        if stub is not None:
+            stub.stop()
+        tracing.get_tracer().close()
+
+    if arguments.json is not None:
+        with open(arguments.json, 'w', encoding='utf-8') as file:
+            json.dump(results, file, indent=2)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
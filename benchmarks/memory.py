@@ -0,0 +1,144 @@
+"""
+Measure how much memory and time workout objects cost.
+
+For a plain step built directly and for every step of decoded workouts,
+this reports the bytes each step keeps alive (tracemalloc) and the time to
+build or decode it. Each measurement runs in a fresh interpreter. Run it
+from the repository root:
+
+    python -m benchmarks.memory [--steps 20000] [--copies 5] [--baseline REV]
+
+With --baseline, the same measurements are made on a copy of the tree at
+that git revision (e.g. HEAD~1) so the two can be compared. The decoded
+workouts come from benchmarks/decoder.py's generator and go through
+WorkoutDecoder, which every revision has.
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from typing import List
+
+from benchmarks.cold_start import REPO_DIR, extract_revision
+from benchmarks.decoder import generate
+
+
+_SCRIPT = """
+import gc, json, sys, time, tracemalloc
+sys.path.insert(0, {root!r})
+from tools.validation.workout.json import WorkoutDecoder
+from tools.validation.workout.steps import RunWorkoutStep
+
+def count(steps):
+    return sum(1 + count(getattr(step, 'steps', [])) for step in steps)
+
+def build():
+    return [RunWorkoutStep(value=index, unit='meters', notes='easy') for index in range({steps})]
+
+def uuids(steps):
+    return [step.uuid for step in steps]
+
+def decode():
+    return [decoder.decode(text) for _ in range({copies})]
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return (result, time.perf_counter() - start)
+
+def traced(function, *args):
+    \"\"\"The result and the bytes it keeps alive\"\"\"
+    gc.collect()
+    tracemalloc.start()
+    result = function(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (result, size)
+
+text = open({path!r}, encoding='utf-8').read()
+decoder = WorkoutDecoder()
+decoder.decode(text)
+
+# The times first, since tracemalloc slows everything down
+(steps, built) = timed(build)
+(_, uuid_time) = timed(uuids, steps)
+del steps
+(workouts, decoded) = timed(decode)
+total = sum(count(workout.steps) for workout in workouts)
+del workouts
+
+(steps, step_bytes) = traced(build)
+(_, uuid_bytes) = traced(uuids, steps)
+del steps
+(workouts, decoded_bytes) = traced(decode)
+
+print(json.dumps({{
+    'step_bytes': step_bytes / {steps},
+    'step_us': 1e6 * built / {steps},
+    'uuid_bytes': uuid_bytes / {steps},
+    'uuid_us': 1e6 * uuid_time / {steps},
+    'decoded_bytes': decoded_bytes / total,
+    'decoded_us': 1e6 * decoded / total,
+}}))
+"""
+
+ROWS = [
+    ('step bytes', 'step_bytes', '{:.0f}'),
+    ('step µs', 'step_us', '{:.2f}'),
+    ('+ uuid bytes', 'uuid_bytes', '{:.0f}'),
+    ('+ uuid µs', 'uuid_us', '{:.2f}'),
+    ('decoded bytes', 'decoded_bytes', '{:.0f}'),
+    ('decoded µs', 'decoded_us', '{:.2f}'),
+]
+
+
+def measure(root: str, path: str, steps: int, copies: int) -> dict:
+    script = _SCRIPT.format(root=root, path=path, steps=steps, copies=copies)
+    result = subprocess.run([sys.executable, '-c', script], cwd=root, capture_output=True, text=True)
+    if result.returncode != 0:
+        errors = result.stderr.strip().splitlines()
+        return {'error': errors[-1] if errors else f'exit code {result.returncode}'}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.memory', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--steps', type=int, default=20000, help='steps to build, and the size of each decoded workout (default: %(default)s)')
+    parser.add_argument('--copies', type=int, default=5, help='decoded workouts to keep alive at once (default: %(default)s)')
+    parser.add_argument('--baseline', help='git revision to compare against, e.g. HEAD~1')
+    arguments = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'workout.json')
+        with open(path, 'w', encoding='utf-8') as file:
+            file.write(generate(arguments.steps))
+
+        current = measure(REPO_DIR, path, arguments.steps, arguments.copies)
+        baseline = None
+        if arguments.baseline is not None:
+            tree = os.path.join(directory, 'tree')
+            os.mkdir(tree)
+            extract_revision(arguments.baseline, tree)
+            baseline = measure(tree, path, arguments.steps, arguments.copies)
+
+    for (label, result) in (('current', current), ('baseline', baseline)):
+        if result is not None and 'error' in result:
+            print(f'{label} unavailable: {result["error"]}')
+            return 1
+
+    if baseline is None:
+        for (label, key, format) in ROWS:
+            print(f'{label:<16}{format.format(current[key]):>10}')
+    else:
+        print(f'{"":<16}{"baseline":>10}{"current":>10}')
+        for (label, key, format) in ROWS:
+            print(f'{label:<16}{format.format(baseline[key]):>10}{format.format(current[key]):>10}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
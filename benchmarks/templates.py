@@ -0,0 +1,144 @@
+"""
+Compare the prompt template variants.
+
+For every variant in tools/extraction/templates.py this reports the prompt
+size in tokens for the JSON extractor and the polite responder. Run it from
+the repository root:
+
+    python -m benchmarks.templates
+
+The tokens the endpoint actually bills can be recorded with the replay proxy
+(see tools/replay), sending every input through every variant:
+
+    python -m tools.replay record template_recordings.jsonl --upstream https://api.sambanova.ai/v1/
+    SAMBANOVA_BASE_URL=http://127.0.0.1:8765/v1/ python -m benchmarks.templates --record workouts.txt
+
+and then summarized per variant, matched by system prompt:
+
+    python -m benchmarks.templates --recordings template_recordings.jsonl
+
+This benchmark does not measure how often each variant's answers decode.
+That needs a corpus of real model outputs, which the repository doesn't
+ship.
+
+Local token counts use tiktoken's cl100k_base encoding when it is installed.
+That is close to, but not exactly, the Llama tokenizer. Without tiktoken a
+word and punctuation count is used instead.
+"""
+
+import argparse
+import json
+import re
+import sys
+
+from collections import defaultdict
+from typing import Callable, Dict, List
+
+from tools.extraction.templates import JSON_EXTRACTOR_TEMPLATES, POLITE_RESPONDER_TEMPLATES
+from tools.replay.completions import completion_from_chunks, is_event_stream, parse_events
+
+
+def token_counter() -> tuple[str, Callable[[str], int]]:
+    try:
+        import tiktoken
+        encoding = tiktoken.get_encoding('cl100k_base')
+        return ('cl100k_base', lambda text: len(encoding.encode(text)))
+    except Exception:
+        pattern = re.compile(r'\w+|[^\w\s]')
+        return ('approximate', lambda text: len(pattern.findall(text)))
+
+
+def rendered(template: str) -> str:
+    """The text the model actually receives, with the brace escaping removed"""
+    return template.replace('{{', '{').replace('}}', '}')
+
+
+# ------------------------------
+# RECORDING
+# ------------------------------
+
+def record(path: str, max_concurrency: int):
+    """Send every input through every variant, uncached and without shorthand"""
+    from tools.extraction.__main__ import get_api_key, read_inputs
+    from tools.extraction.json_extractor import JSONExtractor
+
+    inputs = read_inputs(path)
+    api_key = get_api_key()
+    for variant in JSON_EXTRACTOR_TEMPLATES.keys():
+        extractor = JSONExtractor(api_key, shorthand_threshold=None, template=variant)
+        # Only the requests matter here, so the results are thrown away
+        for _ in extractor.from_strings(inputs, max_concurrency=max_concurrency, retries=0):
+            pass
+        sys.stderr.write(f'{variant}: sent {len(inputs)} inputs\n')
+
+
+# ------------------------------
+# REPORTED USAGE
+# ------------------------------
+
+def read_recordings(path: str) -> Dict[str, List[dict]]:
+    """The usage the endpoint reported for each recorded extractor request, by variant"""
+    variants = {rendered(template): variant for (variant, template) in JSON_EXTRACTOR_TEMPLATES.items()}
+    entries = defaultdict(list)
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            if not line.strip():
+                continue
+            recording = json.loads(line)
+            messages = recording['request'].get('messages') or []
+            system = [x.get('content') for x in messages if x.get('role') == 'system']
+            variant = variants.get(system[0]) if len(system) > 0 else None
+            if variant is None:
+                # Some other request that went through the proxy
+                continue
+
+            response = recording['response']
+            if is_event_stream(response.get('content_type')):
+                completion = completion_from_chunks(parse_events(response['body']))
+            else:
+                completion = json.loads(response['body'])
+            entries[variant].append(completion.get('usage') or {})
+    return entries
+
+
+def reported_tokens(entries: List[dict], field: str) -> str:
+    """The average of a usage field over the requests that reported it"""
+    counts = [usage[field] for usage in entries if usage.get(field) is not None]
+    if len(counts) == 0:
+        return '-'
+    return f'{sum(counts) / len(counts):.0f}'
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.templates', description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--record', metavar='INPUTS', help='send these inputs (text or JSONL) through every variant first')
+    parser.add_argument('--max-concurrency', type=int, default=4, help='requests in flight while recording (default: %(default)s)')
+    parser.add_argument('--recordings', help='replay recordings (JSONL) to summarize')
+    arguments = parser.parse_args(argv)
+
+    if arguments.record is not None:
+        record(arguments.record, arguments.max_concurrency)
+
+    (encoding, count) = token_counter()
+    print(f'Token counts use the {encoding} tokenizer')
+    print(f'{"variant":<10}{"extractor":>11}{"responder":>11}')
+    for variant in JSON_EXTRACTOR_TEMPLATES.keys():
+        extractor_tokens = count(rendered(JSON_EXTRACTOR_TEMPLATES[variant]))
+        responder_tokens = count(rendered(POLITE_RESPONDER_TEMPLATES[variant]))
+        print(f'{variant:<10}{extractor_tokens:>11}{responder_tokens:>11}')
+
+    if arguments.recordings is None:
+        return 0
+
+    recordings = read_recordings(arguments.recordings)
+    print()
+    print(f'Average tokens the endpoint reported in {arguments.recordings}')
+    print(f'{"variant":<10}{"requests":>10}{"prompt":>9}{"output":>9}')
+    for variant in JSON_EXTRACTOR_TEMPLATES.keys():
+        entries = recordings.get(variant, [])
+        print(f'{variant:<10}{len(entries):>10}{reported_tokens(entries, "prompt_tokens"):>9}{reported_tokens(entries, "completion_tokens"):>9}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
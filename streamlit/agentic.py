@@ -2,7 +2,6 @@ import streamlit as st
 
 import os
 import sys
-import base64
 
 from langchain_core.messages import AIMessage, HumanMessage, ToolMessage, BaseMessage
 
@@ -18,8 +17,12 @@ sys.path.append(ai_kit_dir)
 
 from agents.polite_responder import PoliteResponder
 from agents.primary_agent import PrimaryAgent
+from agents.templated_responder import TemplatedResponder
 
-from tools.extraction.json_extractor import JSONExtractor
+from tools import tracing
+from tools.clients import MAX_CONNECTIONS, ClientFactory
+from tools.extraction.cache import ResponseCache
+from tools.extraction.routing import RoutingPolicy
 from tools.extraction.image_extractor import ImageExtractor
 from tools.validation.workout.htmlwriter import HTMLWriter
 
@@ -28,21 +31,64 @@ from tools.validation.workout.htmlwriter import HTMLWriter
 # Set SambaNova API key from Streamlit secrets
 api_key = st.secrets["SAMBANOVA_API_KEY"]
 
+# Show replies as they are generated. Set STREAMING = false in the secrets
+# file to wait for the whole reply instead.
+streaming = st.secrets.get("STREAMING", True)
+
+
+# One connection pool for every model client in every session. Set
+# HTTP_MAX_CONNECTIONS in the secrets file to size it for the expected load,
+# and SAMBANOVA_BASE_URL to use another endpoint, e.g. the replay stub in
+# tools/replay.
+@st.cache_resource
+def client_factory():
+    return ClientFactory(
+        base_url=st.secrets.get("SAMBANOVA_BASE_URL"),
+        max_connections=int(st.secrets.get("HTTP_MAX_CONNECTIONS", MAX_CONNECTIONS)),
+    )
+
+# The response cache is shared by every session in this process. Set
+# RESPONSE_CACHE_PATH in the secrets file to also share it between processes.
+@st.cache_resource
+def response_cache():
+    return ResponseCache(path=st.secrets.get("RESPONSE_CACHE_PATH"))
+
+# One routing policy per process so the tier statistics cover every session
+@st.cache_resource
+def routing_policy():
+    return RoutingPolicy.tiered()
+
+# Shared so the fast path statistics cover every session
+@st.cache_resource
+def templated_responder():
+    return TemplatedResponder()
+
+# Tracing is off unless one of these is set in the secrets file: TRACE_PATH
+# for a rotating JSONL file of spans, TRACE_METRICS_PATH for a Prometheus
+# text file, or TRACE_METRICS_PORT to serve /metrics.
+@st.cache_resource
+def tracer():
+    path = st.secrets.get("TRACE_PATH")
+    metrics_path = st.secrets.get("TRACE_METRICS_PATH")
+    metrics_port = st.secrets.get("TRACE_METRICS_PORT")
+    if path is None and metrics_path is None and metrics_port is None:
+        return tracing.get_tracer()
+    return tracing.configure(path, metrics_path, int(metrics_port) if metrics_port is not None else None)
 
 # Introduce statefulness and caching
 def agent():
     if 'primary_agent' not in st.session_state:
-        st.session_state['primary_agent'] = PrimaryAgent(api_key=api_key)
+        st.session_state['primary_agent'] = PrimaryAgent(api_key=api_key, cache=response_cache(), routing=routing_policy(), clients=client_factory(), streaming=streaming)
     return st.session_state['primary_agent']
 
 def polite_responder():
     if 'polite_responder' not in st.session_state:
-        st.session_state['polite_responder'] = PoliteResponder(api_key)
+        st.session_state['polite_responder'] = PoliteResponder(api_key, clients=client_factory(), templated=templated_responder())
     return st.session_state['polite_responder']
 
 def image_extractor():
     if 'image_extractor().' not in st.session_state:
-        st.session_state['image_extractor().'] = ImageExtractor(api_key)
+        st.session_state['image_extractor().'] = ImageExtractor(api_key, clients=client_factory())
     return st.session_state['image_extractor().'] 
 
 def html_writer():
@@ -51,6 +97,12 @@ def html_writer():
         st.session_state['html_writer'] = HTMLWriter() 
     return st.session_state['html_writer']
 
+def workout_html(workouts) -> str:
+    with tracing.span('html.to_html', workouts=len(workouts)) as span:
+        html = ''.join(html_writer().to_html(workout) for workout in workouts)
+        span.set(bytes_out=len(html))
+        return html
+
 # Load the style for the workout HTML
 external = '<link href="https://fonts.googleapis.com/css?family=Montserrat:400,500,600,700" rel="stylesheet">'
 style = '<style> .workout { font-family: "Montserrat", sans-serif; -webkit-border-radius: 6px; -moz-border-radius: 6px; border-radius: 6px;  padding: 10px; border: 1px solid #ccc;} .workout .header { position: relative;} .workout .header span.named { font-style: normal; } .workout .header span.unnamed { font-style: italic; } .workout ol, .workout ul { margin: 0px; padding: 0px; } .workout li { list-style-type: none; margin: 10px 0px; } .workout .step { position: relative; min-width: 200px; background-color: #f3f3f3; display: flex; color: #ccc; -webkit-border-radius: 6px; -moz-border-radius: 6px; border-radius: 6px; padding: 10px; box-shadow: 2px 3px; border: 1px solid #ccc; } .workout .step .level_1 { background-color: #e3e3e3; } .workout .step.level_2 { background-color: #f3f3f3; } .workout .step .color-bar { position:absolute; width: 5px; height: 100%; /* background-image: linear-gradient(to right, blue, #EEE); background-color: blue; */ left: 0px; top: 0px; -webkit-border-radius: 6px 0 0 6px; -moz-border-radius: 6px 0 0 6px ; border-radius: 6px 0 0 6px; z-index: 0; } .workout .step .badge { text-transform: uppercase; font-weight: 600; z-index: 2; background-color: white; display: inline-block; position: absolute; bottom: 0; top: 0; left: 10px; right: 0; margin: 5px 0px; width: 120px; text-align: center; -webkit-border-radius: 15px; -moz-border-radius: 15px; border-style: solid; border-width: 1px; border-radius: 15px; border-color: #ccc; height: 30px; line-height: 25px; } .workout .step.run > .color-bar, .workout .step.run > .badge { background-color: #D13728; } .workout .step.warm-up > .color-bar, .workout .step.warm-up > .badge { background-color: #EE923C; } .workout .step.recover > .color-bar, .workout .step.recover > .badge { background-color: #e4ae1c; } .workout .step.cool-down > .color-bar, .workout .step.cool-down > .badge { background-color: #0C7339FF; } .workout .step.repetition > .color-bar, .workout .step.repetition > .badge { background-color: #59098e; } .workout .step.rest > .color-bar, .workout .step.rest > .badge { background-color: #145381; } .workout .step .badge span { color: #efefef; display: inline-block; vertical-align: middle; line-height: normal; } .workout .step .details { color: #333; position: relative; margin-left: 130px; width: 100%; } /* .step .details .notes { background-color: red; } */ .workout .step .details .notes{ color: #444; } .workout .step .details .notes .text { font-style: italic; } </style>' 
@@ -60,8 +112,12 @@ st.title("Intelligent Workout Editor - Demo")
 
 def get_response_for_user(message: BaseMessage) -> str | None:
     """Generate a polite message using the PoliteResponder LLM"""
-    messages = [message, AIMessage(content="Generate a response for the user")]
-    return polite_responder().call_llm(messages)
+    # Known tool results are answered from templates without calling the LLM
+    return polite_responder().respond_to(message)
+
+def stream_response_for_user(message: BaseMessage):
+    """Streaming version of get_response_for_user"""
+    return polite_responder().stream_response_to(message)
 
 def finish_prompt_response(assistant_message, extra):           
     # Add assistant response to chat history
@@ -70,19 +126,52 @@ def finish_prompt_response(assistant_message, extra):
         if extra is not None:
             #print(f"HTML: {extra}")
             st.html(extra)
+    record_response(assistant_message, extra)
+
+def stream_prompt_response(chunks, extra, fallback):
+    """
+    Like finish_prompt_response, but the reply is written as it is generated.
+    The workout shows up right away, below the reply that is still streaming.
+    """
+    with st.chat_message("assistant"):
+        reply = st.container()
+        if extra is not None:
+            st.html(extra)
+        assistant_message = reply.write_stream(chunks)
+        if not assistant_message:
+            assistant_message = fallback
+            reply.markdown(assistant_message)
+    record_response(assistant_message, extra)
+
+def record_response(assistant_message, extra):
     if extra is None:
         st.session_state.messages.append({"role": "assistant", "content": assistant_message})
     else:
         st.session_state.messages.append({"role": "assistant", "content": assistant_message, 'extra': extra})
 
-
-def invoke_text_path(prompt):
+def tool_result(content: str):
+    """Whether to show the workout for a tool result and what to say if the LLM fails"""
+    if content.startswith("Successfully created the workout"):
+        return (True, "Successfully created workout.")
+    elif content.startswith("Success. Workout name set") or content.startswith("Success. Workout name was cleared."):
+        return (True, "Success.")
+    elif content.startswith("Success"):
+        return (False, "Success.")
+    elif content.startswith("Failure"):
+        return (False, "Failure.")
+    return (False, "FAILURE :(") # Use LLM later
+
+def show_user_prompt(prompt):
     # Display user message in chat message container
     with st.chat_message("user"):
         st.markdown(prompt['text'])
     # Add user message to chat history
     st.session_state.messages.append({"role": "user", "content": prompt})
 
+
+def invoke_text_path(prompt):
+    show_user_prompt(prompt)
+
     # Display assistant response in chat message container
     llm_response =  agent().invoke([HumanMessage(prompt['text'])])
     extra = None
@@ -96,21 +185,12 @@ def invoke_text_path(prompt):
         #print(f'[DIAGNOSTIC] tool message: {content}')
         if content is not None:
             assistant_message = get_response_for_user(last_message)
-            if content.startswith("Successfully created the workout"):
-                if assistant_message is None:
-                    assistant_message = "Successfully created workout." 
-                extra = html_writer().to_html( agent().workout)
+            (show_workout, fallback) = tool_result(content)
+            if show_workout:
+                extra = workout_html([agent().workout])
                 #print("Creating HTML version")
-            elif content.startswith("Success. Workout name set") or content.startswith("Success. Workout name was cleared."):
-                if assistant_message is None:
-                    assistant_message = "Success."
-                extra = html_writer().to_html( agent().workout)
-            elif content.startswith("Success"):
-                if assistant_message is None:
-                    assistant_message = "Success."
-            elif content.startswith("Failure"):
-                if assistant_message is None:
-                    assistant_message = "Failure."
+            if assistant_message is None:
+                assistant_message = fallback
         
         if assistant_message is None:
             assistant_message = "FAILURE :(" # Use LLM later
@@ -119,42 +199,81 @@ def invoke_text_path(prompt):
             
     finish_prompt_response(assistant_message, extra)
 
+def stream_text_path(prompt):
+    show_user_prompt(prompt)
+
+    # The agent yields the text of a direct reply as it is generated, or the
+    # tool result as soon as the tool finishes.
+    tool_message = None
+    def agent_tokens():
+        nonlocal tool_message
+        for item in agent().stream_reply([HumanMessage(prompt['text'])]):
+            if isinstance(item, ToolMessage):
+                tool_message = item
+            else:
+                yield item
+
+    with st.chat_message("assistant"):
+        reply = st.container()
+        assistant_message = reply.write_stream(agent_tokens())
+        extra = None
+        if tool_message is not None:
+            # Show the workout right away, then stream the reply above it
+            (show_workout, fallback) = tool_result(tool_message.content)
+            if show_workout:
+                extra = workout_html([agent().workout])
+                st.html(extra)
+            assistant_message = reply.write_stream(stream_response_for_user(tool_message))
+            if not assistant_message:
+                assistant_message = fallback
+                reply.markdown(assistant_message)
+    record_response(assistant_message, extra)
+
+
 def invoke_image_path(prompt):
     # Try to work with the image...
     uploaded_file = prompt['files'][0]
-    bytes_data = uploaded_file.getvalue()
     with st.chat_message("user"):
         st.image(uploaded_file)
 
-    encoded = base64.b64encode(bytes_data).decode('utf-8')
-    strings = image_extractor().from_base64(encoded)
+    # The extractor shrinks the upload before sending it to the vision model
+    strings = image_extractor().from_file(uploaded_file)
     #print(strings)
 
-    ai_message = AIMessage(content=f"Inform the user that the following possible items have been discovered in the image: {strings}")
-    assistant_message = get_response_for_user(ai_message)
-
-    for string in strings:
-        result =  agent().parse_workout(string)
-        if result.startswith("Successfully created the workout"):
-            message = AIMessage(content=f"Successfully created workout for {string}.")
-            assistant_message = get_response_for_user(message)
-            if assistant_message is None:
-                assistant_message = "Successfully created workout." 
-            extra = html_writer().to_html( agent().workout)
-            #print("Creating HTML version")
-            break
-        else:
-            assistant_message = "FAILURE :(" # Use LLM later
+    # Parse everything on the page at once instead of stopping at the first success
+    workouts = agent().parse_workouts(strings) if strings is not None else []
+    extra = None
+    if len(workouts) > 0:
+        count = 'one workout' if len(workouts) == 1 else f'{len(workouts)} workouts'
+        message = AIMessage(content=f"Successfully created {count} from {strings}.")
+        fallback = f"Successfully created {count}."
+        extra = workout_html(workouts)
+        #print("Creating HTML version")
+    else:
+        # Nothing parsed, so at least tell the user what was found
+        message = AIMessage(content=f"Inform the user that the following possible items have been discovered in the image: {strings}")
+        fallback = "FAILURE :(" # Use LLM later
 
-    finish_prompt_response(assistant_message, extra)
+    if streaming:
+        stream_prompt_response(stream_response_for_user(message), extra, fallback)
+    else:
+        assistant_message = get_response_for_user(message)
+        finish_prompt_response(assistant_message if assistant_message is not None else fallback, extra)
 
 
 def handle_prompt(prompt):
-    extra = None
-    if len(prompt['files']) > 0:
-        invoke_image_path(prompt)
-    else:
-        invoke_text_path(prompt)
+    tracer()
+    # Every span in this request is keyed by the conversation's thread id
+    with tracing.session(agent().config['configurable']['thread_id']):
+        if len(prompt['files']) > 0:
+            with tracing.span('app.image_prompt'):
+                invoke_image_path(prompt)
+        elif streaming:
+            with tracing.span('app.text_prompt', streaming=True):
+                stream_text_path(prompt)
+        else:
+            with tracing.span('app.text_prompt', streaming=False):
+                invoke_text_path(prompt)
 
 # Initialize chat history
 if "messages" not in st.session_state:
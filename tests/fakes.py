@@ -0,0 +1,62 @@
+from typing import Any, List
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.messages import AIMessage, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatResult
+
+
+class FakeChatModel(BaseChatModel):
+    """
+    A chat model that answers with the queued responses, then with "ok", and
+    remembers every prompt it got. bind_tools returns the model itself.
+    """
+
+    responses: List[AIMessage] = []
+    prompts: List[List[BaseMessage]] = []
+
+    @property
+    def _llm_type(self) -> str:
+        return 'fake'
+
+    def _generate(self, messages: List[BaseMessage], stop: List[str] | None = None, run_manager: Any = None, **kwargs: Any) -> ChatResult:
+        self.prompts.append(list(messages))
+        message = self.responses.pop(0) if len(self.responses) > 0 else AIMessage(content='ok')
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    def bind_tools(self, tools: Any, **kwargs: Any) -> 'FakeChatModel':
+        return self
+
+
+class FakeChain(object):
+    """
+    Stands in for an extractor or responder chain. Each call takes the next queued
+    response, or raises it if it is an exception, and the streams yield it
+    in chunks of chunk_size characters.
+    """
+
+    def __init__(self, responses: List[Any], chunk_size: int = 5):
+        self.responses = list(responses)
+        self.chunk_size = chunk_size
+        self.inputs = []
+
+    def _next(self, input: dict) -> str:
+        self.inputs.append(input)
+        response = self.responses.pop(0)
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    def invoke(self, input: dict) -> str:
+        return self._next(input)
+
+    async def ainvoke(self, input: dict) -> str:
+        return self._next(input)
+
+    def stream(self, input: dict):
+        response = self._next(input)
+        for start in range(0, len(response), self.chunk_size):
+            yield response[start:start + self.chunk_size]
+
+    async def astream(self, input: dict):
+        for chunk in self.stream(input):
+            yield chunk
@@ -0,0 +1,161 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import tempfile
+import threading
+import unittest
+
+from unittest import mock
+
+from .context import tools
+from tools.extraction.cache import ResponseCache, cache_key, normalize_input
+
+
+class Clock(object):
+    """Stands in for time.time in the cache module"""
+
+    def __init__(self, now: float = 1000.0):
+        self.now = now
+
+    def time(self) -> float:
+        return self.now
+
+
+class TestCacheKey(unittest.TestCase):
+
+    def test_normalizes_whitespace_only(self):
+        self.assertEqual(normalize_input('  4 x 400m \n\t fast '), '4 x 400m fast')
+        self.assertEqual(cache_key('4 x 400m  fast', 'template', 'model', 0.0), cache_key(' 4 x 400m fast\n', 'template', 'model', 0.0))
+        # Case ends up in the workout, so it is part of the key
+        self.assertNotEqual(cache_key('Tempo Tuesday', 'template', 'model', 0.0), cache_key('tempo tuesday', 'template', 'model', 0.0))
+
+    def test_every_part_changes_the_key(self):
+        key = cache_key('4 x 400m', 'template', 'model', 0.0)
+        self.assertNotEqual(key, cache_key('4 x 800m', 'template', 'model', 0.0))
+        self.assertNotEqual(key, cache_key('4 x 400m', 'template v2', 'model', 0.0))
+        self.assertNotEqual(key, cache_key('4 x 400m', 'template', 'other-model', 0.0))
+        self.assertNotEqual(key, cache_key('4 x 400m', 'template', 'model', 0.7))
+        # Integer and float temperatures are the same request
+        self.assertEqual(key, cache_key('4 x 400m', 'template', 'model', 0))
+
+
+class TestMemoryTier(unittest.TestCase):
+
+    def test_lru_eviction(self):
+        cache = ResponseCache(max_size=2, path=None)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        # Touching 'a' makes 'b' the least recently used
+        self.assertEqual(cache.get('a'), '1')
+        cache.put('c', '3')
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), ('1', '3'))
+        self.assertEqual(cache.stats.evictions, 1)
+        self.assertEqual((cache.stats.memory_hits, cache.stats.misses), (3, 1))
+
+    def test_ttl_expiry(self):
+        clock = Clock()
+        with mock.patch('tools.extraction.cache.time', clock):
+            cache = ResponseCache(ttl=60, path=None)
+            cache.put('a', '1')
+            clock.now += 60
+            self.assertEqual(cache.get('a'), '1')
+            clock.now += 1
+            self.assertIsNone(cache.get('a'))
+
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats.expirations, 1)
+        self.assertEqual(cache.stats.misses, 1)
+
+    def test_no_ttl(self):
+        clock = Clock()
+        with mock.patch('tools.extraction.cache.time', clock):
+            cache = ResponseCache(ttl=None, path=None)
+            cache.put('a', '1')
+            clock.now += 365 * 24 * 60 * 60
+            self.assertEqual(cache.get('a'), '1')
+
+    def test_rejects_empty_cache(self):
+        with self.assertRaises(ValueError):
+            ResponseCache(max_size=0)
+
+
+class TestDiskTier(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.directory.name, 'responses.sqlite')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_shared_between_caches(self):
+        ResponseCache(path=self.path).put('a', '1')
+
+        # A second cache on the same file, like another Streamlit worker
+        cache = ResponseCache(path=self.path)
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.stats.disk_hits, 1)
+        # The entry was promoted into memory
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.stats.memory_hits, 1)
+
+    def test_evicted_entries_stay_on_disk(self):
+        cache = ResponseCache(max_size=1, path=self.path)
+        cache.put('a', '1')
+        cache.put('b', '2')
+        self.assertEqual(cache.get('a'), '1')
+        self.assertEqual(cache.stats.disk_hits, 1)
+
+    def test_expired_entries_are_deleted(self):
+        clock = Clock()
+        with mock.patch('tools.extraction.cache.time', clock):
+            ResponseCache(ttl=60, path=self.path).put('a', '1')
+            clock.now += 61
+            cache = ResponseCache(ttl=60, path=self.path)
+            self.assertIsNone(cache.get('a'))
+
+        self.assertEqual(cache.stats.expirations, 1)
+        self.assertIsNone(ResponseCache(ttl=None, path=self.path).get('a'))
+
+    def test_threads(self):
+        cache = ResponseCache(max_size=8, path=self.path)
+        errors = []
+
+        def work(thread: int):
+            try:
+                for index in range(20):
+                    key = f'{thread}-{index}'
+                    cache.put(key, str(index))
+                    if cache.get(key) != str(index):
+                        errors.append(key)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=work, args=(x,)) for x in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(len(cache), 8)
+        self.assertEqual(cache.stats.stores, 80)
+        # Every entry made it to disk, including the ones evicted from memory
+        reader = ResponseCache(path=self.path)
+        self.assertTrue(all(reader.get(f'{thread}-{index}') == str(index) for thread in range(4) for index in range(20)))
+
+    def test_clear(self):
+        cache = ResponseCache(path=self.path)
+        cache.put('a', '1')
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats.stores, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
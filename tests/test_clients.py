@@ -0,0 +1,151 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import threading
+import unittest
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+
+from .context import tools
+from tools.clients import AsyncCountingTransport, ClientFactory, CountingTransport
+
+
+class OkHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, format, *args):
+        pass
+
+
+class TestClientFactory(unittest.TestCase):
+
+    def test_clients_share_the_pool(self):
+        factory = ClientFactory(base_url='http://127.0.0.1:1/v1/')
+        chat = factory.chat_openai('key', 'model', 0.0)
+
+        self.assertIs(factory.openai('key')._client, factory.http_client)
+        self.assertIs(factory.async_openai('key')._client, factory.async_http_client)
+        self.assertIs(chat.http_client, factory.http_client)
+        self.assertIs(chat.http_async_client, factory.async_http_client)
+        self.assertIs(factory.chat_openai('other', 'model', 0.7).http_client, factory.http_client)
+
+    def test_close(self):
+        factory = ClientFactory(base_url='http://127.0.0.1:1/v1/')
+        client = factory.http_client
+        self.assertEqual(factory.stats()['sync']['requests'], 0)
+
+        factory.close()
+        self.assertEqual(factory.stats(), {'sync': None, 'async': None})
+        self.assertIsNot(factory.http_client, client)
+
+    def test_base_url_from_environment(self):
+        os.environ['SAMBANOVA_BASE_URL'] = 'http://127.0.0.1:8765/v1/'
+        try:
+            self.assertEqual(ClientFactory().base_url, 'http://127.0.0.1:8765/v1/')
+        finally:
+            del os.environ['SAMBANOVA_BASE_URL']
+
+
+class TestCountingTransport(unittest.TestCase):
+
+    def test_counts_requests_and_errors(self):
+        def handler(request: httpx.Request) -> httpx.Response:
+            if request.url.path == '/down':
+                raise httpx.ConnectError('down', request=request)
+            return httpx.Response(200, text='ok')
+
+        transport = CountingTransport(httpx.MockTransport(handler))
+        with httpx.Client(transport=transport) as client:
+            client.get('http://test/up')
+            client.get('http://test/up')
+            with self.assertRaises(httpx.ConnectError):
+                client.get('http://test/down')
+
+        self.assertEqual(transport.to_dict(), {
+            'requests': 3, 'in_flight': 0, 'peak_in_flight': 1, 'errors': 1,
+            'connections': 0, 'idle_connections': 0,
+        })
+
+    def test_peak_in_flight(self):
+        barrier = threading.Barrier(3, timeout=5)
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            barrier.wait()
+            return httpx.Response(200)
+
+        transport = CountingTransport(httpx.MockTransport(handler))
+        client = httpx.Client(transport=transport)
+        threads = [threading.Thread(target=client.get, args=('http://test/',)) for _ in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(transport.stats.peak_in_flight, 3)
+        self.assertEqual(transport.stats.in_flight, 0)
+
+    def test_reuses_connections(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        factory = ClientFactory(base_url='unused')
+        self.addCleanup(factory.close)
+        for _ in range(3):
+            factory.http_client.get(f'http://127.0.0.1:{server.server_port}/')
+
+        stats = factory.stats()['sync']
+        self.assertEqual(stats['requests'], 3)
+        self.assertEqual((stats['connections'], stats['idle_connections']), (1, 1))
+
+
+class TestAsyncCountingTransport(unittest.TestCase):
+
+    def test_counts_requests(self):
+        transport = AsyncCountingTransport(lambda: httpx.MockTransport(lambda request: httpx.Response(200)))
+
+        async def requests():
+            async with httpx.AsyncClient(transport=transport) as client:
+                await asyncio.gather(*[client.get('http://test/') for _ in range(4)])
+            return transport.to_dict()
+
+        stats = asyncio.run(requests())
+        self.assertEqual((stats['requests'], stats['in_flight'], stats['errors']), (4, 0, 0))
+
+    def test_one_pool_per_event_loop(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), OkHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+
+        factory = ClientFactory(base_url='unused')
+        client = factory.async_http_client
+        url = f'http://127.0.0.1:{server.server_port}/'
+
+        async def request():
+            texts = [(await client.get(url)).text for _ in range(2)]
+            return (texts, factory.stats()['async'])
+
+        # The second loop must not reuse connections from the first, closed one
+        for _ in range(2):
+            (texts, stats) = asyncio.run(request())
+            self.assertEqual(texts, ['ok', 'ok'])
+            self.assertEqual((stats['loops'], stats['connections']), (1, 1))
+
+        self.assertIs(factory.async_http_client, client)
+        self.assertEqual(factory.stats()['async']['requests'], 4)
+
+
+if __name__ == '__main__':
+    unittest.main()
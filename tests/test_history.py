@@ -0,0 +1,155 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import agents
+from .fakes import FakeChatModel
+from agents.checkpointer import BoundedMemorySaver
+from agents.history import HistoryPolicy
+from agents.primary_agent import AgentRuntime, PrimaryAgent
+from agents.workout_store import ThreadLimit
+from langchain_core.messages import AIMessage, HumanMessage, RemoveMessage, SystemMessage, ToolMessage
+
+
+def turn(index: int, tool: bool = False) -> list:
+    """A user message and its answer, 10 tokens each with count_tokens below"""
+    messages = [HumanMessage(content=f'question {index}', id=f'h{index}')]
+    if tool:
+        call = {'name': 'parse_workout', 'args': {'input': f'workout {index}'}, 'id': f'call{index}', 'type': 'tool_call'}
+        messages.append(AIMessage(content='', tool_calls=[call], id=f'c{index}'))
+        messages.append(ToolMessage(content=f'Successfully created workout {index}', name='parse_workout', tool_call_id=f'call{index}', id=f't{index}'))
+    else:
+        messages.append(AIMessage(content=f'answer {index}', id=f'a{index}'))
+    return messages
+
+
+def count_tokens(message) -> int:
+    return 10
+
+
+class TestHistoryPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.system = SystemMessage(content='You are helpful', id='s')
+        # Turns 0 - 9, of which 2 and 5 used a tool
+        self.messages = [self.system] + [x for index in range(10) for x in turn(index, tool=index in (2, 5))]
+
+    def ids(self, messages: list) -> list:
+        return [x.id for x in messages]
+
+    def test_token_budget(self):
+        policy = HistoryPolicy(max_tokens=80, count_tokens=count_tokens)
+        prompt = policy.prompt(self.messages, 'a')
+
+        # The system prompt, the tool turn and the current turn come first.
+        # The rest of the budget goes to the newest turns that fit.
+        self.assertEqual(prompt[0], self.system)
+        self.assertIsInstance(prompt[1], SystemMessage)
+        self.assertEqual(self.ids(prompt[2:]), ['h5', 'c5', 't5', 'h8', 'a8', 'h9', 'a9'])
+        # The summary comes on top of the budget
+        self.assertEqual(policy.last_prompt_tokens('a'), 90)
+        self.assertEqual(policy.stats('a').dropped_messages, 15)
+
+    def test_summary(self):
+        policy = HistoryPolicy(max_tokens=70, count_tokens=count_tokens)
+        prompt = policy.prompt(self.messages)
+        summary = prompt[1].content.splitlines()
+        self.assertEqual(summary[1:], ['- parse_workout: Successfully created workout 2'])
+
+        # Nothing to summarize without tool results
+        plain = [self.system] + [x for index in range(10) for x in turn(index)]
+        prompt = policy.prompt(plain)
+        self.assertEqual(self.ids(prompt), ['s', 'h7', 'a7', 'h8', 'a8', 'h9', 'a9'])
+
+    def test_everything_fits(self):
+        policy = HistoryPolicy(count_tokens=count_tokens)
+        self.assertEqual(policy.prompt(self.messages), self.messages)
+        self.assertEqual(policy.stats().dropped_messages, 0)
+
+    def test_removals(self):
+        policy = HistoryPolicy(max_messages=20)
+        self.assertEqual(policy.removals(self.messages[:20]), [])
+
+        # 23 messages, so the oldest two turns go. Whole turns, so that's 4.
+        removed = policy.removals(self.messages, 'a')
+        self.assertTrue(all(isinstance(x, RemoveMessage) for x in removed))
+        self.assertEqual(self.ids(removed), ['h0', 'a0', 'h1', 'a1'])
+        self.assertEqual(policy.stats('a').removed_messages, 4)
+
+        # A tool turn goes together with its tool call
+        policy = HistoryPolicy(max_messages=17)
+        self.assertEqual(self.ids(policy.removals(self.messages))[-3:], ['h2', 'c2', 't2'])
+
+    def test_stats_per_thread(self):
+        policy = HistoryPolicy(count_tokens=count_tokens)
+        policy.prompt(self.messages, 'a')
+        policy.prompt(self.messages[:3], 'b')
+        self.assertEqual(policy.last_prompt_tokens('a'), 230)
+        self.assertEqual(policy.last_prompt_tokens('b'), 30)
+        self.assertEqual(policy.last_prompt_tokens('c'), 0)
+
+        policy.forget('a')
+        self.assertEqual(policy.last_prompt_tokens('a'), 0)
+        self.assertEqual(policy.stats('b').calls, 1)
+
+
+class TestBoundedMemorySaver(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakeChatModel()
+        self.runtime = AgentRuntime('key', model=self.model, intent_threshold=None, max_threads=2)
+        self.saver = self.runtime.agent.checkpointer
+
+    def test_prunes_checkpoints(self):
+        self.assertIsInstance(self.saver, BoundedMemorySaver)
+        agent = PrimaryAgent('key', user_id='first', runtime=self.runtime)
+        for index in range(6):
+            agent.invoke([HumanMessage(content=f'hi {index}')])
+
+        checkpoints = self.saver.storage['first']['']
+        self.assertEqual(len(checkpoints), self.saver.max_checkpoints)
+        self.assertTrue(all(key[0] != 'first' or key[2] in checkpoints for key in self.saver.writes.keys()))
+
+        # Every blob left is used by a checkpoint that's left, and vice versa
+        used = set()
+        for (saved, _, _) in checkpoints.values():
+            used.update(self.saver.serde.loads_typed(saved)['channel_versions'].items())
+        blobs = {(key[2], key[3]) for key in self.saver.blobs.keys() if key[0] == 'first'}
+        self.assertEqual(blobs, used)
+
+        # Nothing the conversation needs went with them
+        messages = self.runtime.agent.get_state(agent.config).values['messages']
+        self.assertEqual(len(messages), 13)
+        self.assertEqual(messages[-2].content, 'hi 5')
+
+    def test_evicts_threads(self):
+        for user_id in ('first', 'second', 'third'):
+            PrimaryAgent('key', user_id=user_id, runtime=self.runtime).invoke([HumanMessage(content='hi')])
+
+        self.assertEqual(sorted(self.saver.storage.keys()), ['second', 'third'])
+        self.assertFalse(any(key[0] == 'first' for key in self.saver.blobs.keys()))
+        self.assertEqual(self.runtime.threads.evicted, 1)
+
+    def test_own_limit(self):
+        saver = BoundedMemorySaver(max_checkpoints=0, max_threads=3)
+        self.assertEqual((saver.max_checkpoints, saver.max_threads), (1, 3))
+        self.assertIsInstance(saver.threads, ThreadLimit)
+
+
+class TestPromptTokens(unittest.TestCase):
+
+    def test_per_thread(self):
+        runtime = AgentRuntime('key', model=FakeChatModel(), intent_threshold=None)
+        short = PrimaryAgent('key', user_id='short', runtime=runtime)
+        long = PrimaryAgent('key', user_id='long', runtime=runtime)
+        short.invoke([HumanMessage(content='hi')])
+        long.invoke([HumanMessage(content='hi ' * 400)])
+
+        self.assertGreater(long.last_prompt_tokens, short.last_prompt_tokens + 200)
+        self.assertEqual(short.last_prompt_tokens, runtime.history.last_prompt_tokens('short'))
+
+
+if __name__ == '__main__':
+    unittest.main()
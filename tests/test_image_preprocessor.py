@@ -0,0 +1,89 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import base64
+import io
+import unittest
+
+from .context import tools
+from PIL import Image, ImageDraw
+from tools.extraction.image_preprocessor import Base64Writer, ImagePreprocessor
+
+
+def note(mode: str = 'RGBA', size=(400, 300)) -> Image.Image:
+    """Black writing on a transparent background, like an exported drawing"""
+    image = Image.new('RGBA', size, (0, 0, 0, 0))
+    ImageDraw.Draw(image).rectangle((150, 100, 250, 200), fill=(0, 0, 0, 255))
+    if mode == 'P':
+        # Index 0 is the transparent black
+        image = image.convert('P', palette=Image.Palette.ADAPTIVE, colors=2)
+        image.info['transparency'] = image.getpixel((0, 0))
+    elif mode != 'RGBA':
+        image = image.convert(mode)
+    return image
+
+
+def png(image: Image.Image) -> bytes:
+    buffer = io.BytesIO()
+    image.save(buffer, format='PNG')
+    return buffer.getvalue()
+
+
+class TestImagePreprocessor(unittest.TestCase):
+
+    def check_on_white(self, image: Image.Image, mode: str):
+        self.assertEqual(image.mode, mode)
+        gray = image.convert('L')
+        self.assertEqual(gray.getpixel((0, 0)), 255)
+        self.assertEqual(gray.getpixel((200, 150)), 0)
+
+    def test_transparent(self):
+        for mode in ('RGBA', 'LA', 'P'):
+            with self.subTest(mode=mode):
+                self.check_on_white(ImagePreprocessor(crop=False).process(note(mode)), 'L')
+                self.check_on_white(ImagePreprocessor(crop=False, grayscale=False).process(note(mode)), 'RGB')
+
+    def test_transparent_crop(self):
+        # A black background would leave nothing to crop
+        image = ImagePreprocessor().process(note())
+        self.assertLess(image.size, (120, 120))
+
+    def test_palette_without_transparency(self):
+        image = note().convert('RGB').convert('P')
+        self.assertEqual(ImagePreprocessor(crop=False, grayscale=False).process(image).mode, 'RGB')
+        self.assertEqual(ImagePreprocessor(crop=False).process(image).mode, 'L')
+
+    def test_grayscale(self):
+        image = Image.new('RGB', (2000, 1000), (255, 255, 255))
+        ImageDraw.Draw(image).rectangle((0, 0, 1999, 499), fill=(200, 30, 30))
+        processed = ImagePreprocessor(crop=False).process(image)
+        self.assertEqual(processed.mode, 'L')
+        self.assertEqual(processed.size, (1120, 560))
+        self.assertEqual(processed.getpixel((0, 0)), image.convert('L').getpixel((0, 0)))
+
+    def test_prepare(self):
+        data = png(note())
+        prepared = ImagePreprocessor().prepare(data)
+        self.assertEqual(prepared.mime_type, 'image/jpeg')
+        self.assertEqual(prepared.original_bytes, len(data))
+
+        decoded = Image.open(io.BytesIO(base64.b64decode(prepared.base64)))
+        self.assertEqual((decoded.format, decoded.mode, decoded.size), ('JPEG', 'L', prepared.size))
+        self.assertGreater(decoded.getpixel((0, 0)), 240)
+
+
+class TestBase64Writer(unittest.TestCase):
+
+    def test_matches_b64encode(self):
+        data = bytes(range(256)) * 7
+        for size in (1, 2, 4, 1000):
+            writer = Base64Writer()
+            for start in range(0, len(data), size):
+                writer.write(data[start:start + size])
+            self.assertEqual(writer.getvalue(), base64.b64encode(data).decode('ascii'))
+            self.assertEqual(writer.bytes_written, len(data))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,76 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import agents
+from agents.intent_router import GET_NAME, PARSE_WORKOUT, SET_NAME, IntentRouter
+from tools.validation.workout.steps import RecoverWorkoutStep, RestWorkoutStep, RunWorkoutStep
+
+
+class TestIntentRouter(unittest.TestCase):
+
+    def setUp(self):
+        self.router = IntentRouter()
+
+    def test_routed(self):
+        cases = [
+            ('What is the name of this workout?', GET_NAME, {}),
+            ("what's the workout called?", GET_NAME, {}),
+            ('Rename it to Tuesday Tempo', SET_NAME, {'name': 'Tuesday Tempo'}),
+            ('call it "Hill Repeats"', SET_NAME, {'name': 'Hill Repeats'}),
+            ('clear the name', SET_NAME, {'name': ''}),
+            ('Create a workout: 6 x 400 R w/ 200 jog', PARSE_WORKOUT, {'input': '6 x 400 R w/ 200 jog'}),
+            ('make me a workout of 5 miles easy', PARSE_WORKOUT, {'input': '5 miles easy'}),
+            ('2 E + 6x1k I w/ 2:00 JG + 2 E', PARSE_WORKOUT, {'input': '2 E + 6x1k I w/ 2:00 JG + 2 E'}),
+        ]
+        for (text, tool, args) in cases:
+            with self.subTest(text=text):
+                intent = self.router.route(text)
+                self.assertIsNotNone(intent)
+                self.assertEqual((intent.tool, intent.args), (tool, args))
+
+    def test_shorthand_structure(self):
+        # What the router sends locally has to come out as the coach meant it
+        cases = [
+            ('6x1k @ 3:30 w/ 2:00 jg', [(RunWorkoutStep, 1000, 'at 3:30'), (RecoverWorkoutStep, 120, 'jog')]),
+            ('3 x 1 mile @ 6:30 w/ 90s rest', [(RunWorkoutStep, 1, 'at 6:30'), (RestWorkoutStep, 90, None)]),
+            ('5 x (400m I, 200m jg)', [(RunWorkoutStep, 400, 'interval pace'), (RecoverWorkoutStep, 200, 'jog')]),
+        ]
+        for (text, steps) in cases:
+            with self.subTest(text=text):
+                intent = self.router.route(text)
+                self.assertIsNotNone(intent)
+                self.assertEqual((intent.tool, intent.args), (PARSE_WORKOUT, {'input': text}))
+
+                (parsed, _) = self.router.shorthand.parse(intent.args['input'])
+                self.assertEqual(len(parsed.steps), 1)
+                self.assertEqual([(type(x), x.value, x.notes) for x in parsed.steps[0].steps], steps)
+
+        intent = self.router.route('4 miles at 7:00 pace')
+        (parsed, _) = self.router.shorthand.parse(intent.args['input'])
+        self.assertEqual([(x.value, x.unit, x.notes) for x in parsed.steps], [(4, 'miles', 'at 7:00 pace')])
+
+    def test_left_to_the_model(self):
+        texts = [
+            'call it a day',
+            'Call it quits.',
+            'name it after my coach',
+            'call it something fun',
+            'Make a workout for tomorrow',
+            'make a workout for 6 pm',
+            'maybe rename it to Speed Day',
+            'how long is the workout?',
+            'E',
+            # Without a separator the time might belong to the repeat
+            '6x1k 3:30 w/ 2:00 jg',
+        ]
+        for text in texts:
+            with self.subTest(text=text):
+                self.assertIsNone(self.router.route(text))
+        self.assertEqual(self.router.stats.fallbacks, len(texts))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,176 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import threading
+import time
+import unittest
+
+from .context import tools
+from .fakes import FakeChain, FakeChatModel
+from agents.primary_agent import AgentRuntime, PrimaryAgent
+from tools import tracing
+from tools.extraction.exceptions import DecodingError, ModelError
+from tools.extraction.json_extractor import JSONExtractor
+from tools.validation.workout.steps import RecoverWorkoutStep, RunWorkoutStep
+
+
+RUN = '{"type": "workout", "steps": [{"type": "run", "value": 400, "unit": "meters"}]}'
+
+# Prose around the JSON, trailing commas and aliased keys
+REPAIRABLE = 'Here you go:\n```json\n{"type": "workout", "title": "Hills", "steps": [\n  {"type": "run", "value": 6, "units": "x", "note": "hill",},\n  {"type": "recover", "value": 90, "unit": "seconds",},\n],}\n```\nEnjoy!'
+
+
+def extractor(*responses, **kwargs) -> JSONExtractor:
+    """An extractor whose only tier answers with the responses, in order"""
+    extractor = JSONExtractor('key', shorthand_threshold=None, **kwargs)
+    extractor._chains = {tier.name: FakeChain(responses) for tier in extractor.routing.tiers}
+    return extractor
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_streams_repairable_output(self):
+        steps = []
+        workout = extractor(REPAIRABLE).extract_streaming('6 hills', steps.append)
+        self.assertTrue(workout.similar(extractor(REPAIRABLE).extract('6 hills')))
+        self.assertEqual(workout.name, 'Hills')
+        self.assertEqual([type(x) for x in steps], [RunWorkoutStep, RecoverWorkoutStep])
+        self.assertEqual(steps[0].notes, 'hill')
+
+
+class ScriptedChain(object):
+    """
+    Answers each input from a script of (delay, response) lists, one per
+    attempt, and keeps track of the calls in flight
+    """
+
+    def __init__(self, script: dict):
+        self.script = {key: list(value) for (key, value) in script.items()}
+        self.calls = {key: 0 for key in script.keys()}
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def invoke(self, input: dict) -> str:
+        key = input['text'][len('Essentially: '):]
+        with self._lock:
+            self.calls[key] += 1
+            (delay, response) = self.script[key].pop(0)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(delay)
+        with self._lock:
+            self.in_flight -= 1
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+
+class TestFromStrings(unittest.TestCase):
+
+    def extractor(self, script: dict) -> JSONExtractor:
+        extractor = JSONExtractor('key', shorthand_threshold=None)
+        extractor._RETRY_DELAY = 0.0
+        self.chain = ScriptedChain(script)
+        extractor._chains = {tier.name: self.chain for tier in extractor.routing.tiers}
+        return extractor
+
+    def test_completion_order(self):
+        script = {'slow': [(0.3, RUN)], 'medium': [(0.15, RUN)], 'fast': [(0.0, RUN)]}
+        results = list(self.extractor(script).from_strings(['slow', 'medium', 'fast'], max_concurrency=3))
+        self.assertEqual([index for (index, _) in results], [2, 1, 0])
+        self.assertTrue(all(workout.steps[0].value == 400 for (_, workout) in results))
+
+    def test_sliding_window(self):
+        inputs = [f'workout {index}' for index in range(12)]
+        consumed = []
+
+        def lazily():
+            for input in inputs:
+                consumed.append(input)
+                yield input
+
+        extractor = self.extractor({input: [(0.02, RUN)] for input in inputs})
+        results = extractor.from_strings(lazily(), max_concurrency=3)
+        (first, _) = next(results)
+        # The window, plus the one that replaced the first result
+        self.assertLessEqual(len(consumed), 4)
+
+        self.assertEqual(sorted([first] + [index for (index, _) in results]), list(range(12)))
+        self.assertLessEqual(self.chain.max_in_flight, 3)
+        self.assertGreater(self.chain.max_in_flight, 1)
+
+        with self.assertRaises(ValueError):
+            next(extractor.from_strings(inputs, max_concurrency=0))
+
+    def test_errors(self):
+        script = {
+            'good': [(0.0, RUN)],
+            'flaky': [(0.0, RuntimeError('503')), (0.0, RUN)],
+            'down': [(0.0, RuntimeError('503'))] * 3,
+            'garbled': [(0.0, 'not a workout')] * 3,
+        }
+        results = dict(self.extractor(script).from_strings(['good', 'flaky', 'down', 'garbled'], retries=2))
+
+        self.assertEqual(sorted(results.keys()), [0, 1, 2, 3])
+        self.assertEqual(len(results[0].steps), 1)
+        self.assertEqual(len(results[1].steps), 1)
+        self.assertIsInstance(results[2], ModelError)
+        self.assertIsInstance(results[3], DecodingError)
+        self.assertEqual(results[3].input, 'garbled')
+
+        # Model errors are retried, answers that don't decode aren't
+        self.assertEqual(self.chain.calls, {'good': 1, 'flaky': 2, 'down': 3, 'garbled': 1})
+
+
+class ListExporter(object):
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span: tracing.Span):
+        self.spans.append(span)
+
+    def close(self):
+        pass
+
+
+class TestThreadedTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.exporter = ListExporter()
+        self.previous = tracing.get_tracer()
+        tracing.set_tracer(tracing.Tracer([self.exporter]))
+
+    def tearDown(self):
+        tracing.set_tracer(self.previous)
+
+    def test_workers_keep_the_context(self):
+        inputs = [f'workout {index}' for index in range(6)]
+        with tracing.session('session'), tracing.span('batch') as batch:
+            results = list(extractor(*[RUN] * len(inputs)).from_strings(inputs, max_concurrency=3))
+        self.assertEqual(len(results), len(inputs))
+
+        extracts = [span for span in self.exporter.spans if span.name == 'extractor.extract']
+        self.assertEqual(len(extracts), len(inputs))
+        for span in extracts:
+            self.assertEqual((span.parent_id, span.trace_id, span.session), (batch.span_id, batch.trace_id, 'session'))
+
+        # And the model calls nest in their own extraction
+        ids = {span.span_id for span in extracts}
+        models = [span for span in self.exporter.spans if span.name == 'extractor.model']
+        self.assertEqual({span.parent_id for span in models}, ids)
+
+    def test_parse_workouts_session(self):
+        runtime = AgentRuntime('key', model=FakeChatModel(), intent_threshold=None)
+        runtime._workout_agent = extractor(RUN, RUN)
+        agent = PrimaryAgent('key', user_id='user', runtime=runtime)
+        self.assertEqual(len(agent.parse_workouts(['first', 'second'])), 2)
+
+        extracts = [span for span in self.exporter.spans if span.name == 'extractor.extract']
+        self.assertEqual([span.session for span in extracts], ['user', 'user'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,103 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import agents
+from .fakes import FakeChatModel
+from agents.primary_agent import AgentRuntime, PrimaryAgent
+from agents.workout_store import ThreadLimit, WorkoutStore
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+from tools.validation.workout.workout import Workout
+
+
+class TestThreadEviction(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakeChatModel()
+        self.runtime = AgentRuntime('key', model=self.model, intent_threshold=None, max_threads=2)
+
+    def agent(self, user_id: str) -> PrimaryAgent:
+        return PrimaryAgent('key', user_id=user_id, runtime=self.runtime)
+
+    def messages(self, agent: PrimaryAgent) -> list:
+        return self.runtime.agent.get_state(agent.config).values.get('messages', [])
+
+    def test_evicted_together(self):
+        first = self.agent('first')
+        first.invoke([HumanMessage(content='hi')])
+        first.workout = Workout(name='Tempo')
+
+        self.agent('second')
+        self.agent('third')
+        self.assertEqual(self.messages(first), [])
+        self.assertIsNone(first.workout)
+        self.assertEqual(self.runtime.threads.evicted, 1)
+
+    def test_system_prompt_comes_back(self):
+        first = self.agent('first')
+        self.agent('second')
+        self.agent('third')
+        self.assertEqual(self.messages(first), [])
+
+        first.invoke([HumanMessage(content='still there?')])
+        self.assertIsInstance(self.model.prompts[-1][0], SystemMessage)
+        self.assertEqual(self.runtime.reseeded, 1)
+        self.assertEqual(sum(isinstance(x, SystemMessage) for x in self.messages(first)), 1)
+
+        # Only once
+        first.invoke([HumanMessage(content='and now?')])
+        self.assertEqual(self.runtime.reseeded, 1)
+
+
+class TestGraph(unittest.TestCase):
+
+    def setUp(self):
+        self.model = FakeChatModel()
+        self.runtime = AgentRuntime('key', model=self.model, intent_threshold=None)
+        self.agent = PrimaryAgent('key', user_id='graph', runtime=self.runtime)
+
+    def test_ends_on_plain_answer(self):
+        self.model.responses.append(AIMessage(content='Hello! Describe a workout and I will create it.'))
+        messages = self.agent.invoke([HumanMessage(content='hi')])['messages']
+
+        self.assertEqual(len(self.model.prompts), 1)
+        self.assertIsInstance(messages[-1], AIMessage)
+        self.assertEqual(messages[-1].content, 'Hello! Describe a workout and I will create it.')
+
+    def test_ends_after_tool(self):
+        call = {'name': 'get_name', 'args': {}, 'id': 'call', 'type': 'tool_call'}
+        self.model.responses.append(AIMessage(content='', tool_calls=[call]))
+        messages = self.agent.invoke([HumanMessage(content="what's the workout called?")])['messages']
+
+        self.assertEqual(len(self.model.prompts), 1)
+        self.assertIsInstance(messages[-1], ToolMessage)
+        self.assertEqual(messages[-1].content, AgentRuntime._no_workout_message)
+
+    def test_should_continue(self):
+        call = {'name': 'get_name', 'args': {}, 'id': 'call', 'type': 'tool_call'}
+        self.assertEqual(AgentRuntime._should_continue({'messages': [AIMessage(content='', tool_calls=[call])]}), 'continue')
+        self.assertEqual(AgentRuntime._should_continue({'messages': [AIMessage(content='ok')]}), 'end')
+        self.assertEqual(AgentRuntime._should_continue({'messages': [ToolMessage(content='ok', tool_call_id='call')]}), 'end')
+
+
+class TestWorkoutStore(unittest.TestCase):
+
+    def test_shared_limit(self):
+        forgotten = []
+        threads = ThreadLimit(2)
+        threads.on_evict(forgotten.append)
+        store = WorkoutStore(threads=threads)
+
+        store.set('a', Workout(name='A'))
+        store.set('b', Workout(name='B'))
+        store.get('a')
+        threads.touch('c')
+        self.assertEqual(forgotten, ['b'])
+        self.assertIsNone(store.get('b'))
+        self.assertEqual(store.get('a').name, 'A')
+
+
+if __name__ == '__main__':
+    unittest.main()
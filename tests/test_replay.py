@@ -0,0 +1,157 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import tempfile
+import unittest
+
+import httpx
+
+from .context import tools
+from tools.replay.recordings import RecordingStore, request_key
+from tools.replay.server import ReplayServer
+
+
+MESSAGES = [
+    {'role': 'system', 'content': 'Answer with JSON.'},
+    {'role': 'user', 'content': '4 x 400m'},
+]
+
+
+def upstream_answer(body: dict) -> str:
+    """What the fake upstream model says: the last message, reversed"""
+    return body['messages'][-1]['content'][::-1]
+
+
+def request(model: str = 'model', stream: bool = False, **fields) -> dict:
+    return dict({'model': model, 'messages': MESSAGES, 'stream': stream}, **fields)
+
+
+def post(server: ReplayServer, body: dict) -> httpx.Response:
+    return httpx.post(server.base_url + 'chat/completions', json=body, headers={'Authorization': 'Bearer key'})
+
+
+def content(response: httpx.Response) -> str:
+    """The answer text, from a JSON or a streamed response"""
+    if response.headers['content-type'].startswith('text/event-stream'):
+        chunks = [json.loads(line[len('data: '):]) for line in response.text.splitlines() if line.startswith('data: {')]
+        return ''.join(chunk['choices'][0]['delta'].get('content') or '' for chunk in chunks if chunk['choices'])
+    return response.json()['choices'][0]['message']['content']
+
+
+class TestRequestKey(unittest.TestCase):
+
+    def test_stable(self):
+        key = request_key(request())
+        self.assertEqual(key, request_key(json.loads(json.dumps(request()))))
+        self.assertEqual(key, request_key(dict(reversed(list(request().items())))))
+        # Streaming doesn't change the answer
+        self.assertEqual(key, request_key(request(stream=True, stream_options={'include_usage': True}, user='someone')))
+
+    def test_changes_with_the_prompt(self):
+        key = request_key(request())
+        self.assertNotEqual(key, request_key(request(model='other')))
+        self.assertNotEqual(key, request_key(request(temperature=0.7)))
+        self.assertNotEqual(key, request_key(dict(request(), messages=MESSAGES[:1])))
+
+    def test_tool_call_ids(self):
+        def conversation(call_id: str) -> dict:
+            return request(messages=MESSAGES + [
+                {'role': 'assistant', 'content': '', 'tool_calls': [{'id': call_id, 'type': 'function', 'function': {'name': 'parse_workout', 'arguments': '{}'}}]},
+                {'role': 'tool', 'content': 'Successfully created the workout from 4 x 400m', 'tool_call_id': call_id},
+            ])
+
+        self.assertEqual(request_key(conversation('call_abc')), request_key(conversation('call_xyz')))
+
+
+class TestRecordingStore(unittest.TestCase):
+
+    def test_responses_in_turn(self):
+        store = RecordingStore()
+        store.add('key', {}, {'body': 'first'})
+        store.add('key', {}, {'body': 'second'})
+        self.assertEqual([store.next('key')['body'] for _ in range(3)], ['first', 'second', 'first'])
+        self.assertIsNone(store.next('other'))
+        self.assertEqual(len(store), 2)
+
+
+class TestRoundTrip(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'recordings.jsonl')
+
+    def record(self, *bodies: dict) -> list:
+        """Send the requests through a recording proxy in front of a fake model"""
+        with ReplayServer(RecordingStore(), port=0, fallback=upstream_answer) as upstream:
+            with ReplayServer(RecordingStore(self.path), port=0, upstream=upstream.base_url) as proxy:
+                responses = [post(proxy, body) for body in bodies]
+                self.assertEqual(proxy.stats.recorded, len(bodies))
+        return responses
+
+    def test_non_stream(self):
+        (recorded,) = self.record(request())
+        self.assertEqual(content(recorded), 'm004 x 4')
+
+        with ReplayServer(RecordingStore(self.path), port=0) as replay:
+            replayed = post(replay, request())
+            self.assertEqual(replayed.status_code, 200)
+            self.assertEqual(replayed.json(), recorded.json())
+            # The same recording answers a streamed request
+            self.assertEqual(content(post(replay, request(stream=True))), 'm004 x 4')
+            self.assertEqual(replay.stats.hits, 2)
+
+    def test_stream(self):
+        (recorded,) = self.record(request(stream=True))
+        self.assertTrue(recorded.headers['content-type'].startswith('text/event-stream'))
+        self.assertEqual(content(recorded), 'm004 x 4')
+
+        with ReplayServer(RecordingStore(self.path), port=0) as replay:
+            self.assertEqual(content(post(replay, request(stream=True))), 'm004 x 4')
+            # and a plain one, put back together from the events
+            replayed = post(replay, request())
+            self.assertEqual(replayed.headers['content-type'], 'application/json')
+            self.assertEqual(content(replayed), 'm004 x 4')
+
+    def test_openai_client(self):
+        from tools.clients import ClientFactory
+
+        self.record(request())
+        with ReplayServer(RecordingStore(self.path), port=0) as replay:
+            clients = ClientFactory(base_url=replay.base_url)
+            self.addCleanup(clients.close)
+            completion = clients.openai('key').chat.completions.create(model='model', messages=MESSAGES)
+            self.assertEqual(completion.choices[0].message.content, 'm004 x 4')
+
+    def test_upstream_errors_are_not_recorded(self):
+        with ReplayServer(RecordingStore(), port=0, error_rate=1.0) as upstream:
+            with ReplayServer(RecordingStore(self.path), port=0, upstream=upstream.base_url) as proxy:
+                self.assertEqual(post(proxy, request()).status_code, 503)
+                self.assertEqual((proxy.stats.recorded, proxy.stats.upstream_errors), (0, 1))
+        self.assertEqual(len(RecordingStore(self.path)), 0)
+
+
+class TestMisses(unittest.TestCase):
+
+    def test_not_found(self):
+        with ReplayServer(RecordingStore(), port=0) as replay:
+            response = post(replay, request())
+            self.assertEqual(response.status_code, 404)
+            self.assertEqual(response.json()['error']['type'], 'replay_miss')
+            self.assertEqual(replay.stats.misses, 1)
+
+    def test_fallback(self):
+        with ReplayServer(RecordingStore(), port=0, fallback='{"type": "workout"}') as replay:
+            self.assertEqual(content(post(replay, request())), '{"type": "workout"}')
+            self.assertEqual(content(post(replay, request(stream=True))), '{"type": "workout"}')
+            self.assertEqual((replay.stats.hits, replay.stats.misses), (0, 2))
+
+    def test_fallback_function(self):
+        with ReplayServer(RecordingStore(), port=0, fallback=upstream_answer) as replay:
+            self.assertEqual(content(post(replay, request())), 'm004 x 4')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,152 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import re
+import unittest
+
+from .context import tools
+from .fakes import FakeChain
+from tools.extraction.cache import ResponseCache
+from tools.extraction.exceptions import DecodingError, ModelError
+from tools.extraction.json_extractor import JSONExtractor
+from tools.extraction.routing import COMPLEX_LENGTH, COMPLEXITY_PATTERNS, ModelTier, RoutingPolicy
+
+
+RUN = '{"type": "workout", "steps": [{"type": "run", "value": 400, "unit": "meters"}]}'
+
+SIMPLE = [
+    '4 x 400m',
+    'easy 5 mile run',
+    '6 x 800m with 2 minutes rest',
+    'Warm up 2 miles, 3 x 1 mile at tempo, cool down 2 miles',
+]
+
+# One example per entry in COMPLEXITY_PATTERNS, in the same order
+COMPLEX = [
+    '400m ladder up to 1600m',
+    'pyramid 200-400-800-400-200',
+    '6 x 800m with equal recovery',
+    '5 x 1k at 95% effort',
+    'alternate 200m fast and 200m float',
+    'tempo for 3 miles',
+    'descending 1200, 1000, 800',
+    '2 x (4 x 400m with 60s rest)',
+]
+
+
+def extractor(fast: list, full: list, **kwargs) -> JSONExtractor:
+    """An extractor on the tiered policy with scripted answers for each tier"""
+    extractor = JSONExtractor('key', shorthand_threshold=None, routing=RoutingPolicy.tiered(), **kwargs)
+    extractor._chains = {'fast': FakeChain(fast), 'full': FakeChain(full)}
+    return extractor
+
+
+class TestRoutingPolicy(unittest.TestCase):
+
+    def test_every_pattern_has_an_example(self):
+        self.assertEqual(len(COMPLEX), len(COMPLEXITY_PATTERNS))
+        for (pattern, example) in zip(COMPLEXITY_PATTERNS, COMPLEX):
+            with self.subTest(pattern=pattern):
+                self.assertIsNotNone(re.search(pattern, example, re.IGNORECASE))
+
+    def test_simple_inputs_start_fast(self):
+        policy = RoutingPolicy.tiered()
+        for input in SIMPLE:
+            with self.subTest(input=input):
+                self.assertFalse(policy.is_complex(input))
+                self.assertEqual([x.name for x in policy.tiers_for(input)], ['fast', 'full'])
+
+    def test_complex_inputs_go_straight_to_full(self):
+        policy = RoutingPolicy.tiered()
+        for input in COMPLEX + [x.upper() for x in COMPLEX]:
+            with self.subTest(input=input):
+                self.assertEqual([x.name for x in policy.tiers_for(input)], ['full'])
+
+    def test_long_inputs_are_complex(self):
+        policy = RoutingPolicy.tiered()
+        self.assertFalse(policy.is_complex('a' * COMPLEX_LENGTH))
+        self.assertTrue(policy.is_complex('a' * (COMPLEX_LENGTH + 1)))
+
+    def test_single_tier(self):
+        policy = RoutingPolicy.single('model', 0.0)
+        self.assertEqual([x.name for x in policy.tiers_for(SIMPLE[0])], ['default'])
+        self.assertEqual([x.name for x in policy.tiers_for(COMPLEX[0])], ['default'])
+
+    def test_rejects_bad_tiers(self):
+        with self.assertRaises(ValueError):
+            RoutingPolicy([])
+        with self.assertRaises(ValueError):
+            RoutingPolicy([ModelTier('a', 'x', 0.0), ModelTier('a', 'y', 0.0)])
+
+
+class TestEscalation(unittest.TestCase):
+
+    def test_decoding_error_escalates(self):
+        subject = extractor(['not a workout'], [RUN])
+        workout = subject.extract(SIMPLE[0])
+
+        self.assertEqual(len(workout.steps), 1)
+        self.assertEqual((len(subject._chains['fast'].inputs), len(subject._chains['full'].inputs)), (1, 1))
+        stats = subject.routing.stats.to_dict()
+        self.assertEqual(stats['escalations'], 1)
+        self.assertEqual(stats['tiers']['fast']['decode_failures'], 1)
+        self.assertEqual(stats['tiers']['full']['successes'], 1)
+
+    def test_model_error_escalates(self):
+        subject = extractor([RuntimeError('throttled')], [RUN])
+        self.assertEqual(len(subject.extract(SIMPLE[0]).steps), 1)
+        self.assertEqual(subject.routing.stats.to_dict()['tiers']['fast']['model_errors'], 1)
+
+    def test_last_error_is_raised(self):
+        with self.assertRaises(DecodingError):
+            extractor([RuntimeError('throttled')], ['not a workout']).extract(SIMPLE[0])
+        with self.assertRaises(ModelError):
+            extractor(['not a workout'], [RuntimeError('throttled')]).extract(SIMPLE[0])
+
+    def test_fast_answer_is_kept(self):
+        subject = extractor([RUN], [])
+        self.assertEqual(len(subject.extract(SIMPLE[0]).steps), 1)
+        self.assertEqual(subject._chains['full'].inputs, [])
+        self.assertEqual(subject.routing.stats.escalations, 0)
+
+    def test_complex_input_skips_fast(self):
+        subject = extractor([], [RUN])
+        subject.extract(COMPLEX[0])
+        self.assertEqual(subject._chains['fast'].inputs, [])
+        self.assertEqual(len(subject._chains['full'].inputs), 1)
+
+    def test_cache_is_per_tier(self):
+        subject = extractor(['not a workout'], [RUN], cache=ResponseCache(path=None))
+        subject.extract(SIMPLE[0])
+        # The fast answer failed, so only the full one was cached. The fast
+        # tier is asked again before the cache hit on the full tier.
+        subject._chains['fast'].responses.append('still not a workout')
+        subject.extract(SIMPLE[0])
+
+        stats = subject.routing.stats.to_dict()['tiers']
+        self.assertEqual(len(subject._chains['full'].inputs), 1)
+        self.assertEqual(stats['fast']['decode_failures'], 2)
+        self.assertEqual(stats['full']['cache_hits'], 1)
+
+
+class TestStreaming(unittest.TestCase):
+
+    def test_records_the_full_tier(self):
+        subject = extractor([], [RUN, 'not a workout', RuntimeError('throttled')], cache=ResponseCache(path=None))
+        self.assertEqual(len(subject.extract_streaming(SIMPLE[0]).steps), 1)
+        with self.assertRaises(DecodingError):
+            subject.extract_streaming(SIMPLE[1])
+        with self.assertRaises(ModelError):
+            subject.extract_streaming(SIMPLE[2])
+        subject.extract_streaming(SIMPLE[0])
+
+        stats = subject.routing.stats.to_dict()['tiers']
+        self.assertEqual(subject._chains['fast'].inputs, [])
+        self.assertEqual((stats['full']['decode_failures'], stats['full']['model_errors']), (1, 1))
+        # The second 4 x 400m is a cache hit, which counts as a success
+        self.assertEqual((stats['full']['requests'], stats['full']['successes'], stats['full']['cache_hits']), (4, 2, 1))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,113 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import asyncio
+import unittest
+
+from .context import agents
+from .fakes import FakeChain, FakeChatModel
+from agents.polite_responder import PoliteResponder
+from agents.primary_agent import AgentRuntime
+from agents.templated_responder import RESPONSE_TEMPLATES, TemplatedResponder
+from langchain_core.messages import AIMessage, ToolMessage
+from tools.validation.workout.workout import Workout
+
+
+def tool_messages() -> list:
+    """Every tool result the agent produces, and what the answer should repeat"""
+    runtime = AgentRuntime('key', model=FakeChatModel(), intent_threshold=None)
+    config = {'configurable': {'thread_id': 'templates'}}
+    messages = [
+        (runtime._workout_success_message('4 x 400m'), []),
+        (runtime._workout_failure_message('something odd'), []),
+        (runtime._get_workout_name(config), []),
+        (runtime._set_workout_name('Hills', config), []),
+    ]
+    runtime.workouts.set('templates', Workout(name='Tempo'))
+    messages += [
+        (runtime._get_workout_name(config), ['Tempo']),
+        (runtime._set_workout_name('  Hills ', config), ['Hills']),
+        (runtime._set_workout_name(' ', config), []),
+        # streamlit/agentic.py reports the image results itself
+        ('Successfully created one workout from a.png.', ['one workout']),
+        ('Successfully created 3 workouts from a.png, b.png.', ['3 workouts']),
+    ]
+    return messages
+
+
+class TestTemplatedResponder(unittest.TestCase):
+
+    def test_answers_every_tool_result(self):
+        responder = TemplatedResponder(seed=1)
+        for (message, values) in tool_messages():
+            with self.subTest(message=message):
+                response = responder.respond(message)
+                self.assertIsNotNone(response)
+                for value in values:
+                    self.assertIn(value, response)
+        self.assertEqual(responder.stats.fallbacks, 0)
+
+    def test_every_choice_formats(self):
+        fields = {'input': 'input', 'count': 'one workout', 'name': 'name'}
+        for (_, choices) in RESPONSE_TEMPLATES:
+            for choice in choices:
+                with self.subTest(choice=choice):
+                    # The responder's prompt doesn't ask questions either
+                    self.assertNotIn('?', choice.format(**fields))
+
+    def test_falls_back_on_anything_else(self):
+        responder = TemplatedResponder()
+        self.assertIsNone(responder.respond('What is a fartlek?'))
+        self.assertIsNone(responder.respond('Success. Workout name set to Hills and saved'))
+        self.assertIsNone(responder.respond([{'type': 'text', 'text': 'Success. Workout name was cleared.'}]))
+        self.assertEqual(responder.stats.to_dict(), {'templated': 0, 'fallbacks': 3, 'fast_path_rate': 0.0})
+
+    def test_seed(self):
+        message = 'Failed to create a workout from 4 x 400m'
+        (first, second) = (TemplatedResponder(seed=7), TemplatedResponder(seed=7))
+        self.assertEqual([first.respond(message) for _ in range(5)], [second.respond(message) for _ in range(5)])
+
+
+class TestPoliteResponder(unittest.TestCase):
+
+    def responder(self, *responses) -> PoliteResponder:
+        responder = PoliteResponder('key', templated=TemplatedResponder(seed=1))
+        responder._chain = FakeChain(responses)
+        return responder
+
+    def test_templated_skips_the_llm(self):
+        responder = self.responder()
+        message = ToolMessage(content='Success. Workout name set to Hills.', tool_call_id='call')
+
+        self.assertIn('Hills', responder.respond_to(message))
+        chunks = list(responder.stream_response_to(message))
+        self.assertEqual(len(chunks), 1)
+        self.assertIn('Hills', chunks[0])
+        self.assertIn('Hills', asyncio.run(responder.arespond_to(message)))
+        self.assertEqual(responder._chain.inputs, [])
+        self.assertEqual(responder.templated.stats.fallbacks, 0)
+
+    def test_falls_back_to_the_llm(self):
+        answer = 'A fartlek mixes fast and easy running.'
+        responder = self.responder(answer, answer, answer)
+        message = AIMessage(content='Explain what a fartlek is.')
+
+        self.assertEqual(responder.respond_to(message), answer)
+        chunks = list(responder.stream_response_to(message))
+        self.assertGreater(len(chunks), 1)
+        self.assertEqual(''.join(chunks), answer)
+        self.assertEqual(asyncio.run(responder.arespond_to(message)), answer)
+
+        # The LLM gets the message and the instruction
+        self.assertEqual(len(responder._chain.inputs), 3)
+        self.assertEqual([x.content for x in responder._chain.inputs[0]], [message.content, PoliteResponder._INSTRUCTION])
+        self.assertEqual(responder.templated.stats.to_dict()['fallbacks'], 3)
+
+    def test_llm_failure(self):
+        responder = self.responder(RuntimeError('down'))
+        self.assertIsNone(responder.respond_to(AIMessage(content='Explain what a fartlek is.')))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,280 @@
+import asyncio
+import os
+import threading
+
+from typing import TYPE_CHECKING, Callable, Dict
+
+import httpx
+
+# openai and langchain_openai take over a second to import, so they're only
+# loaded when the first client is made
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
+    from openai import AsyncOpenAI, OpenAI
+
+
+SAMBANOVA_BASE_URL = "https://api.sambanova.ai/v1/"
+
+# Set this environment variable to point every client at another
+# OpenAI-compatible server, e.g. the replay stub in tools/replay
+BASE_URL_VARIABLE = 'SAMBANOVA_BASE_URL'
+
+# Pool defaults. max_connections bounds the number of requests in flight to
+# the endpoint from this process, so size it for the expected concurrency.
+MAX_CONNECTIONS = 64
+MAX_KEEPALIVE_CONNECTIONS = 32
+KEEPALIVE_EXPIRY = 60.0
+
+# Seconds. The read timeout is long because the 405B model can take a while
+# to produce a large workout.
+CONNECT_TIMEOUT = 10.0
+READ_TIMEOUT = 120.0
+POOL_TIMEOUT = 30.0
+
+
+class PoolStats(object):
+    """Request and connection counters for one transport"""
+
+    def __init__(self):
+        self.requests = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.errors = 0
+        self._lock = threading.Lock()
+
+    def started(self):
+        with self._lock:
+            self.requests += 1
+            self.in_flight += 1
+            self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def finished(self, failed: bool = False):
+        with self._lock:
+            self.in_flight -= 1
+            if failed:
+                self.errors += 1
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak_in_flight,
+                'errors': self.errors,
+            }
+
+
+def _connection_counts(transport) -> dict:
+    """Open and idle connections in an httpx transport's pool"""
+    # httpx doesn't expose its pool, but httpcore's pool lists its connections
+    pool = getattr(transport, '_pool', None)
+    connections = list(getattr(pool, 'connections', []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    return {'connections': len(connections), 'idle_connections': idle}
+
+
+class CountingTransport(httpx.BaseTransport):
+    """Wraps an httpx transport to count the requests going through it"""
+
+    def __init__(self, transport: httpx.HTTPTransport):
+        self.transport = transport
+        self.stats = PoolStats()
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        try:
+            response = self.transport.handle_request(request)
+        except Exception:
+            self.stats.finished(failed=True)
+            raise
+        # A streamed body is still being read at this point, but the request
+        # has its connection, which is what matters for sizing the pool.
+        self.stats.finished()
+        return response
+
+    def close(self):
+        self.transport.close()
+
+    def to_dict(self) -> dict:
+        return self.stats.to_dict() | _connection_counts(self.transport)
+
+
+class AsyncCountingTransport(httpx.AsyncBaseTransport):
+    """
+    Asynchronous version of CountingTransport.
+
+    An async connection pool only works on the event loop that opened its
+    connections, but the clients holding this transport outlive any one loop
+    (e.g., every asyncio.run() makes a new one). So there is one pool per
+    running loop, made with make_transport, and the pools of closed loops are
+    dropped.
+    """
+
+    def __init__(self, make_transport: Callable[[], httpx.AsyncBaseTransport]):
+        self.make_transport = make_transport
+        self.stats = PoolStats()
+        self._transports: Dict[asyncio.AbstractEventLoop, httpx.AsyncBaseTransport] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def transport(self) -> httpx.AsyncBaseTransport:
+        """The pool for the running event loop"""
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.get(loop)
+            if transport is None:
+                # Their connections can't be closed without their loop, so
+                # they go when the transport is collected
+                for closed in [x for x in self._transports if x.is_closed()]:
+                    del self._transports[closed]
+                transport = self._transports[loop] = self.make_transport()
+            return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        self.stats.started()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except Exception:
+            self.stats.finished(failed=True)
+            raise
+        self.stats.finished()
+        return response
+
+    async def aclose(self):
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            transport = self._transports.pop(loop, None)
+        if transport is not None:
+            await transport.aclose()
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            transports = [x for (loop, x) in self._transports.items() if not loop.is_closed()]
+        counts = {'connections': 0, 'idle_connections': 0}
+        for transport in transports:
+            for (name, count) in _connection_counts(transport).items():
+                counts[name] += count
+        return self.stats.to_dict() | counts | {'loops': len(transports)}
+
+
+def default_base_url() -> str:
+    return os.environ.get(BASE_URL_VARIABLE) or SAMBANOVA_BASE_URL
+
+
+class ClientFactory(object):
+    """
+    Builds the model clients on top of one keep-alive connection pool.
+
+    Every OpenAI and ChatOpenAI client made by the same factory shares the
+    same httpx clients, so a TLS connection opened for one component is
+    reused by all of the others. Use shared_factory() to share one pool
+    across the whole process. The httpx clients are created on first use.
+    Without a base_url, the SAMBANOVA_BASE_URL environment variable is used
+    if it's set.
+    """
+
+    def __init__(
+        self,
+        base_url: str | None = None,
+        max_connections: int = MAX_CONNECTIONS,
+        max_keepalive_connections: int = MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry: float = KEEPALIVE_EXPIRY,
+        connect_timeout: float = CONNECT_TIMEOUT,
+        read_timeout: float = READ_TIMEOUT,
+        pool_timeout: float = POOL_TIMEOUT,
+    ):
+        self.base_url = base_url if base_url is not None else default_base_url()
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout, pool=pool_timeout)
+
+        self._http_client = None
+        self._async_http_client = None
+        self._lock = threading.Lock()
+
+    @property
+    def http_client(self) -> httpx.Client:
+        with self._lock:
+            if self._http_client is None:
+                transport = CountingTransport(httpx.HTTPTransport(limits=self.limits))
+                self._http_client = httpx.Client(transport=transport, timeout=self.timeout)
+            return self._http_client
+
+    @property
+    def async_http_client(self) -> httpx.AsyncClient:
+        # The client can be shared between event loops. Its transport keeps a
+        # separate pool for each one.
+        with self._lock:
+            if self._async_http_client is None:
+                transport = AsyncCountingTransport(lambda: httpx.AsyncHTTPTransport(limits=self.limits))
+                self._async_http_client = httpx.AsyncClient(transport=transport, timeout=self.timeout)
+            return self._async_http_client
+
+    # ------------------------------
+    # CLIENTS
+    # ------------------------------
+
+    def openai(self, api_key: str) -> 'OpenAI':
+        from openai import OpenAI
+        return OpenAI(base_url=self.base_url, api_key=api_key, http_client=self.http_client)
+
+    def async_openai(self, api_key: str) -> 'AsyncOpenAI':
+        from openai import AsyncOpenAI
+        return AsyncOpenAI(base_url=self.base_url, api_key=api_key, http_client=self.async_http_client)
+
+    def chat_openai(self, api_key: str, model: str, temperature: float, streaming: bool = False) -> 'ChatOpenAI':
+        from langchain_openai import ChatOpenAI
+        return ChatOpenAI(
+            base_url=self.base_url,
+            api_key=api_key,
+            streaming=streaming,
+            temperature=temperature,
+            model=model,
+            http_client=self.http_client,
+            http_async_client=self.async_http_client,
+        )
+
+    # ------------------------------
+    # STATISTICS
+    # ------------------------------
+
+    def stats(self) -> dict:
+        """Request and connection counts for the sync and async pools"""
+        with self._lock:
+            clients = {'sync': self._http_client, 'async': self._async_http_client}
+        return {
+            name: client._transport.to_dict() if client is not None else None
+            for (name, client) in clients.items()
+        }
+
+    def close(self):
+        with self._lock:
+            if self._http_client is not None:
+                self._http_client.close()
+                self._http_client = None
+            # The async pools have to be closed on their own loops. Dropping
+            # them lets the connections close when they are collected.
+            self._async_http_client = None
+
+
+_shared_factory = None
+_shared_lock = threading.Lock()
+
+
+def shared_factory() -> ClientFactory:
+    """The process-wide factory with the default pool settings"""
+    global _shared_factory
+    with _shared_lock:
+        if _shared_factory is None:
+            _shared_factory = ClientFactory()
+        return _shared_factory
+
+
+def set_shared_factory(factory: ClientFactory):
+    """Replace the process-wide factory, e.g. to change the pool size at startup"""
+    global _shared_factory
+    with _shared_lock:
+        _shared_factory = factory
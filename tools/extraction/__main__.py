@@ -0,0 +1,128 @@
+"""
+Bulk workout extraction.
+
+Reads one workout description per line from a text file, or one JSON value
+per line from a .jsonl file (either a string or an object with a "text" or
+"input" key), and writes one JSON result per line:
+
+    {"index": 3, "input": "6x1k I w/ 2:00 JG", "workout": {...}}
+    {"index": 4, "input": "???", "error": "Failed to extract ..."}
+
+Results are written as they complete, so use the "index" field to restore
+the input order. Usage:
+
+    python -m tools.extraction workouts.txt -o workouts.jsonl --max-concurrency 16
+"""
+
+import argparse
+import getpass
+import json
+import os
+import sys
+import time
+
+from typing import List, TextIO
+
+from dotenv import load_dotenv
+
+from .cache import ResponseCache
+from .exceptions import ExtractionError
+from .json_extractor import JSONExtractor
+from ..validation.workout.json import WorkoutEncoder
+
+
+def read_inputs(path: str) -> List[str]:
+    """Read the workout descriptions from a text or JSONL file"""
+    inputs = []
+    is_jsonl = path.endswith('.jsonl')
+    with open(path, 'r', encoding='utf-8') as file:
+        for line in file:
+            line = line.strip()
+            if len(line) == 0:
+                continue
+            if is_jsonl:
+                value = json.loads(line)
+                if isinstance(value, dict):
+                    value = value.get('text') or value.get('input')
+                if not isinstance(value, str):
+                    raise ValueError(f'Expected a string or an object with a "text" key: {line}')
+                line = value
+            inputs.append(line)
+    return inputs
+
+
+def get_api_key() -> str:
+    # Same lookup as the agents: environment, then .env, then ask
+    api_key = os.getenv('SAMBANOVA_API_KEY')
+    if api_key is None and load_dotenv():
+        api_key = os.getenv('SAMBANOVA_API_KEY')
+    if api_key is None:
+        api_key = getpass.getpass('SambaNova API key: ')
+    return api_key
+
+
+def write_progress(stream: TextIO, completed: int, total: int, failures: int, started: float):
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    stream.write(f'\r[{completed}/{total}] {failures} failed, {completed / elapsed:.2f} workouts/s')
+    stream.flush()
+
+
+def run(arguments: argparse.Namespace) -> int:
+    inputs = read_inputs(arguments.input)
+
+    cache = None
+    if arguments.cache is not None:
+        cache = ResponseCache(path=arguments.cache)
+    extractor = JSONExtractor(get_api_key(), cache=cache)
+
+    output = sys.stdout if arguments.output is None else open(arguments.output, 'w', encoding='utf-8')
+    progress = sys.stderr
+
+    completed = 0
+    failures = 0
+    started = time.perf_counter()
+    try:
+        results = extractor.from_strings(inputs, max_concurrency=arguments.max_concurrency, retries=arguments.retries)
+        for (index, result) in results:
+            record = {'index': index, 'input': inputs[index]}
+            if isinstance(result, ExtractionError):
+                failures += 1
+                record['error'] = str(result)
+            else:
+                record['workout'] = result
+            output.write(json.dumps(record, cls=WorkoutEncoder) + '\n')
+            output.flush()
+
+            completed += 1
+            if not arguments.quiet:
+                write_progress(progress, completed, len(inputs), failures, started)
+    finally:
+        if output is not sys.stdout:
+            output.close()
+
+    elapsed = time.perf_counter() - started
+    if not arguments.quiet:
+        progress.write('\n')
+    progress.write(
+        f'Extracted {completed - failures} of {len(inputs)} workouts in {elapsed:.2f}s '
+        f'({len(inputs) / max(elapsed, 1e-9):.2f} workouts/s, {failures} failed)\n'
+    )
+    if cache is not None:
+        progress.write(f'{cache.stats}\n')
+
+    return 0 if failures == 0 else 1
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m tools.extraction', description='Extract workouts in bulk.')
+    parser.add_argument('input', help='a text file with one workout per line, or a .jsonl file')
+    parser.add_argument('-o', '--output', help='where to write the JSONL results (default: stdout)')
+    parser.add_argument('-c', '--max-concurrency', type=int, default=8, help='requests in flight at once (default: 8)')
+    parser.add_argument('-r', '--retries', type=int, default=2, help='retries per input after the first attempt (default: 2)')
+    parser.add_argument('--cache', help='path of a SQLite response cache to read and update')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print the progress counter')
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
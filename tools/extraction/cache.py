@@ -0,0 +1,234 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from collections import OrderedDict
+from typing import Dict, Tuple
+
+
+def normalize_input(text: str) -> str:
+    """
+    Normalize the user's input so trivially different spellings of the same
+    request share a cache entry. Only whitespace is folded. Even case ends
+    up in the workout's name and notes, so anything else could change the
+    result.
+    """
+    return ' '.join(text.split())
+
+
+def template_hash(template: str) -> str:
+    """Short, stable fingerprint of a prompt template"""
+    return hashlib.sha256(template.encode('utf-8')).hexdigest()[:16]
+
+
+def cache_key(text: str, template: str, model: str, temperature: float) -> str:
+    """
+    Build the cache key for a request. The template is part of the key, so
+    editing the prompt automatically invalidates every previous entry.
+    """
+    parts = [
+        normalize_input(text),
+        template_hash(template),
+        model,
+        repr(float(temperature)),
+    ]
+    return hashlib.sha256('\x1f'.join(parts).encode('utf-8')).hexdigest()
+
+
+class CacheStats(object):
+    """
+    Counters for the response cache. The counters are cumulative for the
+    lifetime of the cache object.
+    """
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def hits(self) -> int:
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        if total == 0:
+            return 0.0
+        return self.hits / total
+
+    def to_dict(self) -> Dict[str, int | float]:
+        return {
+            'hits': self.hits,
+            'memory_hits': self.memory_hits,
+            'disk_hits': self.disk_hits,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'expirations': self.expirations,
+            'hit_rate': self.hit_rate,
+        }
+
+    def __repr__(self) -> str:
+        return f"CacheStats {self.to_dict()}"
+
+
+class ResponseCache(object):
+    """
+    Two tier cache for raw LLM responses.
+
+    The first tier is an in-memory LRU with a maximum size and a time-to-live.
+    The optional second tier is a SQLite database that can be shared between
+    processes (e.g., several Streamlit workers on the same host). Entries found
+    on disk are promoted into memory.
+
+    Only the raw model output is cached, not the decoded Workout, so the cached
+    value is always decoded fresh and callers cannot mutate a shared object.
+    """
+
+    def __init__(self, max_size: int = 1024, ttl: float | None = 24 * 60 * 60, path: str | os.PathLike | None = None):
+        if max_size < 1:
+            raise ValueError('max_size must be at least 1')
+
+        self.max_size = max_size
+        self.ttl = ttl
+        self.path = path
+        self.stats = CacheStats()
+
+        self._entries: OrderedDict[str, Tuple[float, str]] = OrderedDict()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        if path is not None:
+            self._create_table()
+
+    # ------------------------------
+    # PUBLIC INTERFACE
+    # ------------------------------
+
+    def get(self, key: str) -> str | None:
+        """Return the cached response for key, or None on a miss"""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                (created, value) = entry
+                if self._is_expired(created, now):
+                    del self._entries[key]
+                    self.stats.expirations += 1
+                else:
+                    self._entries.move_to_end(key)
+                    self.stats.memory_hits += 1
+                    return value
+
+        if self.path is not None:
+            entry = self._disk_get(key)
+            if entry is not None:
+                (created, value) = entry
+                if self._is_expired(created, now):
+                    self._disk_delete(key)
+                    with self._lock:
+                        self.stats.expirations += 1
+                else:
+                    with self._lock:
+                        self._memory_put(key, created, value)
+                        self.stats.disk_hits += 1
+                    return value
+
+        with self._lock:
+            self.stats.misses += 1
+        return None
+
+    def put(self, key: str, value: str):
+        """Store a response in every tier"""
+        created = time.time()
+        with self._lock:
+            self._memory_put(key, created, value)
+            self.stats.stores += 1
+
+        if self.path is not None:
+            self._disk_put(key, created, value)
+
+    def clear(self):
+        """Drop every entry. The counters are left alone."""
+        with self._lock:
+            self._entries.clear()
+
+        if self.path is not None:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM responses')
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    # ------------------------------
+    # MEMORY TIER
+    # ------------------------------
+
+    def _is_expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _memory_put(self, key: str, created: float, value: str):
+        """Insert into the LRU. The caller must hold the lock."""
+        self._entries[key] = (created, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+            self.stats.evictions += 1
+
+    # ------------------------------
+    # DISK TIER
+    # ------------------------------
+
+    # SQLite connections cannot be shared between threads, so keep one per
+    # thread. WAL mode lets several processes read while one writes.
+    def _connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=5.0)
+            connection.execute('PRAGMA journal_mode=WAL')
+            self._local.connection = connection
+        return connection
+
+    def _create_table(self):
+        connection = self._connection()
+        with connection:
+            connection.execute(
+                'CREATE TABLE IF NOT EXISTS responses ('
+                'key TEXT PRIMARY KEY, created REAL NOT NULL, value TEXT NOT NULL)'
+            )
+
+    def _disk_get(self, key: str) -> Tuple[float, str] | None:
+        try:
+            row = self._connection().execute(
+                'SELECT created, value FROM responses WHERE key = ?', (key,)
+            ).fetchone()
+        except sqlite3.Error:
+            # The disk tier is an optimization. Never fail a request because of it.
+            return None
+        return row
+
+    def _disk_put(self, key: str, created: float, value: str):
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute(
+                    'INSERT OR REPLACE INTO responses (key, created, value) VALUES (?, ?, ?)',
+                    (key, created, value)
+                )
+        except sqlite3.Error:
+            pass
+
+    def _disk_delete(self, key: str):
+        try:
+            connection = self._connection()
+            with connection:
+                connection.execute('DELETE FROM responses WHERE key = ?', (key,))
+        except sqlite3.Error:
+            pass
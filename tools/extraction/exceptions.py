@@ -0,0 +1,20 @@
+class ExtractionError(RuntimeError):
+    """Raised when an input string could not be turned into a workout"""
+
+    def __init__(self, input: str, reason: str | None = None):
+        self.input = input
+        self.reason = reason
+        if reason is not None:
+            super().__init__(f"Failed to extract a workout from {input!r}: {reason}")
+        else:
+            super().__init__(f"Failed to extract a workout from {input!r}")
+
+
+class ModelError(ExtractionError):
+    """The call to the model failed. These are usually worth retrying."""
+    pass
+
+
+class DecodingError(ExtractionError):
+    """The model answered, but the answer did not decode into a workout"""
+    pass
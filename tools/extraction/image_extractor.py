@@ -1,8 +1,15 @@
 import base64
 import json
+import threading
 
-from openai import OpenAI
-from typing import List
+from typing import TYPE_CHECKING, Any, BinaryIO, List
+
+from .. import tracing
+from ..clients import ClientFactory, shared_factory
+from .image_preprocessor import ImagePreprocessor, PreparedImage
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI, OpenAI
 
 
 class ImageExtractor(object):
@@ -13,16 +20,40 @@ class ImageExtractor(object):
     convert from natural language into something machine parsable.
     """
 
-    def __init__(self, api_key: str):
-        self.model = self._create_model(api_key)
+    _MODEL = "Llama-3.2-11B-Vision-Instruct"
+
+    def __init__(self, api_key: str, clients: ClientFactory | None = None, preprocessor: ImagePreprocessor | None = None):
+        self.clients = clients if clients is not None else shared_factory()
+        # Shrinks the image before upload. See image_preprocessor.py.
+        self.preprocessor = preprocessor if preprocessor is not None else ImagePreprocessor()
+
+        # The clients are made on first use so that importing and creating the
+        # extractor doesn't load openai
+        self._api_key = api_key
+        self._model = None
+        self._async_model = None
+        self._lock = threading.Lock()
 
-    def _create_model(self, api_key: str) -> OpenAI:
-        # Note that it's important to have the 405B-Instruct model here because certain
-        # requests involve reflection.
-        return OpenAI(
-            base_url="https://api.sambanova.ai/v1/",  
-            api_key=api_key,
-        )
+    @property
+    def model(self) -> 'OpenAI':
+        with self._lock:
+            if self._model is None:
+                self._model = self._create_model(self._api_key)
+            return self._model
+
+    @property
+    def async_model(self) -> 'AsyncOpenAI':
+        with self._lock:
+            if self._async_model is None:
+                self._async_model = self._create_async_model(self._api_key)
+            return self._async_model
+
+    def _create_model(self, api_key: str) -> 'OpenAI':
+        return self.clients.openai(api_key)
+
+    def _create_async_model(self, api_key: str) -> 'AsyncOpenAI':
+        # One async pool serves every coroutine running on the event loop
+        return self.clients.async_openai(api_key)
 
     # Function to encode the image
     def encode_image(self, image_path):
@@ -30,33 +61,71 @@ class ImageExtractor(object):
             return base64.b64encode(image_file.read()).decode('utf-8')
         
     def from_image(self, image_path) -> List[str] | None:
-        # Getting the base64 string
-        base64_image = self.encode_image(image_path)
-        return self.from_base64(base64_image)
+        return self.from_file(image_path)
+
+    def from_file(self, file: str | bytes | BinaryIO) -> List[str] | None:
+        """Preprocess an image (path, bytes or open file) and extract from it"""
+        prepared = self.prepare(file)
+        return self.from_base64(prepared.base64, prepared.mime_type)
 
-    def from_base64(self, base64_image) -> List[str] | None:
+    async def afrom_file(self, file: str | bytes | BinaryIO) -> List[str] | None:
+        """Asynchronous version of from_file"""
+        prepared = self.prepare(file)
+        return await self.afrom_base64(prepared.base64, prepared.mime_type)
+
+    def prepare(self, file: str | bytes | BinaryIO) -> PreparedImage:
+        with tracing.span('image.prepare') as span:
+            prepared = self.preprocessor.prepare(file)
+            span.set(bytes_in=prepared.original_bytes, bytes_out=prepared.encoded_bytes)
+            return prepared
+
+    def from_base64(self, base64_image, mime_type: str = 'image/jpeg') -> List[str] | None:
+        with tracing.span('image.extract', model=self._MODEL, bytes_in=len(base64_image)) as span:
+            response = self.model.chat.completions.create(
+                model=self._MODEL,
+                messages=self._messages(base64_image, mime_type),
+            )
+            return self._traced_response(span, response)
+
+    async def afrom_base64(self, base64_image, mime_type: str = 'image/jpeg') -> List[str] | None:
+        """Asynchronous version of from_base64 with the same error semantics"""
+        with tracing.span('image.extract', model=self._MODEL, bytes_in=len(base64_image)) as span:
+            response = await self.async_model.chat.completions.create(
+                model=self._MODEL,
+                messages=self._messages(base64_image, mime_type),
+            )
+            return self._traced_response(span, response)
+
+    def _traced_response(self, span, response: Any) -> List[str] | None:
+        usage = getattr(response, 'usage', None)
+        if usage is not None:
+            span.set(tokens_in=usage.prompt_tokens, tokens_out=usage.completion_tokens)
+        result = self._parse_response(response)
+        if result is None:
+            span.fail('unparsed')
+        return result
+
+    def _messages(self, base64_image, mime_type: str = 'image/jpeg') -> List[dict]:
         # SambaNova currently does to support system messages with vision
-        response = self.model.chat.completions.create(
-            model="Llama-3.2-11B-Vision-Instruct",
-            messages=[
+        return [
+            {
+            'role': 'user',
+            'content': [
                 {
-                'role': 'user',
-                'content': [
-                    {
-                        'type': 'text',
-                        'text': 'You are a text extractor.\nYou only respond by returning an array containing a list of strings representing workouts.\nIf there are no discernible workouts in the image, return a single string with all of the extracted text.\nDiscard any irrelevant text.\nRespond with a valid JSON array only.\nDo not add a preamble or discussion.\nWhat are the workouts in this image?',
-                    },
-                    {
-                        'type': 'image_url',
-                        'image_url': {
-                            "url":  f"data:image/jpeg;base64,{base64_image}"
-                        },
+                    'type': 'text',
+                    'text': 'You are a text extractor.\nYou only respond by returning an array containing a list of strings representing workouts.\nIf there are no discernible workouts in the image, return a single string with all of the extracted text.\nDiscard any irrelevant text.\nRespond with a valid JSON array only.\nDo not add a preamble or discussion.\nWhat are the workouts in this image?',
+                },
+                {
+                    'type': 'image_url',
+                    'image_url': {
+                        "url":  f"data:{mime_type};base64,{base64_image}"
                     },
-                ],
-                }
+                },
             ],
-        )
+            }
+        ]
 
+    def _parse_response(self, response: Any) -> List[str] | None:
         try:
             # Response should be either a string or an array
             resp = json.loads(response.choices[0].message.content)
@@ -0,0 +1,233 @@
+import binascii
+import io
+
+from typing import BinaryIO, Tuple
+
+try:
+    from PIL import Image, ImageChops, ImageOps
+except ImportError:
+    # Without Pillow, images are sent as they are, but with the right MIME type
+    Image = None
+
+
+# Llama 3.2 Vision splits an image into at most four 560 x 560 tiles, so
+# anything larger than 1120 pixels on a side is thrown away by the model.
+MAX_DIMENSION = 1120
+
+# Plenty for printed or handwritten text once the image is grayscale
+JPEG_QUALITY = 80
+
+# Pixels at least this far from white (0 - 255) count as content when cropping
+CROP_THRESHOLD = 48
+
+# Border left around the content after cropping, as a fraction of the size
+CROP_MARGIN = 0.02
+
+# Magic numbers for the formats the vision endpoint accepts
+_SIGNATURES = [
+    (b'\xff\xd8\xff', 'image/jpeg'),
+    (b'\x89PNG\r\n\x1a\n', 'image/png'),
+    (b'GIF87a', 'image/gif'),
+    (b'GIF89a', 'image/gif'),
+]
+
+_CHUNK_SIZE = 3 * 64 * 1024
+
+
+def sniff_mime_type(header: bytes) -> str:
+    """The MIME type from the first few bytes of an image file"""
+    for (signature, mime_type) in _SIGNATURES:
+        if header.startswith(signature):
+            return mime_type
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'image/webp'
+    return 'image/jpeg'
+
+
+class Base64Writer(io.RawIOBase):
+    """
+    A write-only file that base64-encodes whatever is written to it. Only the
+    encoded text is kept, so the encoder can write straight into it without
+    an intermediate copy of the raw bytes.
+    """
+
+    def __init__(self):
+        self._pending = b''
+        self._parts = []
+        self.bytes_written = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        data = bytes(data)
+        count = len(data)
+        self.bytes_written += count
+        data = self._pending + data
+
+        # Base64 works on three bytes at a time
+        usable = len(data) - len(data) % 3
+        if usable > 0:
+            self._parts.append(binascii.b2a_base64(data[:usable], newline=False).decode('ascii'))
+        self._pending = data[usable:]
+        return count
+
+    def getvalue(self) -> str:
+        if self._pending:
+            self._parts.append(binascii.b2a_base64(self._pending, newline=False).decode('ascii'))
+            self._pending = b''
+        value = ''.join(self._parts)
+        self._parts = [value]
+        return value
+
+
+class PreparedImage(object):
+    """A preprocessed image ready to send to the vision model"""
+
+    def __init__(self, base64_image: str, mime_type: str, size: Tuple[int, int] | None, original_bytes: int, encoded_bytes: int):
+        self.base64 = base64_image
+        self.mime_type = mime_type
+        self.size = size
+        self.original_bytes = original_bytes
+        self.encoded_bytes = encoded_bytes
+
+    @property
+    def data_url(self) -> str:
+        return f'data:{self.mime_type};base64,{self.base64}'
+
+    def __repr__(self) -> str:
+        return f'PreparedImage <{self.mime_type} {self.size}: {self.original_bytes} -> {self.encoded_bytes} bytes>'
+
+
+class ImagePreprocessor(object):
+    """
+    Shrinks images before they go to the vision model.
+
+    Images are rotated upright, scaled down to the largest size the model can
+    use, converted to grayscale, cropped to the area that isn't blank paper or
+    whiteboard, and re-encoded as JPEG. The encoder writes directly into a
+    base64 buffer. Set any of the options to None or False to skip that step.
+    """
+
+    def __init__(
+        self,
+        max_dimension: int | None = MAX_DIMENSION,
+        grayscale: bool = True,
+        crop: bool = True,
+        quality: int = JPEG_QUALITY,
+        crop_threshold: int = CROP_THRESHOLD,
+    ):
+        self.max_dimension = max_dimension
+        self.grayscale = grayscale
+        self.crop = crop
+        self.quality = quality
+        self.crop_threshold = crop_threshold
+
+    def prepare(self, source: str | bytes | BinaryIO) -> PreparedImage:
+        """Prepare an image from a path, the raw file bytes or an open file"""
+        if isinstance(source, str):
+            with open(source, 'rb') as file:
+                return self._prepare_file(file)
+        if isinstance(source, (bytes, bytearray, memoryview)):
+            return self._prepare_file(io.BytesIO(source))
+        return self._prepare_file(source)
+
+    def _prepare_file(self, file: BinaryIO) -> PreparedImage:
+        if hasattr(file, 'seek'):
+            file.seek(0, io.SEEK_END)
+            original_bytes = file.tell()
+            file.seek(0)
+        else:
+            original_bytes = None
+
+        if Image is None:
+            return self._passthrough(file, original_bytes)
+
+        with Image.open(file) as image:
+            # Let the JPEG decoder skip the detail we'd throw away anyway
+            if self.max_dimension is not None:
+                image.draft('L' if self.grayscale else 'RGB', (self.max_dimension, self.max_dimension))
+
+            processed = self.process(image)
+
+        writer = Base64Writer()
+        processed.save(writer, format='JPEG', quality=self.quality, optimize=True)
+        return PreparedImage(
+            writer.getvalue(),
+            'image/jpeg',
+            processed.size,
+            original_bytes if original_bytes is not None else writer.bytes_written,
+            writer.bytes_written,
+        )
+
+    def process(self, image: 'Image.Image') -> 'Image.Image':
+        """The preprocessing steps, without the encoding"""
+        # Phone photos are often stored sideways with an EXIF rotation
+        image = ImageOps.exif_transpose(image)
+
+        # JPEG can't store transparency, so put it on white paper. This has
+        # to come first: converting drops the alpha and leaves what was under
+        # it, which is usually black.
+        if self._is_transparent(image):
+            image = self._flatten(image)
+
+        if self.grayscale:
+            image = image.convert('L')
+        elif image.mode not in ('L', 'RGB'):
+            image = image.convert('RGB')
+
+        if self.crop:
+            image = self._crop(image)
+
+        if self.max_dimension is not None and max(image.size) > self.max_dimension:
+            image.thumbnail((self.max_dimension, self.max_dimension), Image.Resampling.LANCZOS)
+
+        return image
+
+    @staticmethod
+    def _is_transparent(image: 'Image.Image') -> bool:
+        # Palette and plain images keep their transparent color in info
+        return image.mode in ('RGBA', 'RGBa', 'LA', 'La', 'PA') or 'transparency' in image.info
+
+    def _flatten(self, image: 'Image.Image') -> 'Image.Image':
+        image = image.convert('RGBA')
+        background = Image.new('RGBA', image.size, (255, 255, 255, 255))
+        return Image.alpha_composite(background, image).convert('RGB')
+
+    def _crop(self, image: 'Image.Image') -> 'Image.Image':
+        gray = image if image.mode == 'L' else image.convert('L')
+        difference = ImageChops.difference(gray, Image.new('L', gray.size, 255))
+        mask = difference.point(lambda x: 255 if x >= self.crop_threshold else 0)
+        box = mask.getbbox()
+        if box is None:
+            # Nothing but blank space. Leave it to the model.
+            return image
+
+        (width, height) = image.size
+        margin = int(round(max(width, height) * CROP_MARGIN))
+        box = (
+            max(0, box[0] - margin),
+            max(0, box[1] - margin),
+            min(width, box[2] + margin),
+            min(height, box[3] + margin),
+        )
+        if box == (0, 0, width, height):
+            return image
+        return image.crop(box)
+
+    def _passthrough(self, file: BinaryIO, original_bytes: int | None) -> PreparedImage:
+        """Encode the file as is, a chunk at a time"""
+        writer = Base64Writer()
+        header = file.read(_CHUNK_SIZE)
+        mime_type = sniff_mime_type(header)
+        chunk = header
+        while chunk:
+            writer.write(chunk)
+            chunk = file.read(_CHUNK_SIZE)
+        return PreparedImage(
+            writer.getvalue(),
+            mime_type,
+            None,
+            original_bytes if original_bytes is not None else writer.bytes_written,
+            writer.bytes_written,
+        )
@@ -1,9 +1,26 @@
-from langchain_core.output_parsers import StrOutputParser
-from langchain_core.prompts import ChatPromptTemplate
-from langchain_openai import ChatOpenAI
+import contextvars
+import threading
+import time
 
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import closing
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, Iterator, List, Tuple
+
+from .. import tracing
+from ..clients import ClientFactory, shared_factory
+from .cache import ResponseCache, cache_key
+from .exceptions import DecodingError, ExtractionError, ModelError
+from .routing import ModelTier, RoutingPolicy
+from .templates import FULL, JSON_EXTRACTOR_TEMPLATES, get_template
+from ..validation.workout.exceptions import InvalidWorkoutPrefixError
+from ..validation.workout.compiled import CompiledWorkoutDecoder
+from ..validation.workout.shorthand import ShorthandParser
+from ..validation.workout.steps import AbstractWorkoutStep, RepetitionStep
+from ..validation.workout.stream import IncrementalWorkoutDecoder
 from ..validation.workout.workout import Workout
-from ..validation.workout.json import WorkoutDecoder
+
+if TYPE_CHECKING:
+    from langchain_openai import ChatOpenAI
 
 
 class JSONExtractor(object):
@@ -11,25 +28,70 @@ class JSONExtractor(object):
     The JSON extractor uses Llama 405B to parse natural language into formatted
     JSON strings. These formatted strings can be sent to later stages for 
     refinement.
+
+    With a tiered RoutingPolicy, simple inputs try a smaller model first and
+    only escalate to the 405B model when the answer fails to decode.
     """
 
-    def __init__(self, api_key: str):
-        self.chain = self._create_chain(api_key)
-        self.decoder = WorkoutDecoder()
-
-    def _create_chain(self, api_key: str) -> ChatOpenAI:
-        # Note that it's important to have the 405B-Instruct model here because certain
-        # requests involve reflection.
-        model = ChatOpenAI(
-            base_url="https://api.sambanova.ai/v1/",  
-            api_key=api_key,
-            streaming=False,
-            temperature=0.02,
-            model="Meta-Llama-3.1-405B-Instruct",
-        )
+    # Note that it's important to have the 405B-Instruct model here because certain
+    # requests involve reflection.
+    _MODEL = "Meta-Llama-3.1-405B-Instruct"
+    _TEMPERATURE = 0.02
+
+    # Seconds to wait before the first retry in from_strings. Doubles each time.
+    _RETRY_DELAY = 0.5
+
+    # Inputs the shorthand parser understands at least this well skip the LLM.
+    # Set shorthand_threshold to None to always use the LLM.
+    _SHORTHAND_THRESHOLD = 0.9
+
+    _DEFAULT_TEMPLATE = JSON_EXTRACTOR_TEMPLATES[FULL]
+
+    def __init__(self, api_key: str, cache: ResponseCache | None = None, shorthand_threshold: float | None = _SHORTHAND_THRESHOLD, template: str = FULL, routing: RoutingPolicy | None = None, clients: ClientFactory | None = None):
+        # See templates.py for the variants and benchmarks/templates.py to compare them
+        self.template = get_template(JSON_EXTRACTOR_TEMPLATES, template)
+
+        # Without a routing policy, everything goes to the 405B model
+        if routing is None:
+            routing = RoutingPolicy.single(self._MODEL, self._TEMPERATURE)
+        self.routing = routing
+
+        # Every tier shares the process-wide connection pool by default
+        self.clients = clients if clients is not None else shared_factory()
+
+        # The chains are built on first use. Shorthand and cached inputs never
+        # need them, and building them loads langchain_openai.
+        self._api_key = api_key
+        self._chains = None
+        self._lock = threading.Lock()
+
+        self.decoder = CompiledWorkoutDecoder()
+        self.cache = cache
+        self.shorthand = ShorthandParser()
+        self.shorthand_threshold = shorthand_threshold
+
+    @property
+    def chains(self) -> Dict[str, 'ChatOpenAI']:
+        """One chain per routing tier, by tier name"""
+        with self._lock:
+            if self._chains is None:
+                self._chains = {tier.name: self._create_chain(self._api_key, tier) for tier in self.routing.tiers}
+            return self._chains
+
+    @property
+    def chain(self) -> 'ChatOpenAI':
+        """The most capable tier. Streaming always uses this one."""
+        return self.chains[self.routing.tiers[-1].name]
+
+    def _create_chain(self, api_key: str, tier: ModelTier) -> 'ChatOpenAI':
+        # langchain_core is slow to import, so wait until a chain is needed
+        from langchain_core.output_parsers import StrOutputParser
+        from langchain_core.prompts import ChatPromptTemplate
+
+        model = self.clients.chat_openai(api_key, tier.model, tier.temperature)
 
         prompt_template = ChatPromptTemplate.from_messages(
-            [("system", self._DEFAULT_TEMPLATE), ("user", "{text}")]
+            [("system", self.template), ("user", "{text}")]
         )
 
         parser = StrOutputParser()
@@ -40,185 +102,320 @@ class JSONExtractor(object):
     # This should be the part the LLM calls
     def from_string(self, input: str) -> Workout | None:
         #print(f"[FROM_STRING] {input}")
-        # Add error handling to this!
         try:
-            result = self.chain.invoke({'text': f'Essentially: {input}'})
-        except Exception as e:
-            #print(f"[CHAIN RESULT] is exception: {e}")
+            return self.extract(input)
+        except ExtractionError as e:
+            #print(f"[FROM_STRING] is exception: {e}")
+            return None
+
+    async def afrom_string(self, input: str) -> Workout | None:
+        """Asynchronous version of from_string with the same error semantics"""
+        try:
+            return await self.aextract(input)
+        except ExtractionError:
             return None
 
-        if result is not None:
+    def extract(self, input: str) -> Workout:
+        """
+        Same as from_string, but raises an ExtractionError that explains the
+        failure instead of returning None.
+        """
+        with tracing.span('extractor.extract', bytes_in=len(input)) as span:
+            workout = self._from_shorthand(input)
+            if workout is not None:
+                span.set(source='shorthand')
+                return workout
+
+            error = None
+            for (attempt, tier) in enumerate(self.routing.tiers_for(input)):
+                if attempt > 0:
+                    self.routing.stats.record_escalation()
+                try:
+                    workout = self._extract_with_tier(input, tier)
+                    span.set(tier=tier.name, attempts=attempt + 1)
+                    return workout
+                except ExtractionError as e:
+                    error = e
+            raise error
+
+    async def aextract(self, input: str) -> Workout:
+        """Asynchronous version of extract"""
+        with tracing.span('extractor.extract', bytes_in=len(input)) as span:
+            workout = self._from_shorthand(input)
+            if workout is not None:
+                span.set(source='shorthand')
+                return workout
+
+            error = None
+            for (attempt, tier) in enumerate(self.routing.tiers_for(input)):
+                if attempt > 0:
+                    self.routing.stats.record_escalation()
+                try:
+                    workout = await self._aextract_with_tier(input, tier)
+                    span.set(tier=tier.name, attempts=attempt + 1)
+                    return workout
+                except ExtractionError as e:
+                    error = e
+            raise error
+
+    def _extract_with_tier(self, input: str, tier: ModelTier) -> Workout:
+        key = self._cache_key(input, tier)
+        cached = self._from_cache(key)
+        if cached is not None:
+            self.routing.stats.record_cache_hit(tier)
+            tracing.current_span().set(source='cache')
+            return cached
+
+        started = time.perf_counter()
+        with tracing.span('extractor.model', tier=tier.name, model=tier.model, bytes_in=len(input), tokens_in=self._prompt_tokens(input)) as span:
             try:
-                workout = self.decoder.decode(result)
-                #print(f"[CHAIN RESULT] {result}")
-                # Run a pruning / compression stage
+                result = self.chains[tier.name].invoke(self._chain_input(input))
+            except Exception as e:
+                self.routing.stats.record_call(tier, time.perf_counter() - started, 'model_error')
+                raise ModelError(input, str(e)) from e
+            span.set(bytes_out=len(result or ''), tokens_out=tracing.approximate_tokens(result))
+
+        return self._decode_timed_result(input, key, result, tier, started)
+
+    async def _aextract_with_tier(self, input: str, tier: ModelTier) -> Workout:
+        key = self._cache_key(input, tier)
+        cached = self._from_cache(key)
+        if cached is not None:
+            self.routing.stats.record_cache_hit(tier)
+            tracing.current_span().set(source='cache')
+            return cached
+
+        started = time.perf_counter()
+        with tracing.span('extractor.model', tier=tier.name, model=tier.model, bytes_in=len(input), tokens_in=self._prompt_tokens(input)) as span:
+            try:
+                result = await self.chains[tier.name].ainvoke(self._chain_input(input))
+            except Exception as e:
+                self.routing.stats.record_call(tier, time.perf_counter() - started, 'model_error')
+                raise ModelError(input, str(e)) from e
+            span.set(bytes_out=len(result or ''), tokens_out=tracing.approximate_tokens(result))
+
+        return self._decode_timed_result(input, key, result, tier, started)
+
+    def _decode_timed_result(self, input: str, key: str | None, result: str | None, tier: ModelTier, started: float) -> Workout:
+        try:
+            workout = self._decode_result(input, key, result)
+        except DecodingError:
+            self.routing.stats.record_call(tier, time.perf_counter() - started, 'decode_failure')
+            raise
+        self.routing.stats.record_call(tier, time.perf_counter() - started, 'success')
+        return workout
+
+    def from_stream(self, input: str, on_step: Callable[[AbstractWorkoutStep], None] | None = None) -> Workout | None:
+        """
+        Streaming version of from_string. on_step is called with every step
+        and repetition as soon as the model finishes generating it.
+        """
+        try:
+            return self.extract_streaming(input, on_step)
+        except ExtractionError:
+            return None
+
+    def extract_streaming(self, input: str, on_step: Callable[[AbstractWorkoutStep], None] | None = None) -> Workout:
+        """
+        Same as from_stream, but raises an ExtractionError on failure. The model
+        output is decoded while it is generated, and the stream is cancelled as
+        soon as the output can no longer become a workout.
+        """
+        with tracing.span('extractor.extract_streaming', bytes_in=len(input)) as span:
+            tier = self.routing.tiers[-1]
+            key = self._cache_key(input, tier)
+
+            workout = self._from_shorthand(input)
+            if workout is not None:
+                span.set(source='shorthand')
+            else:
+                workout = self._from_cache(key)
+                if workout is not None:
+                    self.routing.stats.record_cache_hit(tier)
+                    span.set(source='cache')
+            if workout is not None:
+                # Replay the steps in the order the stream would have produced them
+                if on_step is not None:
+                    for step in self._completed_order(workout.steps):
+                        on_step(step)
                 return workout
+
+            span.set(tier=tier.name, tokens_in=self._prompt_tokens(input))
+            started = time.perf_counter()
+            try:
+                workout = self._stream_with_tier(input, key, tier, on_step, span)
+            except ModelError:
+                self.routing.stats.record_call(tier, time.perf_counter() - started, 'model_error')
+                raise
+            except DecodingError:
+                self.routing.stats.record_call(tier, time.perf_counter() - started, 'decode_failure')
+                raise
+            self.routing.stats.record_call(tier, time.perf_counter() - started, 'success')
+            return workout
+
+    def _stream_with_tier(self, input: str, key: str | None, tier: ModelTier, on_step: Callable[[AbstractWorkoutStep], None] | None, span: tracing.Span) -> Workout:
+        decoder = IncrementalWorkoutDecoder(self.decoder)
+        chunks = 0
+        try:
+            stream = self.chains[tier.name].stream(self._chain_input(input))
+        except Exception as e:
+            raise ModelError(input, str(e)) from e
+
+        # Closing the generator closes the HTTP response, which is what
+        # actually stops the model from generating more tokens.
+        with closing(stream):
+            while True:
+                try:
+                    chunk = next(stream)
+                except StopIteration:
+                    break
+                except Exception as e:
+                    raise ModelError(input, str(e)) from e
+
+                chunks += 1
+                try:
+                    steps = decoder.feed(chunk)
+                except InvalidWorkoutPrefixError as e:
+                    raise DecodingError(input, str(e)) from e
+
+                if on_step is not None:
+                    for step in steps:
+                        on_step(step)
+
+        span.set(chunks=chunks, bytes_out=len(decoder.text), tokens_out=tracing.approximate_tokens(decoder.text))
+        return self._decode_result(input, key, decoder.text)
+
+    @staticmethod
+    def _completed_order(steps: List[AbstractWorkoutStep]) -> Iterator[AbstractWorkoutStep]:
+        """Steps in the order their closing braces appear: children first"""
+        for step in steps:
+            if isinstance(step, RepetitionStep):
+                yield from JSONExtractor._completed_order(step.steps)
+            yield step
+
+    def from_strings(self, inputs: Iterable[str], max_concurrency: int = 8, retries: int = 2) -> Iterator[Tuple[int, Workout | ExtractionError]]:
+        """
+        Extract many workouts at once.
+
+        Yields (index, result) pairs in completion order, where index is the
+        position of the input and result is either the Workout or the
+        ExtractionError describing why that input failed. One bad input never
+        stops the batch. Failed model calls (ModelError) are retried, so each
+        input is attempted at most retries + 1 times, and at most
+        max_concurrency requests are in flight at any moment. The workers run
+        in a copy of the caller's context, so their tracing spans keep the
+        caller's session and parent span.
+        """
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+
+        pending = enumerate(inputs)
+        context = contextvars.copy_context()
+        with ThreadPoolExecutor(max_workers=max_concurrency) as executor:
+            running = {}
+
+            # Keep a sliding window of futures so huge inputs are never all
+            # queued in memory at the same time.
+            def submit_next() -> bool:
+                item = next(pending, None)
+                if item is None:
+                    return False
+                (index, input) = item
+                # A context can only be entered by one thread at a time
+                running[executor.submit(context.copy().run, self._extract_with_retries, input, retries)] = index
+                return True
+
+            while len(running) < max_concurrency and submit_next():
+                pass
+
+            while running:
+                (done, _) = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    try:
+                        result = future.result()
+                    except ExtractionError as e:
+                        result = e
+                    yield (index, result)
+                    submit_next()
+
+    def _extract_with_retries(self, input: str, retries: int) -> Workout:
+        attempt = 0
+        while True:
+            try:
+                return self.extract(input)
+            except ModelError:
+                if attempt >= retries:
+                    raise
+                # Back off a little so a throttled endpoint can recover
+                attempt += 1
+                time.sleep(self._RETRY_DELAY * 2 ** (attempt - 1))
+            except ExtractionError:
+                # The model answered. At this temperature it would give the
+                # same answer again, and it would fail to decode the same way.
+                raise
             except Exception as e:
-                #print(f"[DECODING] is exception: {e}")
-                # These should be sanitized and rethrown
-                return None
+                # Anything unexpected is still isolated to this input
+                raise ExtractionError(input, str(e)) from e
+
+    def _from_shorthand(self, input: str) -> Workout | None:
+        """The local parse, if it is confident enough to skip the LLM"""
+        workout = None
+        if self.shorthand_threshold is not None:
+            (parsed, confidence) = self.shorthand.parse(input)
+            if parsed is not None and confidence >= self.shorthand_threshold:
+                workout = parsed
+
+        self.routing.stats.record_request(shorthand=workout is not None)
+        return workout
+
+    def _prompt_tokens(self, input: str) -> int:
+        """Approximate, since StrOutputParser drops the usage the model reports"""
+        return tracing.approximate_tokens(self.template) + tracing.approximate_tokens(input)
+
+    def _chain_input(self, input: str) -> dict:
+        return {'text': f'Essentially: {input}'}
+
+    def _from_cache(self, key: str | None) -> Workout | None:
+        """Decode a cached response, if there is one"""
+        if key is None:
+            return None
+
+        cached = self.cache.get(key)
+        if cached is not None:
+            try:
+                return self.decoder.decode(cached)
+            except Exception:
+                # A stale entry from an older decoder. Fall through and ask again.
+                pass
         return None
 
-    # This template is a bit repetitive and verbose, but it currently passes
-    # internal tests.
-    _DEFAULT_TEMPLATE = """
-TASK: You are a JSON text extractor. All output must be in valid JSON. Return only JSON without explanation. The value return should start as a "workout" object.
-
-A "step" is a JSON object defined using the following schema:
-```
-{{
-    "type": : <The type of of the step. It should be one of "run", "rest", "recover", "warm-up", "cool-down", or "repetition">,
-    "value": <The size of the step, It should be a numeric value. Integers are preferred, but are not required. This value is OPTIONAL and can be NULL. Do NOT invent a value.>,
-    "unit": <The units of the step. This should either be "seconds", "meters", or "miles". If the "value" key is NULL, set this value to "meters">
-    "goals": <A list of "goal" types.  This value may be NULL.>
-    "notes": <These are notes for the step, such as things one should concentrate on, such as keeping the breathing slow or focusing on turnover. It is OPTIONAL and can be NULL.>
-    "minimum": <The minimum size of the step. It should be a numeric value. Integers are preferred. This value is OPTIONAL and can be NULL.>
-    "maximum": <The maximum size of the step. It should be a numeric value. Integers are preferred. This value is OPTIONAL and can be NULL.>
-}}
-```
-
-A "goal" is a specific range for a given step:
-```
-    {{
-        "type": <type of the goal.  This should be one of "speed", "heart_rate", "heart_rate_zone", "cadence", "power", and "lap_time">
-        "value": <target goal value. This value is OPTIONAL and can be NULL.>
-        "minimum": <minimum goal value. This value is OPTIONAL and can be NULL.>
-        "maximum": <maximum goal value. This value is OPTIONAL and can be NULL.>
-    }}
-```
-
-A "repetition" is a special type of step that indicates multiple sub-steps should be repeated.
-A "repetition" is defined using the the following schema:
-```
-{{
-  "type": "repetition",
-  "steps": [
-      <The steps needing to be repeated a few times.  The individual steps are defined using the "step" schema above.>
-  ],
-  "value": <The target number of times that the enclosed steps should be repeated. This value is optional and can be NULL>
-  "minimum": <The minimum number of times that the enclosed steps should be repeated. This value is optional and can be NULL>
-  "maximum": <The maximum number of times that the enclosed steps should be repeated. This value is optional and can be NULL>
-  "goals": <This is the stated list of goals for the step. This value is OPTIONAL and can be NULL>
-  "notes": <These are notes for the step, such as things one should concentrate on, such as keeping the breathing slow or focusing on turnover. It is OPTIONAL and can be NULL.>
-}}
-```
-Avoid creating "repetition" steps where the "value" is 1. If the "minimum" and "maximum" are the same, set this as "value" instead. 
-
-A "workout" is the top level item. It consists of an optional name field followed by an array of steps. A "workout" uses the following schema:. 
-```
-{{
-  "type": "workout",
-  "name": <The name of the workout. This value may be NULL.>
-  "steps": [
-      <The steps comprising the workout. These are mandatory>
-  ],
-  "notes": <These are notes for the entire workout. Place notes in individual steps if they can be attributed to a given step.  It is OPTIONAL and can be NULL. The "notes" field is unusal for a workout and is generally NULL.>
-}}
-```
-
-Rules:
-    1. A repetition means that the set of steps inside will be repeated some number of times.
-    2. A repetition step means that the "type" is "repetition", and "value" must be an INTEGER greater than 0. The "value" is the target number of times that the repetition steps should be repeated.
-    3. A repetition may also express a range with a "min" minimum and "max" maximum number of times for the repetition to occur.
-    4. When a range is specified without a target value, the "value" may be set to NULL.
-    5. A repetition is a kind of step.
-    6. Generally, "warm-up" will be the first entry and "cool-down" will be the last entry. The phrases "finish" and "remainder" often refer to the "cool-down".
-    7. The abbreviations "wu" and "w/u" mean "warm-up", "cd" and "c/d" mean "cool-down".
-    8. A common encoding system comprised of with "E", "L", "I", "R", "T", "JG", "ST", "MP", and "HMP".  Convert abbreviations and enter the expanded value in "notes" field as:
-        "E" => "easy pace", "L" => "long run pace", "I" => "interval pace", "R" => "repetition pace", "T" => "tempo pace", "JG" => "jog", "ST" => "stride", "MP" => "marathon pace", and "HMP" => "half marathon pace". If the units are not specified with these values, assume they are miles.
-    9. Avoid using abbreviations in the "notes" field. Use the full name when possible.
-    10. The "value" should either be a time expressed in seconds or a distance expressed in either "meters" or "miles". If it is a time in seconds, then "unit" should be "seconds". 
-    11. You may omit keys that have NULL as a value.
-    12. A "rest" step is a break where no motion is expected. This is a time to get water, stretch, etc. If motion is expected, such as "walk", "jog", "shuffle", or "float", the the step should be "recovery" instead.
-    13. "rest" steps generally are expressed as a time, whereas "recovery" steps can be expressed as a time or a distance.
-    14. The "equal rest" or "equal recovery" means that the "rest" or "recovery" step following the activity should have the same units and value.
-    15. The "1600m with 50% rest" means a "1600 meter run step" followed by a "800 meter rest step".
-    16. Avoid creating rest steps unless the user specifies them.
-    17. Avoid inventing values.
-    18. Any part of the "step" that provides a non-numeric hint to the user about how to perform the step should be summarized as part of the "notes".
-    19. When possible, summarize the "notes" field to make it less than 20 characters.
-    20. Do not convert between miles and meters for the "value" key.  For example, "run for three quarters of a mile" should be:
-    ```
-    {{ 
-        "type": "run",
-        "value": 0.75,
-        "units": "miles"
-    }}
-    ```
-    
-Goal rules:
-    1. Valid types of goals are "speed", "heart_rate", "heart_rate_zone", "cadence", "power", and "lap_time".
-    2. When the goal is "speed," values should be meters per second. Only include the numeric value. It must be positive.
-    3. Do NOT invent a value for pace. For example "Run the lap quickly" is not a "goal"; this message belongs as part of "notes".
-    4. If you do not know the user's pace, do not enter a value into "speed".    
-    5. When the goal is "heart_rate," the value is given as beats per minute. Only include the numeric value. It must be an INTEGER greater than 0.
-    6. Expressions like "keep your heart rate high" are not goals because they do not have an explicit value.  These belong as part of "notes".
-    7. Expressions like "keep your heart rate between 80 and 150" are goals.  This should result in:
-    ```
-    {{ 
-        "type": "heart_rate",
-        "min": 80,
-        "max": 150
-    }}
-    ```
-    8. "heart_rate_zone" is given as a zone between 1 and 5 inclusive.  An example is "keep your heart rate in zone 2" means the result should be "heart_rate_zone": {{ "target": 2 }}
-    9. "cadence" is given as steps per minute. Only include the numeric value. It must be an INTEGER greater than 0.
-    10. "power" is given as watts. Only include the numeric value. It must be an INTEGER greater than 0.
-    11. "lap_time" is given in seconds. Only include the numeric value. It must be an INTEGER greater than 0. Convert any time to seconds, if necessary.
-    12. All goals require explicit values. Avoid converting subjective values such as "fast" or "slow" into specific values.
-    13. All other hints belong as part of "notes" instead.
-
-Hints:
-    1. For track workouts, a 400 or 400m is 400 meters.
-    2. Values expressed as "5 400s" means 5 repetitions of 400 meters each.
-    3. A "ladder" workout means a sequence of sequential steps separated by a common step size. For example, "a ladder from 200 to 1000 by 400" should be converted into:
-    ```
-    {{
-        "type": "workout",
-        "steps": [{{
-                "type": "run",
-                "value": 200,
-                "unit": "meters"
-            }},
-            {{
-                "type": "run",
-                "value": 600,
-                "unit": "meters"
-            }},
-            {{
-                "type": "run",
-                "value": 1000,
-                "unit": "meters"
-            }}]
-    }}
-    ```
-    4. A "descending ladder" workout is a ladder workout, but the values decrease by a common step size.  For example, a descending ladder from 1000 to 200 by 400 means should be converted into:
-    ```
-    {{
-        "type": "workout",
-        "steps": [{{
-                "type": "run",
-                "value": 1000,
-                "unit": "meters"
-            }},
-            {{
-                "type": "run",
-                "value": 600,
-                "unit": "meters"
-            }},
-            {{
-                "type": "run",
-                "value": 200,
-                "unit": "meters"
-            }}]
-    ```
-    5. For step instructions specifying a gait other than "run", put the value under "notes".  For example a 5 minute walk should be expressed using the following "step":
-    ```
-    {{
-        "type": "run",
-        "value": 600,
-        "unit": "seconds",
-        "notes": "walk"
-    }}
-    ```  
-"""
\ No newline at end of file
+    def _decode_result(self, input: str, key: str | None, result: str | None) -> Workout:
+        """Decode the raw LLM output, caching it if it produced a workout"""
+        if result is None:
+            raise DecodingError(input, 'empty response')
+
+        with tracing.span('decoder.decode', bytes_in=len(result)) as span:
+            try:
+                (workout, repairs) = self.decoder.decode_with_repairs(result)
+            except Exception as e:
+                #print(f"[DECODING] is exception: {e}")
+                # The compiled decoder says where in the JSON it went wrong
+                reason = str(e) if getattr(e, 'path', None) is None else f'{e} (at {e.path})'
+                raise DecodingError(input, reason) from e
+            span.set(repairs=len(repairs))
+        if len(repairs) > 0:
+            self.routing.stats.record_repairs(repairs)
+
+        #print(f"[CHAIN RESULT] {result}")
+        # Only responses that decode are worth keeping
+        if key is not None:
+            self.cache.put(key, result)
+        # Run a pruning / compression stage
+        return workout
+
+    def _cache_key(self, input: str, tier: ModelTier) -> str | None:
+        """Cache key for the input, or None when caching is disabled"""
+        if self.cache is None:
+            return None
+        return cache_key(input, self.template, tier.model, tier.temperature)
@@ -0,0 +1,185 @@
+import re
+import threading
+
+from collections import Counter, deque
+from typing import Dict, List
+
+
+# Inputs matching any of these usually need the large model: the smaller
+# models get the arithmetic or the structure wrong without failing to decode.
+COMPLEXITY_PATTERNS = [
+    r'\bladders?\b',
+    r'\bpyramids?\b',
+    r'\bequal\s+(rest|recovery|jog|jogging|float)\b',
+    r'\d+\s*%',
+    r'\balternat',
+    r'\bfor\s+\d+(\.\d+)?\s*(mi|miles?|k|km|kilometers?|minutes?|mins?)\b',
+    r'\bdescending\b',
+    # A repeat inside a repeat, e.g. "2 x (4 x mile ...)"
+    r'[x×]\s*\([^)]*\d+\s*(x|×|times)\b',
+]
+
+# Very long descriptions tend to be complicated too
+COMPLEX_LENGTH = 300
+
+# Latencies kept per tier for the percentiles
+LATENCY_SAMPLES = 1024
+
+
+class ModelTier(object):
+    """One model the router can send a request to"""
+
+    def __init__(self, name: str, model: str, temperature: float):
+        self.name = name
+        self.model = model
+        self.temperature = temperature
+
+    def __repr__(self) -> str:
+        return f"ModelTier <{self.name}: {self.model} @ {self.temperature}>"
+
+
+class TierStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.decode_failures = 0
+        self.model_errors = 0
+        self.cache_hits = 0
+        self.total_latency = 0.0
+        self.latencies = deque(maxlen=LATENCY_SAMPLES)
+
+    def percentile(self, percent: float) -> float | None:
+        if len(self.latencies) == 0:
+            return None
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(percent / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def to_dict(self) -> Dict[str, int | float | None]:
+        calls = self.requests - self.cache_hits
+        return {
+            'requests': self.requests,
+            'successes': self.successes,
+            'decode_failures': self.decode_failures,
+            'model_errors': self.model_errors,
+            'cache_hits': self.cache_hits,
+            'mean_latency': self.total_latency / calls if calls > 0 else None,
+            'p50_latency': self.percentile(50),
+            'p95_latency': self.percentile(95),
+        }
+
+
+class RoutingStats(object):
+    """
+    Per-tier latency and outcome counters plus the escalation rate. Requests
+    answered by the local shorthand parser are counted separately since they
+    never reach a model, and so are the JSON repairs the decoder had to make.
+    """
+
+    def __init__(self, tiers: List[ModelTier]):
+        self.requests = 0
+        self.shorthand = 0
+        self.escalations = 0
+        self.tiers = {tier.name: TierStats() for tier in tiers}
+        self.repairs = Counter()
+        self._lock = threading.Lock()
+
+    def record_request(self, shorthand: bool = False):
+        with self._lock:
+            self.requests += 1
+            if shorthand:
+                self.shorthand += 1
+
+    def record_escalation(self):
+        with self._lock:
+            self.escalations += 1
+
+    def record_cache_hit(self, tier: ModelTier):
+        with self._lock:
+            stats = self.tiers[tier.name]
+            stats.requests += 1
+            stats.cache_hits += 1
+            stats.successes += 1
+
+    def record_repairs(self, repairs: List[str]):
+        with self._lock:
+            self.repairs.update(repairs)
+
+    def record_call(self, tier: ModelTier, latency: float, outcome: str):
+        """outcome is 'success', 'decode_failure' or 'model_error'"""
+        with self._lock:
+            stats = self.tiers[tier.name]
+            stats.requests += 1
+            stats.total_latency += latency
+            stats.latencies.append(latency)
+            if outcome == 'success':
+                stats.successes += 1
+            elif outcome == 'decode_failure':
+                stats.decode_failures += 1
+            else:
+                stats.model_errors += 1
+
+    @property
+    def escalation_rate(self) -> float:
+        routed = self.requests - self.shorthand
+        if routed == 0:
+            return 0.0
+        return self.escalations / routed
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'shorthand': self.shorthand,
+                'escalations': self.escalations,
+                'escalation_rate': self.escalation_rate,
+                'tiers': {name: stats.to_dict() for (name, stats) in self.tiers.items()},
+                'repairs': dict(self.repairs),
+            }
+
+    def __repr__(self) -> str:
+        return f"RoutingStats {self.to_dict()}"
+
+
+class RoutingPolicy(object):
+    """
+    Decides which models see a request, in order.
+
+    Simple inputs start on the first (fastest) tier and escalate one tier at a
+    time when the answer fails to decode or the call fails. Inputs that look
+    complex go straight to the last (most capable) tier.
+    """
+
+    def __init__(self, tiers: List[ModelTier], complexity_patterns: List[str] = COMPLEXITY_PATTERNS, complex_length: int = COMPLEX_LENGTH):
+        if len(tiers) == 0:
+            raise ValueError('At least one tier is required')
+        if len({tier.name for tier in tiers}) != len(tiers):
+            raise ValueError('Tier names must be unique')
+
+        self.tiers = tiers
+        self.complexity = re.compile('|'.join(f'(?:{x})' for x in complexity_patterns), re.IGNORECASE)
+        self.complex_length = complex_length
+        self.stats = RoutingStats(tiers)
+
+    @classmethod
+    def single(cls, model: str, temperature: float) -> 'RoutingPolicy':
+        """Send everything to one model. This is the behavior without routing."""
+        return cls([ModelTier('default', model, temperature)])
+
+    @classmethod
+    def tiered(cls) -> 'RoutingPolicy':
+        """70B first, escalating to 405B"""
+        return cls([
+            ModelTier('fast', 'Meta-Llama-3.1-70B-Instruct', 0.02),
+            ModelTier('full', 'Meta-Llama-3.1-405B-Instruct', 0.02),
+        ])
+
+    def is_complex(self, input: str) -> bool:
+        return len(input) > self.complex_length or self.complexity.search(input) is not None
+
+    def tiers_for(self, input: str) -> List[ModelTier]:
+        """The tiers to try for input, in order"""
+        if self.is_complex(input):
+            return self.tiers[-1:]
+        return self.tiers
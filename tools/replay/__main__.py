@@ -0,0 +1,83 @@
+"""
+Record and replay model traffic.
+
+Record real requests and answers by running the proxy in front of the real
+endpoint and pointing the app, the agents or the extractors at it:
+
+    python -m tools.replay record recordings.jsonl --upstream https://api.sambanova.ai/v1/
+    SAMBANOVA_BASE_URL=http://127.0.0.1:8765/v1/ python -m tools.extraction workouts.txt
+
+Then serve the recordings without the network, with whatever latency,
+streaming speed and failure rate the test needs:
+
+    python -m tools.replay serve recordings.jsonl --latency 0.4 --token-delay 0.02 --error-rate 0.05
+
+GET /stats on the server returns the hit, miss and error counts.
+"""
+
+import argparse
+import sys
+
+from typing import List
+
+from .recordings import RecordingStore
+from .server import DEFAULT_PORT, ReplayServer
+
+
+def run(arguments: argparse.Namespace) -> int:
+    store = RecordingStore(arguments.recordings)
+    if arguments.command == 'record':
+        server = ReplayServer(store, host=arguments.host, port=arguments.port, upstream=arguments.upstream)
+        sys.stderr.write(f'Recording to {arguments.recordings} ({len(store)} so far) from {arguments.upstream}\n')
+    else:
+        server = ReplayServer(
+            store,
+            host=arguments.host,
+            port=arguments.port,
+            latency=arguments.latency,
+            jitter=arguments.jitter,
+            token_delay=arguments.token_delay,
+            error_rate=arguments.error_rate,
+            error_status=arguments.error_status,
+            fallback=arguments.fallback,
+            seed=arguments.seed,
+        )
+        sys.stderr.write(f'Replaying {len(store)} responses from {arguments.recordings}\n')
+
+    sys.stderr.write(f'Set SAMBANOVA_BASE_URL={server.base_url}\n')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        sys.stderr.write(f'{server.stats}\n')
+    return 0
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(prog='python -m tools.replay', description='Record and replay model traffic.')
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help='proxy to the real endpoint and record the answers')
+    record.add_argument('recordings', help='JSONL file to append the recordings to')
+    record.add_argument('--upstream', default='https://api.sambanova.ai/v1/', help='the real endpoint (default: %(default)s)')
+
+    serve = commands.add_parser('serve', help='answer from the recordings')
+    serve.add_argument('recordings', help='JSONL file of recordings')
+    serve.add_argument('--latency', type=float, default=0.0, help='seconds before each answer (default: 0)')
+    serve.add_argument('--jitter', type=float, default=0.0, help='up to this many more seconds, at random (default: 0)')
+    serve.add_argument('--token-delay', type=float, default=0.0, help='seconds between streamed chunks (default: 0)')
+    serve.add_argument('--error-rate', type=float, default=0.0, help='share of requests that fail (default: 0)')
+    serve.add_argument('--error-status', type=int, default=503, help='HTTP status of the failures (default: 503)')
+    serve.add_argument('--fallback', help='answer requests that were never recorded with this text instead of a 404')
+    serve.add_argument('--seed', type=int, help='seed for the latency jitter and the failures')
+
+    for command in (record, serve):
+        command.add_argument('--host', default='127.0.0.1', help='address to listen on (default: %(default)s)')
+        command.add_argument('--port', type=int, default=DEFAULT_PORT, help='port to listen on (default: %(default)s)')
+
+    return run(parser.parse_args(argv))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,104 @@
+import json
+import re
+import time
+
+from typing import Iterator, List
+
+
+# A word and the whitespace in front of it, which is roughly what the model
+# streams at a time
+_TOKENS = re.compile(r'\s*\S+|\s+')
+
+
+def is_event_stream(content_type: str | None) -> bool:
+    return content_type is not None and content_type.startswith('text/event-stream')
+
+
+def parse_events(text: str) -> List[dict]:
+    """The chunks in a server-sent event stream, without the final [DONE]"""
+    chunks = []
+    for line in text.splitlines():
+        if not line.startswith('data:'):
+            continue
+        data = line[len('data:'):].strip()
+        if data and data != '[DONE]':
+            chunks.append(json.loads(data))
+    return chunks
+
+
+def completion_from_chunks(chunks: List[dict]) -> dict:
+    """Put a streamed answer back together as a chat.completion"""
+    content = []
+    tool_calls = {}
+    finish_reason = None
+    usage = None
+    for chunk in chunks:
+        if chunk.get('usage'):
+            usage = chunk['usage']
+        for choice in chunk.get('choices') or []:
+            delta = choice.get('delta') or {}
+            if delta.get('content'):
+                content.append(delta['content'])
+            for call in delta.get('tool_calls') or []:
+                entry = tool_calls.setdefault(call.get('index', 0), {'id': None, 'type': 'function', 'function': {'name': '', 'arguments': ''}})
+                if call.get('id'):
+                    entry['id'] = call['id']
+                function = call.get('function') or {}
+                entry['function']['name'] += function.get('name') or ''
+                entry['function']['arguments'] += function.get('arguments') or ''
+            if choice.get('finish_reason'):
+                finish_reason = choice['finish_reason']
+
+    message = {'role': 'assistant', 'content': ''.join(content) if content or not tool_calls else None}
+    if tool_calls:
+        message['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls.keys())]
+
+    first = chunks[0] if chunks else {}
+    completion = {
+        'id': first.get('id', 'replay'),
+        'object': 'chat.completion',
+        'created': first.get('created', int(time.time())),
+        'model': first.get('model', 'replay'),
+        'choices': [{'index': 0, 'message': message, 'finish_reason': finish_reason or 'stop'}],
+    }
+    if usage is not None:
+        completion['usage'] = usage
+    return completion
+
+
+def chunks_from_completion(completion: dict) -> Iterator[dict]:
+    """Split a chat.completion into stream chunks, a word at a time"""
+    base = {
+        'id': completion.get('id', 'replay'),
+        'object': 'chat.completion.chunk',
+        'created': completion.get('created', int(time.time())),
+        'model': completion.get('model', 'replay'),
+    }
+
+    def chunk(delta: dict, finish_reason: str | None = None) -> dict:
+        return dict(base, choices=[{'index': 0, 'delta': delta, 'finish_reason': finish_reason}])
+
+    choice = completion['choices'][0]
+    message = choice.get('message') or {}
+    yield chunk({'role': 'assistant', 'content': ''})
+    for token in _TOKENS.findall(message.get('content') or ''):
+        yield chunk({'content': token})
+    for (index, call) in enumerate(message.get('tool_calls') or []):
+        yield chunk({'tool_calls': [dict(call, index=index)]})
+
+    # Some clients only look at choices[0], so the usage rides on the last chunk
+    last = chunk({}, choice.get('finish_reason') or 'stop')
+    if completion.get('usage') is not None:
+        last['usage'] = completion['usage']
+    yield last
+
+
+def completion_text(content: str, model: str = 'replay') -> dict:
+    """A chat.completion that answers with content"""
+    return {
+        'id': 'replay',
+        'object': 'chat.completion',
+        'created': int(time.time()),
+        'model': model,
+        'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+    }
@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import threading
+
+from typing import Dict, List
+
+
+# Request fields that don't change the answer. Streaming and non-streaming
+# requests for the same prompt share a recording.
+_VOLATILE_FIELDS = ('stream', 'stream_options', 'user')
+
+
+def _stable_tool_call_ids(messages: List[dict]) -> List[dict]:
+    """
+    Replace tool call ids with their position. The intent router makes up new
+    ids every run, so they'd change the hash of every later request.
+    """
+    ids = {}
+
+    def stable(call_id):
+        if call_id not in ids:
+            ids[call_id] = f'call_{len(ids)}'
+        return ids[call_id]
+
+    result = []
+    for message in messages:
+        if not isinstance(message, dict):
+            result.append(message)
+            continue
+        message = dict(message)
+        if message.get('tool_calls'):
+            message['tool_calls'] = [dict(call, id=stable(call.get('id'))) for call in message['tool_calls']]
+        if message.get('tool_call_id') is not None:
+            message['tool_call_id'] = stable(message['tool_call_id'])
+        result.append(message)
+    return result
+
+
+def request_key(body: dict) -> str:
+    """The hash a chat completion request is recorded and replayed under"""
+    stable = {key: value for (key, value) in body.items() if key not in _VOLATILE_FIELDS}
+    if isinstance(stable.get('messages'), list):
+        stable['messages'] = _stable_tool_call_ids(stable['messages'])
+    text = json.dumps(stable, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(text.encode('utf-8')).hexdigest()
+
+
+class RecordingStore(object):
+    """
+    Recorded responses by request key, kept in a JSONL file:
+
+        {"key": "...", "request": {...}, "response": {"status": 200, "content_type": "...", "body": "..."}}
+
+    A request that was recorded more than once gets the recorded responses
+    in turn, which keeps retries and sampled answers realistic.
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None):
+        self.path = path
+        self._responses: Dict[str, List[dict]] = {}
+        self._next: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def load(self, path: str | os.PathLike):
+        with open(path, 'r', encoding='utf-8') as file:
+            for line in file:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._responses.setdefault(entry['key'], []).append(entry['response'])
+
+    def next(self, key: str) -> dict | None:
+        """The next recorded response for key, or None if there isn't one"""
+        with self._lock:
+            responses = self._responses.get(key)
+            if not responses:
+                return None
+            index = self._next.get(key, 0)
+            self._next[key] = (index + 1) % len(responses)
+            return responses[index]
+
+    def add(self, key: str, request: dict, response: dict):
+        with self._lock:
+            self._responses.setdefault(key, []).append(response)
+            if self.path is not None:
+                with open(self.path, 'a', encoding='utf-8') as file:
+                    file.write(json.dumps({'key': key, 'request': request, 'response': response}, ensure_ascii=False) + '\n')
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(x) for x in self._responses.values())
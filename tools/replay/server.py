@@ -0,0 +1,297 @@
+import json
+import random
+import threading
+import time
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Iterable
+
+import httpx
+
+from .completions import chunks_from_completion, completion_from_chunks, completion_text, is_event_stream, parse_events
+from .recordings import RecordingStore, request_key
+
+
+# The stub serves the same layout as the real endpoint, so a base_url of
+# http://host:port/v1/ works for every client
+API_PREFIX = '/v1/'
+
+DEFAULT_PORT = 8765
+
+
+class ReplayStats(object):
+
+    def __init__(self):
+        self.requests = 0
+        self.hits = 0
+        self.misses = 0
+        self.injected_errors = 0
+        self.recorded = 0
+        self.upstream_errors = 0
+        self._lock = threading.Lock()
+
+    def record(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'hits': self.hits,
+                'misses': self.misses,
+                'injected_errors': self.injected_errors,
+                'recorded': self.recorded,
+                'upstream_errors': self.upstream_errors,
+            }
+
+    def __repr__(self) -> str:
+        return f"ReplayStats {self.to_dict()}"
+
+
+class ReplayServer(object):
+    """
+    A local OpenAI-compatible chat completions endpoint.
+
+    Without an upstream, requests are answered from the RecordingStore by
+    request_key. Each answer waits latency seconds (plus up to jitter more),
+    streamed answers wait token_delay between chunks, and error_rate of the
+    requests fail with error_status. Requests nobody recorded get a 404,
+    or the fallback text if there is one. The fallback can also be a
+    function of the request body, to script answers for a load test.
+
+    With an upstream, the server is a recording proxy instead: requests go to
+    the real endpoint, the answers are passed through as they arrive and the
+    successful ones are added to the store.
+
+    Point the clients at base_url, e.g. with SAMBANOVA_BASE_URL (see
+    tools/clients.py). start() runs the server on a background thread.
+    """
+
+    def __init__(
+        self,
+        store: RecordingStore,
+        host: str = '127.0.0.1',
+        port: int = DEFAULT_PORT,
+        upstream: str | None = None,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        token_delay: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 503,
+        fallback: str | Callable[[dict], str] | None = None,
+        seed: int | None = None,
+    ):
+        self.store = store
+        self.upstream = upstream
+        self.latency = latency
+        self.jitter = jitter
+        self.token_delay = token_delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.fallback = fallback
+        self.stats = ReplayStats()
+
+        self._random = random.Random(seed)
+        self._random_lock = threading.Lock()
+        self._http = httpx.Client(timeout=httpx.Timeout(120.0, connect=10.0)) if upstream is not None else None
+
+        self.httpd = ThreadingHTTPServer((host, port), _Handler)
+        self.httpd.daemon_threads = True
+        self.httpd.replay = self
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        (host, port) = self.httpd.server_address[:2]
+        return f'http://{host}:{port}{API_PREFIX}'
+
+    # ------------------------------
+    # LIFECYCLE
+    # ------------------------------
+
+    def serve_forever(self):
+        self.httpd.serve_forever()
+
+    def start(self) -> 'ReplayServer':
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name='replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+        if self._http is not None:
+            self._http.close()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def __enter__(self) -> 'ReplayServer':
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    # ------------------------------
+    # REQUESTS
+    # ------------------------------
+
+    def handle(self, handler: '_Handler', raw: bytes):
+        self.stats.record('requests')
+        try:
+            body = json.loads(raw)
+        except ValueError:
+            handler.send_json(400, _error('The request body is not JSON', 'invalid_request_error'))
+            return
+
+        if self.upstream is not None:
+            self._forward(handler, raw, body)
+        else:
+            self._replay(handler, body)
+
+    def _replay(self, handler: '_Handler', body: dict):
+        with self._random_lock:
+            delay = self.latency + self._random.uniform(0.0, self.jitter)
+            failed = self._random.random() < self.error_rate
+        if delay > 0:
+            time.sleep(delay)
+
+        if failed:
+            self.stats.record('injected_errors')
+            handler.send_json(self.error_status, _error('Injected failure', 'replay_error'))
+            return
+
+        key = request_key(body)
+        response = self.store.next(key)
+        if response is None and self.fallback is None:
+            self.stats.record('misses')
+            handler.send_json(404, _error(f'No recording for request {key}', 'replay_miss'))
+            return
+
+        if response is None:
+            self.stats.record('misses')
+            text = self.fallback(body) if callable(self.fallback) else self.fallback
+            response = {'status': 200, 'content_type': 'application/json', 'body': json.dumps(completion_text(text, body.get('model', 'replay')))}
+        else:
+            self.stats.record('hits')
+
+        if body.get('stream'):
+            if is_event_stream(response['content_type']):
+                chunks = parse_events(response['body'])
+            else:
+                chunks = chunks_from_completion(json.loads(response['body']))
+            handler.send_events(chunks, self.token_delay)
+        elif is_event_stream(response['content_type']):
+            handler.send_json(200, completion_from_chunks(parse_events(response['body'])))
+        else:
+            handler.send_body(response['status'], response['content_type'], response['body'].encode('utf-8'))
+
+    def _forward(self, handler: '_Handler', raw: bytes, body: dict):
+        path = handler.path[len(API_PREFIX):] if handler.path.startswith(API_PREFIX) else handler.path.lstrip('/')
+        url = self.upstream.rstrip('/') + '/' + path
+        headers = {'Content-Type': 'application/json', 'Accept': handler.headers.get('Accept', '*/*')}
+        if handler.headers.get('Authorization') is not None:
+            headers['Authorization'] = handler.headers['Authorization']
+
+        # The answer is recorded before the response is finished, so a client
+        # that has its answer can already replay it
+        try:
+            with self._http.stream('POST', url, content=raw, headers=headers) as upstream:
+                status = upstream.status_code
+                content_type = upstream.headers.get('content-type', 'application/json')
+                if is_event_stream(content_type):
+                    # Pass the events along as they arrive so the client sees
+                    # the real timing
+                    parts = []
+                    handler.start_chunked(status, content_type)
+                    for text in upstream.iter_text():
+                        parts.append(text)
+                        handler.write_chunk(text.encode('utf-8'))
+                    self._record(body, status, content_type, ''.join(parts))
+                    handler.end_chunked()
+                else:
+                    text = upstream.read().decode('utf-8')
+                    self._record(body, status, content_type, text)
+                    handler.send_body(status, content_type, text.encode('utf-8'))
+        except httpx.HTTPError as e:
+            self.stats.record('upstream_errors')
+            handler.send_json(502, _error(f'Upstream request failed: {e}', 'upstream_error'))
+
+    def _record(self, body: dict, status: int, content_type: str, text: str):
+        # Rate limits and server errors aren't worth replaying
+        if 200 <= status < 300:
+            self.store.add(request_key(body), body, {'status': status, 'content_type': content_type, 'body': text})
+            self.stats.record('recorded')
+        else:
+            self.stats.record('upstream_errors')
+
+
+def _error(message: str, kind: str) -> dict:
+    return {'error': {'message': message, 'type': kind}}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    # Keep-alive, so the clients' connection pools work as they would against
+    # the real endpoint
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.rstrip('/') == '/stats':
+            self.send_json(200, self.server.replay.stats.to_dict())
+        else:
+            self.send_json(404, _error(f'Unknown path {self.path}', 'invalid_request_error'))
+
+    def do_POST(self):
+        raw = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if not self.path.rstrip('/').endswith('chat/completions'):
+            self.send_json(404, _error(f'Unknown path {self.path}', 'invalid_request_error'))
+            return
+        try:
+            self.server.replay.handle(self, raw)
+        except (BrokenPipeError, ConnectionResetError):
+            # The client hung up, e.g. it stopped reading a stream early
+            self.close_connection = True
+
+    # ------------------------------
+    # RESPONSES
+    # ------------------------------
+
+    def send_body(self, status: int, content_type: str, data: bytes):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def send_json(self, status: int, value: dict):
+        self.send_body(status, 'application/json', json.dumps(value).encode('utf-8'))
+
+    def send_events(self, chunks: Iterable[dict], token_delay: float):
+        self.start_chunked(200, 'text/event-stream')
+        for (index, chunk) in enumerate(chunks):
+            if index > 0 and token_delay > 0:
+                time.sleep(token_delay)
+            self.write_chunk(f'data: {json.dumps(chunk)}\n\n'.encode('utf-8'))
+        self.write_chunk(b'data: [DONE]\n\n')
+        self.end_chunked()
+
+    def start_chunked(self, status: int, content_type: str):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+
+    def write_chunk(self, data: bytes):
+        if len(data) == 0:
+            return
+        self.wfile.write(f'{len(data):x}\r\n'.encode('ascii') + data + b'\r\n')
+        self.wfile.flush()
+
+    def end_chunked(self):
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
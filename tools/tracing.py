@@ -0,0 +1,422 @@
+import contextlib
+import contextvars
+import itertools
+import json
+import logging
+import logging.handlers
+import math
+import os
+import tempfile
+import threading
+import time
+import uuid
+
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Iterable, Iterator, List
+
+
+# Rotate the JSONL trace file at this size, keeping this many old files
+MAX_BYTES = 16 * 1024 * 1024
+BACKUPS = 4
+
+# Histogram buckets in seconds. The 405B model can take most of a minute.
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# The quantiles come from the latest RESERVOIR spans of each stage
+QUANTILES = (0.5, 0.95, 0.99)
+RESERVOIR = 2048
+
+# Seconds between rewrites of the Prometheus file
+METRICS_INTERVAL = 15.0
+
+METRICS_PREFIX = 'workout'
+
+_current_span = contextvars.ContextVar('tracing_span', default=None)
+_current_session = contextvars.ContextVar('tracing_session', default=None)
+
+
+def approximate_tokens(text: str | None) -> int:
+    """Roughly four characters per token, like agents.history does"""
+    if not text:
+        return 0
+    return len(text) // 4 + 1
+
+
+class Span(object):
+    """
+    One timed stage. Use it as a context manager, and add attributes with
+    set(). The conventional ones are tokens_in, tokens_out, bytes_in and
+    bytes_out, which the metrics add up per stage. An exception marks the
+    span as an error, and fail() marks it with any other outcome.
+    """
+
+    recording = True
+
+    _ids = itertools.count(1)
+
+    def __init__(self, tracer: 'Tracer', name: str, parent: 'Span | None', session: str | None, attributes: dict, activate: bool = True):
+        self.tracer = tracer
+        self.name = name
+        self.span_id = next(self._ids)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.trace_id = parent.trace_id if parent is not None else uuid.uuid4().hex[:16]
+        if session is None:
+            session = parent.session if parent is not None else _current_session.get()
+        self.session = session
+        self.attributes = attributes
+        self.outcome = 'ok'
+        self.start = None
+        self.duration = None
+        self._activate = activate
+        self._token = None
+        self._started = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def fail(self, outcome: str = 'error'):
+        self.outcome = outcome
+
+    def __enter__(self) -> 'Span':
+        if self._activate:
+            self._token = _current_span.set(self)
+        self.start = time.time()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        self.duration = time.perf_counter() - self._started
+        if exc_type is not None and self.outcome == 'ok':
+            self.outcome = 'error'
+            self.attributes.setdefault('error', exc_type.__name__)
+        if self._token is not None:
+            try:
+                _current_span.reset(self._token)
+            except ValueError:
+                # Finished in another context, e.g. a generator closed elsewhere
+                pass
+        self.tracer.finish(self)
+        return False
+
+    def to_dict(self) -> dict:
+        return {
+            'trace': self.trace_id,
+            'span': self.span_id,
+            'parent': self.parent_id,
+            'session': self.session,
+            'name': self.name,
+            'start': self.start,
+            'duration_ms': round(1000 * self.duration, 3) if self.duration is not None else None,
+            'outcome': self.outcome,
+            'attributes': self.attributes,
+        }
+
+    def __repr__(self) -> str:
+        return f"Span <{self.name} {self.outcome} {self.duration}>"
+
+
+class _NoopSpan(object):
+    """What span() returns while tracing is off. It does nothing at all."""
+
+    recording = False
+
+    def set(self, **attributes):
+        pass
+
+    def fail(self, outcome: str = 'error'):
+        pass
+
+    def __enter__(self) -> '_NoopSpan':
+        return self
+
+    def __exit__(self, exc_type, exc, traceback) -> bool:
+        return False
+
+
+NOOP_SPAN = _NoopSpan()
+
+
+class Tracer(object):
+    """
+    Creates spans and hands the finished ones to the exporters. Spans nest
+    through a context variable, so they follow threads started with a copied
+    context and asyncio tasks. An exporter that fails never breaks the
+    request it's tracing.
+    """
+
+    def __init__(self, exporters: Iterable = (), enabled: bool = True):
+        self.exporters = list(exporters)
+        self.enabled = enabled
+        self.metrics = next((x for x in self.exporters if isinstance(x, MetricsExporter)), None)
+        self.server = None
+
+    def span(self, name: str, session: str | None = None, activate: bool = True, **attributes) -> Span | _NoopSpan:
+        """
+        A span for the stage name, nested in the current span. Pass
+        activate=False for spans around generators, so the span doesn't
+        become the parent of whatever the consumer does between items.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        return Span(self, name, _current_span.get(), session, attributes, activate)
+
+    def finish(self, span: Span):
+        for exporter in self.exporters:
+            try:
+                exporter.export(span)
+            except Exception:
+                pass
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        for exporter in self.exporters:
+            exporter.close()
+
+
+# ------------------------------
+# EXPORTERS
+# ------------------------------
+
+class JSONLExporter(object):
+    """Finished spans, one JSON object per line, in a file that rotates at max_bytes"""
+
+    def __init__(self, path: str | os.PathLike, max_bytes: int = MAX_BYTES, backups: int = BACKUPS):
+        self.handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups, encoding='utf-8', delay=True)
+        self.handler.setFormatter(logging.Formatter('%(message)s'))
+
+    def export(self, span: Span):
+        # handle() takes the handler's lock, so lines from different threads never mix
+        self.handler.handle(logging.makeLogRecord({'msg': json.dumps(span.to_dict(), default=str)}))
+
+    def close(self):
+        self.handler.close()
+
+
+class _Stage(object):
+
+    def __init__(self, buckets: int, reservoir: int):
+        self.count = 0
+        self.total = 0.0
+        self.buckets = [0] * buckets
+        self.recent = deque(maxlen=reservoir)
+        self.outcomes: Dict[str, int] = {}
+        self.tokens = {'in': 0, 'out': 0}
+        self.bytes = {'in': 0, 'out': 0}
+
+
+class MetricsExporter(object):
+    """
+    Latency histograms, p50/p95/p99 and token, byte and outcome counters for
+    each stage, in the Prometheus text format. With a path, the file is
+    rewritten at most every interval seconds and when the tracer closes.
+    """
+
+    def __init__(self, path: str | os.PathLike | None = None, interval: float = METRICS_INTERVAL, prefix: str = METRICS_PREFIX, buckets: tuple = BUCKETS, reservoir: int = RESERVOIR):
+        self.path = path
+        self.interval = interval
+        self.prefix = prefix
+        self.bucket_bounds = buckets
+        self.reservoir = reservoir
+        self._stages: Dict[str, _Stage] = {}
+        self._lock = threading.Lock()
+        self._written = 0.0
+
+    def export(self, span: Span):
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = _Stage(len(self.bucket_bounds), self.reservoir)
+            stage.count += 1
+            stage.total += span.duration
+            for (index, bound) in enumerate(self.bucket_bounds):
+                if span.duration <= bound:
+                    stage.buckets[index] += 1
+                    break
+            stage.recent.append(span.duration)
+            stage.outcomes[span.outcome] = stage.outcomes.get(span.outcome, 0) + 1
+            for direction in ('in', 'out'):
+                stage.tokens[direction] += span.attributes.get(f'tokens_{direction}') or 0
+                stage.bytes[direction] += span.attributes.get(f'bytes_{direction}') or 0
+
+            due = self.path is not None and time.monotonic() - self._written >= self.interval
+            if due:
+                self._written = time.monotonic()
+        if due:
+            self.write()
+
+    def quantiles(self, name: str) -> Dict[float, float]:
+        """The recent quantiles of a stage in seconds, empty if it never ran"""
+        with self._lock:
+            stage = self._stages.get(name)
+            recent = sorted(stage.recent) if stage is not None else []
+        return {q: recent[max(0, math.ceil(q * len(recent)) - 1)] for q in QUANTILES} if recent else {}
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Count, total and quantiles of every stage, for printing"""
+        with self._lock:
+            names = list(self._stages.keys())
+            counts = {name: (self._stages[name].count, self._stages[name].total, dict(self._stages[name].outcomes)) for name in names}
+        return {
+            name: {'count': count, 'seconds': total, 'outcomes': outcomes, 'quantiles': self.quantiles(name)}
+            for (name, (count, total, outcomes)) in counts.items()
+        }
+
+    def to_prometheus(self) -> str:
+        name = f'{self.prefix}_stage_duration_seconds'
+        summary = f'{self.prefix}_stage_latency_seconds'
+        lines = [
+            f'# HELP {name} Time spent in each stage.',
+            f'# TYPE {name} histogram',
+        ]
+        with self._lock:
+            stages = sorted(self._stages.items())
+            for (stage_name, stage) in stages:
+                label = f'stage="{_escape(stage_name)}"'
+                cumulative = 0
+                for (bound, count) in zip(self.bucket_bounds, stage.buckets):
+                    cumulative += count
+                    lines.append(f'{name}_bucket{{{label},le="{bound}"}} {cumulative}')
+                lines.append(f'{name}_bucket{{{label},le="+Inf"}} {stage.count}')
+                lines.append(f'{name}_sum{{{label}}} {stage.total}')
+                lines.append(f'{name}_count{{{label}}} {stage.count}')
+
+            lines.append(f'# HELP {summary} Latency quantiles over the latest {self.reservoir} spans of each stage.')
+            lines.append(f'# TYPE {summary} summary')
+            for (stage_name, stage) in stages:
+                label = f'stage="{_escape(stage_name)}"'
+                recent = sorted(stage.recent)
+                for q in QUANTILES:
+                    value = recent[max(0, math.ceil(q * len(recent)) - 1)] if recent else float('nan')
+                    lines.append(f'{summary}{{{label},quantile="{q}"}} {value}')
+                lines.append(f'{summary}_sum{{{label}}} {sum(recent)}')
+                lines.append(f'{summary}_count{{{label}}} {len(recent)}')
+
+            for (metric, help_text, values) in [
+                ('outcomes', 'Finished spans by outcome.', lambda x: [(f'outcome="{_escape(k)}"', v) for (k, v) in sorted(x.outcomes.items())]),
+                ('tokens', 'Tokens sent to and received from the models, exact or approximate.', lambda x: [(f'direction="{k}"', v) for (k, v) in x.tokens.items()]),
+                ('bytes', 'Payload bytes in and out of each stage.', lambda x: [(f'direction="{k}"', v) for (k, v) in x.bytes.items()]),
+            ]:
+                counter = f'{self.prefix}_stage_{metric}_total'
+                lines.append(f'# HELP {counter} {help_text}')
+                lines.append(f'# TYPE {counter} counter')
+                for (stage_name, stage) in stages:
+                    for (label, value) in values(stage):
+                        lines.append(f'{counter}{{stage="{_escape(stage_name)}",{label}}} {value}')
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path: str | os.PathLike | None = None):
+        """Write the metrics file. The rename means a scraper never sees half a file."""
+        path = path if path is not None else self.path
+        directory = os.path.dirname(os.path.abspath(path))
+        (handle, temporary) = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+        with os.fdopen(handle, 'w', encoding='utf-8') as file:
+            file.write(self.to_prometheus())
+        os.replace(temporary, path)
+
+    def close(self):
+        if self.path is not None:
+            self.write()
+
+
+def _escape(value: str) -> str:
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path.split('?')[0].rstrip('/') not in ('', '/metrics'):
+            self.send_error(404)
+            return
+        data = self.server.metrics.to_prometheus().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def serve_metrics(metrics: MetricsExporter, host: str = '127.0.0.1', port: int = 9464) -> ThreadingHTTPServer:
+    """Serve GET /metrics on a background thread. Call shutdown() to stop it."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    server.metrics = metrics
+    threading.Thread(target=server.serve_forever, name='metrics-server', daemon=True).start()
+    return server
+
+
+# ------------------------------
+# PROCESS-WIDE TRACER
+# ------------------------------
+
+# Off until configure() is called
+_tracer = Tracer(enabled=False)
+
+
+def get_tracer() -> Tracer:
+    return _tracer
+
+
+def set_tracer(tracer: Tracer):
+    global _tracer
+    _tracer = tracer
+
+
+def span(name: str, session: str | None = None, activate: bool = True, **attributes) -> Span | _NoopSpan:
+    """A span from the process-wide tracer. See Tracer.span."""
+    tracer = _tracer
+    if not tracer.enabled:
+        # The common case, so skip the extra call
+        return NOOP_SPAN
+    return tracer.span(name, session, activate, **attributes)
+
+
+def current_span() -> Span | _NoopSpan:
+    """The innermost active span, so callees can add attributes to it"""
+    span = _current_span.get()
+    return span if span is not None else NOOP_SPAN
+
+
+@contextlib.contextmanager
+def session(session_id: str | None) -> Iterator[None]:
+    """Key the spans started inside the block by session_id"""
+    token = _current_session.set(session_id)
+    try:
+        yield
+    finally:
+        _current_session.reset(token)
+
+
+def configure(
+    jsonl_path: str | os.PathLike | None = None,
+    metrics_path: str | os.PathLike | None = None,
+    metrics_port: int | None = None,
+    metrics_host: str = '127.0.0.1',
+    max_bytes: int = MAX_BYTES,
+    backups: int = BACKUPS,
+) -> Tracer:
+    """
+    Turn tracing on for the whole process. Spans go to a rotating JSONL file
+    at jsonl_path, and the metrics to a Prometheus text file at metrics_path
+    and/or an HTTP endpoint on metrics_port. The metrics are kept in memory
+    either way (see Tracer.metrics).
+    """
+    exporters: List = []
+    if jsonl_path is not None:
+        exporters.append(JSONLExporter(jsonl_path, max_bytes=max_bytes, backups=backups))
+    exporters.append(MetricsExporter(path=metrics_path))
+
+    previous = get_tracer()
+    tracer = Tracer(exporters)
+    if metrics_port is not None:
+        tracer.server = serve_metrics(tracer.metrics, host=metrics_host, port=metrics_port)
+    set_tracer(tracer)
+    previous.close()
+    return tracer
@@ -0,0 +1,73 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import workout
+from workout import Workout, WorkoutDecoder
+from workout.columnar import WorkoutColumns
+from workout.goals import HeartRateZoneGoal, WorkoutStepGoals
+from workout.steps import RunWorkoutStep, RecoverWorkoutStep, RepetitionStep, WarmUpWorkoutStep
+
+
+def tree(value):
+    """A workout without the generated uuids"""
+    if isinstance(value, list):
+        return [tree(item) for item in value]
+    fields = [name for cls in type(value).__mro__ for name in getattr(cls, '__slots__', ()) if name != '_uuid']
+    if len(fields) > 0:
+        return (type(value).__name__, {name: tree(getattr(value, name)) for name in fields})
+    return (type(value).__name__, value)
+
+
+def zone(value=None, minimum=None, maximum=None) -> WorkoutStepGoals:
+    return WorkoutStepGoals(heart_rate_zone=HeartRateZoneGoal(value, minimum, maximum))
+
+
+class TestWorkoutColumns(unittest.TestCase):
+
+    def setUp(self):
+        self.intervals = Workout(name='Intervals', notes='Tuesday', steps=[
+            WarmUpWorkoutStep(10, unit='minutes', goals=zone(1)),
+            RepetitionStep(3, steps=[
+                RunWorkoutStep(None, 800, 1000, unit='meters', goals=zone(minimum=4, maximum=5)),
+                RepetitionStep(2, steps=[
+                    RunWorkoutStep(200, unit='m', notes='strides'),
+                    RecoverWorkoutStep(30.5, unit='seconds', goals=zone(2)),
+                ]),
+            ], notes='hard'),
+        ])
+        self.long_run = Workout(name='Long run', steps=[RunWorkoutStep(6, unit='miles')])
+
+    def test_round_trip(self):
+        decoded = WorkoutDecoder().decode(
+            '{"type": "workout", "name": "Decoded", "steps": ['
+            '{"type": "rest", "value": 60, "unit": "seconds"}, '
+            '{"type": "repetition", "value": 4, "goals": [{"type": "speed", "minimum": 3.5, "maximum": 4}], '
+            '"steps": [{"type": "run", "minimum": 300, "maximum": 400, "unit": "meters"}, {"type": "cool-down", "value": 5}]}]}'
+        )
+        workouts = [self.intervals, decoded, self.long_run]
+        columns = WorkoutColumns.from_workouts(workouts)
+        self.assertEqual(columns.depth.tolist(), [0, 0, 1, 1, 2, 2, 0, 0, 1, 1, 0])
+        self.assertEqual(columns.parent.tolist(), [-1, -1, 1, 1, 3, 3, -1, -1, 7, 7, -1])
+        self.assertEqual(tree(columns.to_workouts()), tree(workouts))
+
+    def test_aggregations(self):
+        columns = WorkoutColumns.from_workouts([self.intervals, self.long_run])
+        self.assertEqual(columns.repeats.tolist(), [1, 1, 3, 3, 6, 6, 1])
+
+        distances = columns.distance_by_type()
+        self.assertEqual(distances['run'], 3 * 900 + 6 * 200 + 6 * 1609.344)
+        self.assertEqual(distances['warm-up'], 0)
+        self.assertEqual(columns.duration_by_type()['warm-up'], 600)
+        self.assertEqual(columns.duration_by_type()['recover'], 6 * 30.5)
+
+        # The 800-1000 meters have a zone but no time
+        self.assertEqual(columns.time_in_heart_rate_zones(), {1: 600, 2: 183})
+        self.assertEqual(columns.repetition_counts().tolist(), [9, 0])
+        self.assertEqual(columns.per_workout(columns.distances()).tolist(), [3900, 6 * 1609.344])
+
+
+if __name__ == '__main__':
+    unittest.main()
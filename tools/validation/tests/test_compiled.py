@@ -0,0 +1,48 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import workout
+from workout import WorkoutDecoder
+from workout.compiled import CompiledWorkoutDecoder
+from workout.exceptions import InvalidStepTypeError
+
+
+def tree(value):
+    """A decoded workout without the generated uuids"""
+    if isinstance(value, list):
+        return [tree(item) for item in value]
+    fields = [name for cls in type(value).__mro__ for name in getattr(cls, '__slots__', ()) if name != '_uuid']
+    if len(fields) > 0:
+        return (type(value).__name__, {name: tree(getattr(value, name)) for name in fields})
+    return value
+
+
+class TestCompiledDecoder(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = CompiledWorkoutDecoder()
+
+    def test_same_workouts(self):
+        inputs = [
+            '[{"type": "run", "value": 600, "unit": "seconds", "notes": "marathon pace"}]',
+            '{"type": "workout", "name": " Hills ", "steps": [{"type": "Warm Up", "units": "minutes", "value": 15}, '
+            '{"type": "repetitions", "value": 6, "goals": [{"type": "hr", "min": 170, "max": 160}], "steps": '
+            '[{"type": "run", "minimum": 80, "maximum": 100, "unit": "seconds", "note": " "}, {"type": "recovry", "value": 90}]}, '
+            '{"type": "cd", "value": 10, "unit": "minutes"}]}',
+            'Here you go: [{"type": "rest", "value": 60, "unit": "seconds",},]',
+        ]
+        for input in inputs:
+            with self.subTest(input=input):
+                self.assertEqual(tree(self.decoder.decode(input)), tree(WorkoutDecoder().decode(input)))
+
+    def test_error_paths(self):
+        with self.assertRaises(InvalidStepTypeError) as context:
+            self.decoder.decode('{"type": "workout", "steps": [{"type": "run"}, {"type": "repetition", "value": 2, "steps": [{"type": "bogus"}]}]}')
+        self.assertEqual(context.exception.path, '$.steps[1].steps[0].type')
+
+        with self.assertRaises(TypeError) as context:
+            self.decoder.decode('[{"type": "repetition", "value": 2, "steps": [{"type": "run"}, {"value": 1}]}]')
+        self.assertEqual(context.exception.path, '$[0].steps[1]')
@@ -4,7 +4,7 @@ import unittest
 import workout.steps
 
 from .context import workout
-from workout import WorkoutDecoder, Workout
+from workout import WorkoutDecoder, WorkoutEncoder, Workout
 
 class TestJSONParsing(unittest.TestCase):
 
@@ -133,7 +133,37 @@ class TestJSONParsing(unittest.TestCase):
                 )
             )
         )
-    
+
+
+    def test_encoder_round_trip(self):
+        original = workout.Workout(
+            name='Track Tuesday',
+            steps=[
+                workout.steps.WarmUpWorkoutStep(value=2, unit='miles'),
+                workout.steps.RepetitionStep(
+                    value=4,
+                    steps=[
+                        workout.steps.RunWorkoutStep(value=400, unit='meters', notes='repetition pace'),
+                        workout.steps.RecoverWorkoutStep(minimum=60, maximum=90, unit='seconds'),
+                    ]
+                ),
+                workout.steps.CoolDownWorkoutStep(unit='meters'),
+            ]
+        )
+        encoded = json.dumps(original, cls=WorkoutEncoder)
+        decoded = json.loads(encoded, cls=WorkoutDecoder)
+
+        self.assertEqual(type(decoded), Workout)
+        self.assertEqual(decoded.name, 'Track Tuesday')
+        self.assertEqual([type(x) for x in decoded.steps], [type(x) for x in original.steps])
+        self.assertEqual(decoded.steps[1].steps[1].value, 75)
+        self.assertEqual(json.dumps(decoded, cls=WorkoutEncoder), encoded)
+
+        data = json.loads(encoded)
+        self.assertEqual(data['type'], 'workout')
+        self.assertNotIn('notes', data)
+        self.assertEqual(data['steps'][1]['steps'][0], {'type': 'run', 'value': 400, 'unit': 'meters', 'notes': 'repetition pace'})
+
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
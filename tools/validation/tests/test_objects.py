@@ -0,0 +1,30 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import workout
+from workout.goals import EMPTY_GOALS, SpeedGoal, WorkoutStepGoals
+from workout.steps import RepetitionStep, RunWorkoutStep
+
+
+class TestWorkoutObjects(unittest.TestCase):
+
+    def test_steps_share_the_empty_goals(self):
+        (first, second) = (RunWorkoutStep(value=1), RunWorkoutStep(value=2, goals=[]))
+        self.assertIs(first.goals, EMPTY_GOALS)
+        self.assertIs(second.goals, EMPTY_GOALS)
+        with self.assertRaises(AttributeError):
+            first.goals.speed = SpeedGoal(value=3)
+
+        goals = WorkoutStepGoals()
+        goals.speed = SpeedGoal(value=3)
+        self.assertEqual(RunWorkoutStep(value=1, goals=goals).goals.speed.value, 3)
+
+    def test_slots_and_lazy_uuid(self):
+        step = RepetitionStep(value=2, steps=[RunWorkoutStep(value=1)])
+        self.assertFalse(hasattr(step, '__dict__'))
+        self.assertEqual(step.uuid, step.uuid)
+        self.assertNotEqual(step.uuid, step.steps[0].uuid)
+        self.assertEqual(len(SpeedGoal(value=1).uuid), 32)
@@ -0,0 +1,65 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import unittest
+
+from .context import workout
+from workout import WorkoutDecoder
+from workout.repair import repair_json
+
+
+class TestJSONRepair(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = WorkoutDecoder()
+
+    def test_valid_json_is_untouched(self):
+        text = '[{"type": "run", "value": 1, "unit": "miles", "notes": "a, }] \\" b"}]'
+        self.assertEqual(repair_json(text), (text, []))
+
+    def test_prose_and_trailing_commas(self):
+        text = 'Here is the workout:\n```json\n[{"type": "run", "value": 400, "unit": "meters",},]\n```\nLet me know!'
+        (workout, repairs) = self.decoder.decode_with_repairs(text)
+        self.assertEqual(repairs, ['extracted_block', 'removed_trailing_commas'])
+        self.assertEqual(workout.steps[0].value, 400)
+
+    def test_prose_brackets_before_the_object(self):
+        self.assertEqual(repair_json('Sure! [1] means step one. {"type":"workout"}'), ('{"type":"workout"}', ['extracted_block']))
+        (repaired, _) = repair_json('Steps [see note] below:\n["run 400m", "rest 60s"]')
+        self.assertEqual(json.loads(repaired), ['run 400m', 'rest 60s'])
+
+    def test_truncated_output(self):
+        text = '{"type": "workout", "steps": [{"type": "run", "value": 1, "unit": "miles", "notes": "tempo pa'
+        (workout, repairs) = self.decoder.decode_with_repairs(text)
+        self.assertEqual(repairs, ['closed_string', 'balanced_brackets'])
+        self.assertEqual(workout.steps[0].notes, 'tempo pa')
+
+        # A key that never got its value is dropped
+        (repaired, _) = repair_json('[{"type": "rest", "value": 60, "unit": "seconds", "notes":')
+        self.assertEqual(json.loads(repaired), [{'type': 'rest', 'value': 60, 'unit': 'seconds'}])
+
+    def test_missing_bracket(self):
+        text = '{"type": "workout", "steps": [{"type": "run", "value": 1, "unit": "miles"}}'
+        (workout, repairs) = self.decoder.decode_with_repairs(text)
+        self.assertEqual(repairs, ['balanced_brackets'])
+        self.assertEqual(len(workout.steps), 1)
+
+    def test_key_aliases(self):
+        text = '[{"type": "run", "value": 5, "units": "minutes", "note": "easy"}]'
+        parsed = self.decoder.decode(text)
+        step = parsed.steps[0]
+        self.assertEqual((step.unit, step.notes), ('minutes', 'easy'))
+
+        (repaired, repairs) = repair_json(text[:-1] + ',]')
+        self.assertIn('normalized_keys', repairs)
+        self.assertIn('"unit": "minutes"', repaired)
+
+    def test_repair_can_be_disabled(self):
+        with self.assertRaises(json.JSONDecodeError):
+            WorkoutDecoder(repair=False).decode('[{"type": "run", "value": 1,}]')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,63 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from thefuzz import fuzz, process
+
+from .context import workout
+from workout import WorkoutDecoder
+from workout.constants import types as TYPES
+from workout.exceptions import InvalidStepTypeError
+from workout.resolver import DEFAULT_SCORE_THRESHOLD, GOAL, STEP, TypeResolver
+from workout.steps import RunWorkoutStep, WarmUpWorkoutStep
+
+
+def thefuzz_resolve(value: str):
+    """What the decoder did before the resolver, mapped onto the valid types"""
+    value = value.lower()
+    if value in TYPES.WORKOUT_STEPS:
+        return (STEP, TYPES.WORKOUT_STEPS[value])
+    if value in TYPES.STEP_GOALS:
+        return (GOAL, TYPES.STEP_GOALS[value])
+    if fuzz.ratio(value, TYPES.REPETITION) >= DEFAULT_SCORE_THRESHOLD:
+        return (TYPES.REPETITION, TYPES.REPETITION)
+    if (extracted := process.extractOne(value, TYPES.WORKOUT_STEPS.keys(), score_cutoff=DEFAULT_SCORE_THRESHOLD)) is not None:
+        return (STEP, TYPES.WORKOUT_STEPS[extracted[0]])
+    if (extracted := process.extractOne(value, TYPES.STEP_GOALS.keys(), score_cutoff=DEFAULT_SCORE_THRESHOLD)) is not None:
+        return (GOAL, TYPES.STEP_GOALS[extracted[0]])
+    return None
+
+
+class TestTypeResolver(unittest.TestCase):
+
+    def test_matches_thefuzz(self):
+        resolver = TypeResolver()
+        spellings = [
+            'Run', 'runn', 'ru', 'Warm Up', 'WARM_UP', 'warmup!', 'wram-up', 'cooldwn', 'cool down', 'recovry',
+            'rest.', 'reps', 'repetitions', 'Repitition', 'heart rate', 'Heart-Rate Zone', 'hr-zone', 'cadance',
+            'powr', 'lap time', 'pace ', 'strides', 'tempo', 'x', '--', 'wärm-up',
+        ]
+        for spelling in spellings:
+            with self.subTest(spelling=spelling):
+                self.assertEqual(resolver.resolve(spelling), thefuzz_resolve(spelling))
+
+    def test_memo_is_bounded(self):
+        resolver = TypeResolver(memo_size=2)
+        for spelling in ['runn', 'rset', 'cooldwn', 'runn']:
+            resolver.resolve(spelling)
+        self.assertEqual(resolver.cache_info(), {'size': 2, 'max_size': 2})
+
+    def test_deployment_aliases(self):
+        resolver = TypeResolver(step_aliases={'Strides': TYPES.RUN})
+        self.assertEqual(resolver.resolve('strides'), (STEP, TYPES.RUN))
+        self.assertEqual(resolver.resolve('stride'), (STEP, TYPES.RUN))
+
+        with self.assertRaises(InvalidStepTypeError):
+            TypeResolver(step_aliases={'jog': 'jogging'})
+
+    def test_decoder_uses_canonical_types(self):
+        decoder = WorkoutDecoder(resolver=TypeResolver(step_aliases={'strides': TYPES.RUN}))
+        parsed = decoder.decode('[{"type": "wu", "value": 10, "unit": "minutes"}, {"type": "Strides", "value": 6}]')
+        self.assertEqual([type(step) for step in parsed.steps], [WarmUpWorkoutStep, RunWorkoutStep])
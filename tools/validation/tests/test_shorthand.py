@@ -0,0 +1,184 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import unittest
+
+from .context import workout
+from workout.shorthand import ShorthandParser
+
+
+class TestShorthandParsing(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = ShorthandParser()
+
+    def test_daniels_shorthand(self):
+        (parsed, confidence) = self.parser.parse('2 E + 6x1k I w/ 2:00 JG + 2 E')
+        self.assertEqual(confidence, 1.0)
+        self.assertTrue(
+            parsed.similar(
+                workout.Workout(
+                    steps=[
+                        workout.steps.RunWorkoutStep(value=2, unit='miles', notes='easy pace'),
+                        workout.steps.RepetitionStep(
+                            value=6,
+                            steps=[
+                                workout.steps.RunWorkoutStep(value=1000, unit='meters', notes='interval pace'),
+                                workout.steps.RecoverWorkoutStep(value=120, unit='seconds', notes='jog'),
+                            ]
+                        ),
+                        workout.steps.RunWorkoutStep(value=2, unit='miles', notes='easy pace'),
+                    ]
+                )
+            )
+        )
+
+    def test_warm_up_and_cool_down(self):
+        (parsed, confidence) = self.parser.parse('3 mi wu, 4 x 400 R, 2 mi cd')
+        self.assertEqual(confidence, 1.0)
+        self.assertTrue(
+            parsed.similar(
+                workout.Workout(
+                    steps=[
+                        workout.steps.WarmUpWorkoutStep(value=3, unit='miles'),
+                        workout.steps.RepetitionStep(
+                            value=4,
+                            steps=[workout.steps.RunWorkoutStep(value=400, unit='meters', notes='repetition pace')]
+                        ),
+                        workout.steps.CoolDownWorkoutStep(value=2, unit='miles'),
+                    ]
+                )
+            )
+        )
+
+    def test_nested_groups_and_ranges(self):
+        (parsed, confidence) = self.parser.parse('2 miles E pace + 4 x (5 to 6 min T pace with 1-min rest) + 2 miles E pace')
+        self.assertEqual(confidence, 1.0)
+
+        repetition = parsed.steps[1]
+        self.assertEqual(type(repetition), workout.steps.RepetitionStep)
+        self.assertEqual(repetition.value, 4)
+        (run, rest) = repetition.steps
+        self.assertEqual((run.minimum, run.maximum, run.unit, run.notes), (300, 360, 'seconds', 'tempo pace'))
+        self.assertEqual(type(rest), workout.steps.RestWorkoutStep)
+        self.assertEqual((rest.value, rest.unit), (60, 'seconds'))
+
+    def test_repetition_range(self):
+        (parsed, confidence) = self.parser.parse('Warm up 2 miles. 4-6 x 1000m. Cool down 1 mile')
+        self.assertEqual(confidence, 1.0)
+        repetition = parsed.steps[1]
+        self.assertEqual((repetition.minimum, repetition.maximum), (4, 6))
+
+    def test_ladders(self):
+        (parsed, confidence) = self.parser.parse('1 mi wu; ladder from 200 to 1000 by 400, 1 mi cd')
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual([x.value for x in parsed.steps[1:-1]], [200, 600, 1000])
+
+        (parsed, confidence) = self.parser.parse('descending ladder from 1000 to 200 by 400')
+        self.assertEqual([x.value for x in parsed.steps], [1000, 600, 200])
+
+        (parsed, confidence) = self.parser.parse('400-800-1200-800-400')
+        self.assertEqual([x.value for x in parsed.steps], [400, 800, 1200, 800, 400])
+        self.assertTrue(all(x.unit == 'meters' for x in parsed.steps))
+
+    def test_race_paces(self):
+        (parsed, confidence) = self.parser.parse('4 x 1 mile at 10k pace')
+        self.assertEqual(confidence, 1.0)
+        self.assertTrue(
+            parsed.similar(
+                workout.Workout(
+                    steps=[
+                        workout.steps.RepetitionStep(
+                            value=4,
+                            steps=[workout.steps.RunWorkoutStep(value=1, unit='miles', notes='10k pace')]
+                        ),
+                    ]
+                )
+            )
+        )
+
+        (parsed, confidence) = self.parser.parse('6 x 800 @ 5k/10k pace w/ 400 jog')
+        self.assertEqual(confidence, 1.0)
+        (run, jog) = parsed.steps[0].steps
+        self.assertEqual((run.value, run.unit, run.notes), (800, 'meters', '5k/10k pace'))
+        self.assertEqual((jog.value, jog.unit, jog.notes), (400, 'meters', 'jog'))
+
+        (parsed, confidence) = self.parser.parse('4 x 400 at mile pace')
+        self.assertEqual(parsed.steps[0].steps[0].notes, 'mile pace')
+
+    def test_missing_quantities(self):
+        # Without a quantity the LLM has to decide what was meant
+        for text in ('E', 'cd', '6 x 400 R w/ jog', '10k pace', 'wu, cd'):
+            with self.subTest(text=text):
+                (parsed, confidence) = self.parser.parse(text)
+                self.assertLess(confidence, 0.9)
+
+        # but a bare warm-up or cool-down has no value in the JSON either
+        (parsed, confidence) = self.parser.parse('3 mi wu, 4 x 400 R, cd')
+        self.assertEqual(confidence, 1.0)
+        cool_down = parsed.steps[-1]
+        self.assertEqual(type(cool_down), workout.steps.CoolDownWorkoutStep)
+        self.assertEqual((cool_down.value, cool_down.unit), (None, None))
+
+    def test_targets(self):
+        (parsed, confidence) = self.parser.parse('6x1k @ 3:30 w/ 2:00 jg')
+        self.assertEqual(confidence, 1.0)
+        self.assertTrue(
+            parsed.similar(
+                workout.Workout(
+                    steps=[
+                        workout.steps.RepetitionStep(
+                            value=6,
+                            steps=[
+                                workout.steps.RunWorkoutStep(value=1000, unit='meters', notes='at 3:30'),
+                                workout.steps.RecoverWorkoutStep(value=120, unit='seconds', notes='jog'),
+                            ]
+                        ),
+                    ]
+                )
+            )
+        )
+
+        (parsed, confidence) = self.parser.parse('3 x 1 mile @ 6:30 w/ 90s rest')
+        self.assertEqual(len(parsed.steps), 1)
+        (run, rest) = parsed.steps[0].steps
+        self.assertEqual((run.value, run.unit, run.notes), (1, 'miles', 'at 6:30'))
+        self.assertEqual((type(rest), rest.value, rest.unit), (workout.steps.RestWorkoutStep, 90, 'seconds'))
+
+        (parsed, confidence) = self.parser.parse('4 miles at 7:00 pace')
+        self.assertEqual(confidence, 1.0)
+        self.assertEqual([(x.value, x.unit, x.notes) for x in parsed.steps], [(4, 'miles', 'at 7:00 pace')])
+
+        (parsed, confidence) = self.parser.parse('6x1k I @ 3:30')
+        self.assertEqual(parsed.steps[0].steps[0].notes, 'interval pace, at 3:30')
+
+    def test_jog_and_walk_are_recoveries(self):
+        (parsed, confidence) = self.parser.parse('5 x (400m I, 200m jg)')
+        self.assertEqual(confidence, 1.0)
+        (run, jog) = parsed.steps[0].steps
+        self.assertEqual(type(run), workout.steps.RunWorkoutStep)
+        self.assertEqual((type(jog), jog.value, jog.unit, jog.notes), (workout.steps.RecoverWorkoutStep, 200, 'meters', 'jog'))
+
+        (parsed, confidence) = self.parser.parse('1 mi walk')
+        self.assertEqual((type(parsed.steps[0]), parsed.steps[0].notes), (workout.steps.RecoverWorkoutStep, 'walk'))
+
+    def test_missing_separator(self):
+        # A time right after a step is more likely its target than a new step
+        (parsed, confidence) = self.parser.parse('6x1k 3:30 w/ 2:00 jg')
+        self.assertLess(confidence, 0.9)
+
+    def test_low_confidence(self):
+        (parsed, confidence) = self.parser.parse('Do 5 by 400m with equal jogging rest')
+        self.assertLess(confidence, 0.9)
+
+        (parsed, confidence) = self.parser.parse('4 x 400')
+        self.assertLess(confidence, 1.0)
+
+        (parsed, confidence) = self.parser.parse('hello there')
+        self.assertIsNone(parsed)
+        self.assertEqual(confidence, 0.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,120 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json
+import unittest
+
+from .context import workout
+from workout import WorkoutDecoder
+from workout.exceptions import InvalidWorkoutPrefixError
+from workout.stream import IncrementalWorkoutDecoder
+
+
+def chunked(text: str, size: int):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+class TestIncrementalDecoding(unittest.TestCase):
+
+    response = '```{\n  "type": "workout",\n  "name": "Tempo {set}",\n  "steps": [\n    {"type": "warm-up", "value": 2, "unit": "miles", "notes": "easy pace"},\n    {"type": "repetition", "value": 4, "steps": [\n      {"type": "run", "value": 1, "unit": "miles", "notes": "tempo \\"pace\\""},\n      {"type": "rest", "value": 60, "unit": "seconds"}\n    ]},\n    {"type": "cool-down", "value": 2, "unit": "miles"}\n  ]\n}\n```'
+
+    def feed_all(self, decoder: IncrementalWorkoutDecoder, text: str, size: int):
+        emitted = []
+        for chunk in chunked(text, size):
+            emitted.append(decoder.feed(chunk))
+        return emitted
+
+    def test_emits_steps_as_they_close(self):
+        decoder = IncrementalWorkoutDecoder()
+        emitted = self.feed_all(decoder, self.response, 7)
+        steps = [step for chunk in emitted for step in chunk]
+
+        self.assertEqual(
+            [type(x) for x in steps],
+            [
+                workout.steps.WarmUpWorkoutStep,
+                workout.steps.RunWorkoutStep,
+                workout.steps.RestWorkoutStep,
+                workout.steps.RepetitionStep,
+                workout.steps.CoolDownWorkoutStep,
+            ]
+        )
+        self.assertEqual(steps[1].notes, 'tempo "pace"')
+
+        # The warm-up should arrive long before the stream finishes
+        first = next(i for (i, chunk) in enumerate(emitted) if len(chunk) > 0)
+        self.assertLess(first, len(emitted) // 2)
+        self.assertTrue(decoder.is_complete)
+
+    def test_result_matches_decoder(self):
+        for size in (1, 3, 64, len(self.response)):
+            decoder = IncrementalWorkoutDecoder()
+            self.feed_all(decoder, self.response, size)
+            streamed = decoder.close()
+            expected = WorkoutDecoder().decode(self.response)
+
+            self.assertEqual(streamed.name, 'Tempo {set}')
+            self.assertTrue(streamed.similar(expected))
+
+    def test_top_level_array(self):
+        text = '[{"type": "run", "value": 400, "unit": "meters"}, {"type": "recover", "value": 200, "unit": "meters"}]'
+        decoder = IncrementalWorkoutDecoder()
+        steps = [step for chunk in self.feed_all(decoder, text, 5) for step in chunk]
+
+        self.assertEqual(len(steps), 2)
+        self.assertTrue(decoder.close().similar(json.loads(text, cls=WorkoutDecoder)))
+
+    def test_rejects_prose_preamble(self):
+        decoder = IncrementalWorkoutDecoder(WorkoutDecoder(repair=False))
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            self.feed_all(decoder, 'Here is your workout: {"type": "workout"', 4)
+
+        # It should not have needed more than the first few characters
+        self.assertLess(len(decoder.text), 8)
+
+    def test_rejects_wrong_top_level_type(self):
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            IncrementalWorkoutDecoder(WorkoutDecoder(repair=False)).feed('"a string"')
+
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            IncrementalWorkoutDecoder().feed('["run 400m", ')
+
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            IncrementalWorkoutDecoder().feed('{"type": "heart_rate", "value": ')
+
+    def test_rejects_invalid_step_early(self):
+        decoder = IncrementalWorkoutDecoder()
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            decoder.feed('{"type": "workout", "steps": [{"type": "xyzzy", "value": 1}')
+
+    def test_rejects_trailing_text(self):
+        decoder = IncrementalWorkoutDecoder(WorkoutDecoder(repair=False))
+        decoder.feed('[{"type": "run", "value": 400}]\n')
+        with self.assertRaises(InvalidWorkoutPrefixError):
+            decoder.feed('I hope this helps!')
+
+    def test_repairs_like_decoder(self):
+        text = 'Sure! Here is your workout:\n```json\n{"type": "workout", "title": "Hills", "steps": [\n  {"type": "run", "value": 6, "units": "x", "note": "hill",},\n  {"type": "recover", "value": 90, "unit": "seconds",},\n],}\n```\nI hope this helps!'
+        expected = WorkoutDecoder().decode_with_repairs(text)[0]
+        for size in (1, 4, len(text)):
+            decoder = IncrementalWorkoutDecoder()
+            steps = [step for chunk in self.feed_all(decoder, text, size) for step in chunk]
+            self.assertEqual([type(x) for x in steps], [workout.steps.RunWorkoutStep, workout.steps.RecoverWorkoutStep])
+            self.assertEqual((steps[0].unit, steps[0].notes), ('x', 'hill'))
+
+            streamed = decoder.close()
+            self.assertEqual(streamed.name, 'Hills')
+            self.assertTrue(streamed.similar(expected))
+
+    def test_buffers_what_only_close_can_repair(self):
+        # The missing ']' can only be fixed with the whole text
+        text = '{"type": "workout", "steps": [{"type": "run", "value": 400, "unit": "meters"}}'
+        decoder = IncrementalWorkoutDecoder()
+        self.assertEqual(len(decoder.feed(text)), 1)
+        self.assertEqual(decoder.feed(' trailing'), [])
+        self.assertTrue(decoder.close().similar(WorkoutDecoder().decode(text)))
+
+
+if __name__ == '__main__':
+    unittest.main()
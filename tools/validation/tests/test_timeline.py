@@ -0,0 +1,75 @@
+import os
+import sys
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import itertools
+import unittest
+
+from .context import workout
+from workout import Workout
+from workout.steps import RunWorkoutStep, RecoverWorkoutStep, RepetitionStep, WarmUpWorkoutStep
+from workout.timeline import Timeline, expand
+
+
+class TestTimeline(unittest.TestCase):
+
+    def setUp(self):
+        # 10 minutes, then 3 x (400m, 2 x (60s, 100m), 90s), then 1 mile
+        self.workout = Workout(name='Intervals', steps=[
+            WarmUpWorkoutStep(10, unit='minutes'),
+            RepetitionStep(3, steps=[
+                RunWorkoutStep(400, unit='meters'),
+                RepetitionStep(2, steps=[
+                    RunWorkoutStep(60, unit='seconds'),
+                    RunWorkoutStep(100, unit='m'),
+                ]),
+                RecoverWorkoutStep(90, unit='seconds'),
+            ]),
+            RunWorkoutStep(1, unit='mile'),
+        ])
+
+    def check(self, timeline: Timeline):
+        """Every lookup agrees with walking the expanded steps"""
+        positions = list(timeline)
+        self.assertEqual(len(positions), len(timeline))
+        for (axis, find, total) in (('start_time', timeline.at_time, timeline.duration), ('start_distance', timeline.at_distance, timeline.distance)):
+            starts = sorted({getattr(position, axis) for position in positions} | {total})
+            for (start, end) in zip(starts, starts[1:]):
+                for target in (start, (start + end) / 2):
+                    expected = [position for position in positions if getattr(position, axis) <= target][-1]
+                    found = find(target)
+                    self.assertEqual((found.index, found.laps, found.step), (expected.index, expected.laps, expected.step))
+                    self.assertAlmostEqual(getattr(found, axis) + found.offset, target)
+            self.assertIsNone(find(total))
+            self.assertIsNone(find(-1))
+
+    def test_lookups(self):
+        timeline = Timeline(self.workout)
+        self.assertEqual(len(timeline), 20)
+        self.assertEqual(timeline.duration, 600 + 3 * (2 * 60 + 90))
+        self.assertEqual(timeline.distance, 3 * (400 + 2 * 100) + 1609.344)
+        self.check(timeline)
+
+        # 1100s in is the second 60s of the last lap
+        position = timeline.at_time(1100)
+        self.assertEqual((position.index, position.laps, position.offset), (16, (2, 1), 20))
+        self.assertIs(position.step, self.workout.steps[1].steps[1].steps[0])
+
+        # Distance steps take time at a pace, so that's the 400m of the second lap
+        self.check(Timeline(self.workout, pace=0.3))
+        self.assertEqual(Timeline(self.workout, pace=0.3).at_time(1100).index, 7)
+
+    def test_lazy(self):
+        step = RunWorkoutStep(1, unit='seconds')
+        steps = [RepetitionStep(1000, steps=[RepetitionStep(1000, steps=[step])])]
+        timeline = Timeline(steps)
+        self.assertEqual(len(timeline), 1000000)
+        position = timeline.at_time(654321.5)
+        self.assertEqual((position.index, position.laps, position.offset), (654321, (654, 321), 0.5))
+
+        first = list(itertools.islice(expand(steps), 3))
+        self.assertEqual(first, [(step, (0, 0)), (step, (0, 1)), (step, (0, 2))])
+
+
+if __name__ == '__main__':
+    unittest.main()
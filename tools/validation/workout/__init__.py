@@ -1,2 +1,2 @@
 from .workout import Workout
-from .json import WorkoutDecoder
+from .json import WorkoutDecoder, WorkoutEncoder
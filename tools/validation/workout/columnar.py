@@ -0,0 +1,270 @@
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from .compiled import GOAL_CLASSES, STEP_CLASSES
+from .constants import types as TYPES
+from .goals import EMPTY_GOALS, WorkoutStepGoals
+from .shorthand import METERS_PER_MILE, UNITS
+from .steps import RepetitionStep
+from .workout import Workout
+
+
+# The codes in the kind column are indexes into STEP_TYPES, and the goal
+# columns follow GOAL_TYPES
+STEP_TYPES = list(TYPES.VALID_STEPS)
+GOAL_TYPES = list(TYPES.VALID_STEP_GOALS)
+REPETITION_CODE = STEP_TYPES.index(TYPES.REPETITION)
+
+# Unit code of steps without a unit
+NO_UNIT = -1
+
+# Columns of WorkoutColumns.numbers: the step's own value, minimum and
+# maximum, then the same three for each goal type
+VALUE = 0
+MINIMUM = 1
+MAXIMUM = 2
+FIELDS = ('value', 'minimum', 'maximum')
+
+_CODES = {step_type: code for (code, step_type) in enumerate(STEP_TYPES)}
+_CLASS_CODES = {cls: _CODES[step_type] for (step_type, cls) in STEP_CLASSES.items()}
+_CLASS_CODES[RepetitionStep] = REPETITION_CODE
+_NO_GOALS = [False] * len(GOAL_TYPES)
+_NO_GOAL_NUMBERS = [None] * len(FIELDS) * len(GOAL_TYPES)
+_CLASSES = [RepetitionStep if step_type == TYPES.REPETITION else STEP_CLASSES[step_type] for step_type in STEP_TYPES]
+
+
+def goal_column(goal_type: str, field: str = 'value') -> int:
+    """The column of WorkoutColumns.numbers for one field of one goal type"""
+    return len(FIELDS) * (1 + GOAL_TYPES.index(goal_type)) + FIELDS.index(field)
+
+
+def _number(value, integer: bool) -> int | float | None:
+    if value != value:
+        return None
+    return int(value) if integer else value
+
+
+class WorkoutColumns(object):
+    """
+    Workouts flattened into NumPy columns, one row per step or repetition.
+
+    The rows of each workout are in document order, so a repetition comes
+    right before its steps and parent always points backwards. Besides the
+    step type (kind) and unit codes there are the numbers (value, minimum
+    and maximum of the step and of each goal, NaN when missing), the depth,
+    the parent row (-1 at the top), and repeats: how many times the row is
+    performed once the repetitions around it are taken into account.
+
+    to_workouts() builds the same object trees back. Everything else works
+    on whole columns, so totals over thousands of workouts don't walk any
+    objects.
+    """
+
+    def __init__(self):
+        self.kind = np.zeros(0, dtype=np.int8)
+        self.unit = np.zeros(0, dtype=np.int16)
+        self.numbers = np.zeros((0, len(FIELDS) * (1 + len(GOAL_TYPES))))
+        # Which numbers were ints, so they come back as ints
+        self.integers = np.zeros(self.numbers.shape, dtype=bool)
+        # Which goals the row has, even if all of their numbers are missing
+        self.goals = np.zeros((0, len(GOAL_TYPES)), dtype=bool)
+        self.depth = np.zeros(0, dtype=np.int16)
+        self.parent = np.zeros(0, dtype=np.int32)
+        self.repeats = np.zeros(0)
+        self.workout = np.zeros(0, dtype=np.int32)
+        self.notes: List[str | None] = []
+
+        # The unit codes index units. The rows of workout i are
+        # offsets[i]:offsets[i + 1].
+        self.units: List[str] = []
+        self.offsets = np.zeros(1, dtype=np.int64)
+        self.names: List[str | None] = []
+        self.workout_notes: List[str | None] = []
+
+    def __len__(self) -> int:
+        return len(self.kind)
+
+    @property
+    def workout_count(self) -> int:
+        return len(self.names)
+
+    @property
+    def value(self) -> np.ndarray:
+        return self.numbers[:, VALUE]
+
+    @property
+    def minimum(self) -> np.ndarray:
+        return self.numbers[:, MINIMUM]
+
+    @property
+    def maximum(self) -> np.ndarray:
+        return self.numbers[:, MAXIMUM]
+
+    def goal(self, goal_type: str, field: str = 'value') -> np.ndarray:
+        return self.numbers[:, goal_column(goal_type, field)]
+
+    # ------------------------------
+    # CONVERSION
+    # ------------------------------
+
+    @classmethod
+    def from_workout(cls, workout: Workout) -> 'WorkoutColumns':
+        return cls.from_workouts([workout])
+
+    @classmethod
+    def from_workouts(cls, workouts: Iterable[Workout]) -> 'WorkoutColumns':
+        columns = cls()
+        units = {}
+        (kind, unit, numbers, goals, depth, parent, repeats, workout_index, offsets) = ([], [], [], [], [], [], [], [], [0])
+
+        for workout in workouts:
+            columns.names.append(workout.name)
+            columns.workout_notes.append(workout.notes)
+
+            stack = [(step, -1, 0, 1) for step in reversed(workout.steps or [])]
+            while len(stack) > 0:
+                (step, step_parent, step_depth, step_repeats) = stack.pop()
+                code = _CLASS_CODES.get(type(step))
+                if code is None:
+                    raise TypeError(f'{step} is not a step that can be stored in columns')
+
+                row = len(kind)
+                kind.append(code)
+                unit.append(units.setdefault(step.unit, len(units)) if getattr(step, 'unit', None) is not None else NO_UNIT)
+                depth.append(step_depth)
+                parent.append(step_parent)
+                repeats.append(step_repeats)
+                workout_index.append(len(columns.names) - 1)
+                columns.notes.append(step.notes)
+
+                if step.goals is None or step.goals is EMPTY_GOALS:
+                    numbers.append([step.value, step.minimum, step.maximum] + _NO_GOAL_NUMBERS)
+                    goals.append(_NO_GOALS)
+                else:
+                    row_numbers = [step.value, step.minimum, step.maximum]
+                    row_goals = []
+                    for goal_type in GOAL_TYPES:
+                        goal = getattr(step.goals, goal_type)
+                        row_goals.append(goal is not None)
+                        row_numbers.extend((None, None, None) if goal is None else (goal.value, goal.minimum, goal.maximum))
+                    numbers.append(row_numbers)
+                    goals.append(row_goals)
+
+                if code == REPETITION_CODE:
+                    count = step.value if step.value is not None else 1
+                    stack.extend((child, row, step_depth + 1, step_repeats * count) for child in reversed(step.steps))
+            offsets.append(len(kind))
+
+        columns.kind = np.array(kind, dtype=np.int8)
+        columns.unit = np.array(unit, dtype=np.int16)
+        columns.numbers = np.array(numbers, dtype=float).reshape(len(kind), columns.numbers.shape[1])
+        columns.integers = np.array([[type(x) is int for x in row] for row in numbers], dtype=bool).reshape(columns.numbers.shape)
+        columns.goals = np.array(goals, dtype=bool).reshape(len(kind), len(GOAL_TYPES))
+        columns.depth = np.array(depth, dtype=np.int16)
+        columns.parent = np.array(parent, dtype=np.int32)
+        columns.repeats = np.array(repeats, dtype=float)
+        columns.workout = np.array(workout_index, dtype=np.int32)
+        columns.units = list(units.keys())
+        columns.offsets = np.array(offsets, dtype=np.int64)
+        return columns
+
+    def to_workouts(self) -> List[Workout]:
+        """The workouts the columns were made from"""
+        (kind, unit, parent, goals) = (self.kind.tolist(), self.unit.tolist(), self.parent.tolist(), self.goals.tolist())
+        (numbers, integers, offsets) = (self.numbers.tolist(), self.integers.tolist(), self.offsets.tolist())
+
+        workouts = []
+        for index in range(self.workout_count):
+            (start, end) = (offsets[index], offsets[index + 1])
+            children = {}
+            top = []
+
+            # Backwards, so a repetition's steps are all built before it
+            for row in range(end - 1, start - 1, -1):
+                values = [_number(x, integer) for (x, integer) in zip(numbers[row], integers[row])]
+                step_goals = None
+                if any(goals[row]):
+                    step_goals = WorkoutStepGoals()
+                    for (position, goal_type) in enumerate(GOAL_TYPES):
+                        if goals[row][position]:
+                            column = goal_column(goal_type)
+                            setattr(step_goals, goal_type, GOAL_CLASSES[goal_type](*values[column:column + len(FIELDS)]))
+
+                cls = _CLASSES[kind[row]]
+                if kind[row] == REPETITION_CODE:
+                    step = cls(values[VALUE], values[MINIMUM], values[MAXIMUM], children.pop(row)[::-1], self.notes[row], step_goals)
+                else:
+                    step_unit = self.units[unit[row]] if unit[row] != NO_UNIT else None
+                    step = cls(values[VALUE], values[MINIMUM], values[MAXIMUM], step_unit, step_goals, self.notes[row])
+                # The constructors fill in a missing value from the limits
+                step.value = values[VALUE]
+
+                siblings = top if parent[row] < 0 else children.setdefault(parent[row], [])
+                siblings.append(step)
+
+            workouts.append(Workout(name=self.names[index], steps=top[::-1], notes=self.workout_notes[index]))
+        return workouts
+
+    # ------------------------------
+    # AGGREGATIONS
+    # ------------------------------
+
+    def _unit_factors(self, canonical: str, per_canonical: float = 1.0) -> np.ndarray:
+        """Each row's multiplier into the canonical unit, NaN if it's in another"""
+        factors = []
+        for name in self.units:
+            (unit_name, multiplier) = UNITS.get(name.strip().lower(), (None, None))
+            factors.append(multiplier * per_canonical if unit_name == canonical else np.nan)
+        # NO_UNIT is -1, which picks the NaN at the end
+        factors.append(np.nan)
+        return np.array(factors)[self.unit]
+
+    def _amounts(self, factors: np.ndarray) -> np.ndarray:
+        amounts = self.value * factors * self.repeats
+        amounts[self.kind == REPETITION_CODE] = np.nan
+        return amounts
+
+    def distances(self) -> np.ndarray:
+        """Meters covered by each row in total, NaN for rows that aren't distances"""
+        return self._amounts(np.fmax(self._unit_factors('meters'), self._unit_factors('miles', METERS_PER_MILE)))
+
+    def durations(self) -> np.ndarray:
+        """Seconds spent in each row in total, NaN for rows that aren't times"""
+        return self._amounts(self._unit_factors('seconds'))
+
+    def total_by_type(self, amounts: np.ndarray) -> Dict[str, float]:
+        """Sums amounts (e.g. distances()) by step type, ignoring NaN"""
+        sums = np.bincount(self.kind, weights=np.nan_to_num(amounts), minlength=len(STEP_TYPES))
+        return {step_type: float(sums[code]) for (code, step_type) in enumerate(STEP_TYPES) if code != REPETITION_CODE}
+
+    def distance_by_type(self) -> Dict[str, float]:
+        return self.total_by_type(self.distances())
+
+    def duration_by_type(self) -> Dict[str, float]:
+        return self.total_by_type(self.durations())
+
+    def per_workout(self, amounts: np.ndarray) -> np.ndarray:
+        """Sums amounts for each workout, ignoring NaN"""
+        return np.bincount(self.workout, weights=np.nan_to_num(amounts), minlength=self.workout_count)
+
+    def time_in_heart_rate_zones(self) -> Dict[int, float]:
+        """
+        Seconds with a heart rate zone goal, by zone. A zone given as a range
+        counts as its midpoint, rounded down, like a step's value.
+        """
+        zone = self.goal(TYPES.HEART_RATE_ZONE)
+        (low, high) = (self.goal(TYPES.HEART_RATE_ZONE, 'minimum'), self.goal(TYPES.HEART_RATE_ZONE, 'maximum'))
+        zone = np.where(np.isnan(zone), np.floor((high - low) / 2 + low), zone)
+
+        durations = self.durations()
+        mask = ~np.isnan(zone) & ~np.isnan(durations)
+        if not mask.any():
+            return {}
+        seconds = np.bincount(zone[mask].astype(np.int64), weights=durations[mask])
+        return {zone: float(total) for (zone, total) in enumerate(seconds) if total > 0}
+
+    def repetition_counts(self) -> np.ndarray:
+        """For each workout, how many times repetitions start over in total"""
+        counts = np.where(self.kind == REPETITION_CODE, np.nan_to_num(self.value) * self.repeats, 0.0)
+        return self.per_workout(counts)
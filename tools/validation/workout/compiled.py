@@ -0,0 +1,199 @@
+import json
+
+from typing import Callable, Dict, List, Tuple
+
+from .constants import keys as KEYS
+from .constants import types as TYPES
+
+from .goals import AbstractWorkoutStepGoal, SpeedGoal, HeartRateGoal, HeartRateZoneGoal, CadenceGoal, PowerGoal, LapTimeGoal
+from .steps import AbstractWorkoutStep, RunWorkoutStep, RecoverWorkoutStep, RestWorkoutStep, WarmUpWorkoutStep, CoolDownWorkoutStep
+from .steps import RepetitionStep
+from .workout import Workout
+
+from .exceptions import InvalidStepTypeError
+from .json import WorkoutDecoder
+from .repair import KEY_ALIASES
+from .resolver import GOAL, STEP, TypeResolver
+
+
+STEP_CLASSES = {
+    TYPES.RUN: RunWorkoutStep,
+    TYPES.RECOVER: RecoverWorkoutStep,
+    TYPES.REST: RestWorkoutStep,
+    TYPES.WARM_UP: WarmUpWorkoutStep,
+    TYPES.COOL_DOWN: CoolDownWorkoutStep,
+}
+
+GOAL_CLASSES = {
+    TYPES.SPEED: SpeedGoal,
+    TYPES.HEART_RATE: HeartRateGoal,
+    TYPES.HEART_RATE_ZONE: HeartRateZoneGoal,
+    TYPES.CADENCE: CadenceGoal,
+    TYPES.POWER: PowerGoal,
+    TYPES.LAP_TIME: LapTimeGoal,
+}
+
+_ALIASED_KEYS = frozenset(KEY_ALIASES.keys())
+
+
+def _stripped(value) -> str | None:
+    if value is None:
+        return None
+    value = value.strip()
+    return value if len(value) > 0 else None
+
+
+def _limits(data: dict) -> tuple:
+    # Same as get_limits in json.py
+    minimum = data.get(KEYS.MINIMUM) or data.get(KEYS.MIN)
+    maximum = data.get(KEYS.MAXIMUM) or data.get(KEYS.MAX)
+    if minimum is not None and maximum is not None and minimum > maximum:
+        return (maximum, minimum, data.get(KEYS.VALUE))
+    return (minimum, maximum, data.get(KEYS.VALUE))
+
+
+def _at(error: Exception, path: str) -> Exception:
+    """Record where the error happened. The innermost path wins."""
+    if getattr(error, 'path', None) is None:
+        error.path = path
+        error.add_note(f'at {path}')
+    return error
+
+
+def _within(error: Exception, relative: str) -> Exception:
+    """Note which part of the object was wrong, e.g. .steps[2]"""
+    error.relative_path = relative
+    return error
+
+
+class CompiledWorkoutDecoder(WorkoutDecoder):
+    """
+    A faster WorkoutDecoder that builds the same Workout trees.
+
+    Types are looked up in a table made once per decoder from
+    constants/types.py and the resolver's aliases, so the fuzzy matching
+    only runs for types that aren't in it, and every object is built
+    straight from its dict. It's still one pass, in the JSON scanner's
+    object_hook.
+
+    Errors are the same as WorkoutDecoder's, with the JSON path of the
+    offending value in error.path (e.g. $.steps[2].type) and in a note on
+    the exception. Finding the path takes a second look at the JSON, which
+    only failed decodes pay for.
+    """
+
+    def __init__(self, *args, repair: bool = True, resolver: TypeResolver | None = None, **kwargs):
+        super().__init__(*args, repair=repair, resolver=resolver, **kwargs)
+
+        # Every exact type, alias included, straight to its builder and
+        # class. Later entries win, in the order WorkoutDecoder checks them.
+        self._table: Dict[str, Tuple[Callable, type | None]] = {}
+        for (alias, goal_type) in self.resolver.goals.items():
+            self._table[alias] = (self._build_goal, GOAL_CLASSES[goal_type])
+        for (alias, step_type) in self.resolver.steps.items():
+            self._table[alias] = (self._build_step, STEP_CLASSES[step_type])
+        self._table[TYPES.REPETITION] = (self._build_repetition, RepetitionStep)
+        self._table[TYPES.WORKOUT] = (self._build_workout, None)
+
+    def decode_with_repairs(self, s, **kwargs) -> Tuple[Workout, List[str]]:
+        try:
+            return super().decode_with_repairs(s, **kwargs)
+        except json.JSONDecodeError:
+            raise
+        except Exception as e:
+            path = self.locate(s, **kwargs)
+            if path is not None:
+                _at(e, path)
+            raise
+
+    def locate(self, s, **kwargs) -> str | None:
+        """The JSON path of the value that makes s fail to decode, if any"""
+        try:
+            (obj, _) = self.parse(s, json.JSONDecoder().decode, **kwargs)
+            self._walk(obj, '$')
+        except Exception as e:
+            return getattr(e, 'path', None)
+        return None
+
+    def _walk(self, value, path: str):
+        """Decode the parsed JSON again, children first like the scanner"""
+        if value.__class__ is list:
+            for (index, item) in enumerate(value):
+                value[index] = self._walk(item, f'{path}[{index}]')
+        elif value.__class__ is dict:
+            for (key, item) in value.items():
+                value[key] = self._walk(item, f'{path}.{key}')
+            try:
+                return self.object_hook(value)
+            except Exception as e:
+                raise _at(e, path + getattr(e, 'relative_path', ''))
+        return value
+
+    def object_hook(self, data):
+        """Decode an object from a dictionary"""
+        if KEYS.TYPE not in data:
+            return data
+
+        # The aliased keys, as in WorkoutDecoder
+        if not _ALIASED_KEYS.isdisjoint(data):
+            for (alias, key) in KEY_ALIASES.items():
+                if alias in data:
+                    value = data.pop(alias)
+                    data.setdefault(key, value)
+
+        step_type = data[KEYS.TYPE].lower()
+        entry = self._table.get(step_type)
+        if entry is None:
+            entry = self._resolve(step_type)
+        return entry[0](entry[1], data)
+
+    def _resolve(self, step_type: str) -> Tuple[Callable, type | None]:
+        resolved = self.resolver.resolve(step_type)
+        if resolved is None:
+            raise _within(InvalidStepTypeError(step_type), f'.{KEYS.TYPE}')
+        (kind, resolved_type) = resolved
+        if kind == STEP:
+            return (self._build_step, STEP_CLASSES[resolved_type])
+        if kind == GOAL:
+            return (self._build_goal, GOAL_CLASSES[resolved_type])
+        return self._table[kind]
+
+    # ------------------------------
+    # BUILDERS
+    # ------------------------------
+
+    def _checked_steps(self, data: dict) -> list:
+        steps = data.get(KEYS.STEPS)
+        if steps is None:
+            raise _within(ValueError('No steps provided'), f'.{KEYS.STEPS}')
+        for (index, step) in enumerate(steps):
+            if not isinstance(step, AbstractWorkoutStep):
+                raise _within(TypeError(f'{step} is not of type WorkoutStep'), f'.{KEYS.STEPS}[{index}]')
+        return steps
+
+    def _build_workout(self, cls, data: dict) -> Workout:
+        return Workout(
+            name=_stripped(data.get(KEYS.NAME)),
+            steps=self._checked_steps(data),
+            notes=_stripped(data.get(KEYS.NOTES)),
+        )
+
+    def _build_repetition(self, cls, data: dict) -> RepetitionStep:
+        steps = self._checked_steps(data)
+        goals = data.get(KEYS.GOALS)
+        if goals is not None:
+            for (index, goal) in enumerate(goals):
+                if not isinstance(goal, AbstractWorkoutStepGoal):
+                    raise _within(TypeError(f'{goal} is not of type AbstractWorkoutStepGoal'), f'.{KEYS.GOALS}[{index}]')
+
+        (minimum, maximum, value) = _limits(data)
+        return RepetitionStep(value, minimum, maximum, steps, _stripped(data.get(KEYS.NOTES)), goals)
+
+    def _build_step(self, cls, data: dict) -> AbstractWorkoutStep:
+        # Like decode_step, the goals of a plain step aren't kept
+        (minimum, maximum, value) = _limits(data)
+        return cls(value, minimum, maximum, _stripped(data.get(KEYS.UNIT)), None, _stripped(data.get(KEYS.NOTES)))
+
+    def _build_goal(self, cls, data: dict) -> AbstractWorkoutStepGoal:
+        (minimum, maximum, value) = _limits(data)
+        return cls(value, minimum, maximum)
@@ -25,4 +25,18 @@ class InvalidStepTypeError(InvalidTypeError):
             valid_types = ", ".join(TYPES.VALID_STEPS)
             super().__init__(f"Invalid type: {value}. Valid values are {valid_types}")
         else:
-            super.__init__()
\ No newline at end of file
+            super.__init__()
+
+class InvalidWorkoutPrefixError(ValueError):
+    """
+    Raised while streaming when the text received so far can never become a
+    valid workout, no matter what follows.
+    """
+
+    def __init__(self, reason: str, position: int | None = None):
+        self.reason = reason
+        self.position = position
+        if position is not None:
+            super().__init__(f"Invalid workout JSON at character {position}: {reason}")
+        else:
+            super().__init__(f"Invalid workout JSON: {reason}")
@@ -4,6 +4,8 @@ from .constants import keys as KEYS
 
 
 class AbstractWorkoutStepGoal(WorkoutObject):
+    __slots__ = ('value', 'minimum', 'maximum')
+
     # If everything is null, then we don't need this goal
     def __init__(self, value=None, minimum=None, maximum=None):
         self.value = value
@@ -28,13 +30,13 @@ class CadenceGoal(AbstractWorkoutStepGoal):
     """
     Class to hold cadence goals. Values are strides per minute
     """
-    pass
+    __slots__ = ()
 
 class HeartRateGoal(AbstractWorkoutStepGoal):
     """
     Class to hold heart rate goals. Values are given in beats per minute
     """
-    pass
+    __slots__ = ()
 
     # Flag suspicious beats per minute such as <30 or >200
     # Allow it, but give the chatbot the ability to prompt and clear the warning
@@ -43,25 +45,29 @@ class HeartRateZoneGoal(AbstractWorkoutStepGoal):
     """
     Class to hold heart rate zone goals. Values should be 1-5 inclusive
     """
-    pass
+    __slots__ = ()
 
 class LapTimeGoal(AbstractWorkoutStepGoal):
     """
     Class to hold lap time goals. Values are given in seconds.
     """
-    pass
+    __slots__ = ()
 
 class PowerGoal(AbstractWorkoutStepGoal):
     """
     Class to hold power goals. Values are in watts
     """
-    pass
+    __slots__ = ()
 
 class SpeedGoal(AbstractWorkoutStepGoal):
     """
     Class to hold speed and pace goals. Values are given in m/s
     """
-    pass
+    __slots__ = ()
+
+
+# Set to EMPTY_GOALS once WorkoutStepGoals exists
+_EMPTY = None
 
 
 class WorkoutStepGoals(WorkoutObject):
@@ -70,8 +76,12 @@ class WorkoutStepGoals(WorkoutObject):
     is performed at this stage. Generally speaking, watches only allow ONE of
     these to be active. We'll handle /that/ issue when converting from the 
     Workout into a specific format.
+
+    Steps without goals all share EMPTY_GOALS, which can't be changed.
     """
 
+    __slots__ = ('cadence', 'heart_rate', 'heart_rate_zone', 'lap_time', 'power', 'speed')
+
     def  __init__(
            self, 
            cadence: CadenceGoal | None = None,
@@ -88,6 +98,11 @@ class WorkoutStepGoals(WorkoutObject):
         self.power = power
         self.speed = speed
 
+    def __setattr__(self, name: str, value: Any):
+        if self is _EMPTY:
+            raise AttributeError("EMPTY_GOALS is shared by every step without goals. Give the step its own WorkoutStepGoals instead.")
+        object.__setattr__(self, name, value)
+
     @classmethod
     def from_list(cls, goals: List[AbstractWorkoutStepGoal] | None) -> Self:    
         obj = WorkoutStepGoals()
@@ -188,4 +203,7 @@ class WorkoutStepGoals(WorkoutObject):
     def compressed(self) -> Self | None:
         if self.is_empty:
             return None
-        return self
\ No newline at end of file
+        return self
+
+
+EMPTY_GOALS = _EMPTY = WorkoutStepGoals()
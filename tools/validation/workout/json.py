@@ -1,23 +1,22 @@
-from thefuzz import fuzz, process
 import json
 from typing import TypeAlias, List, Self, Tuple
 
 from .constants import keys as KEYS
 from .constants import types as TYPES
 
-from .goals import AbstractWorkoutStepGoal, SpeedGoal, HeartRateGoal, HeartRateZoneGoal, CadenceGoal, PowerGoal, LapTimeGoal
+from .goals import AbstractWorkoutStepGoal, SpeedGoal, HeartRateGoal, HeartRateZoneGoal, CadenceGoal, PowerGoal, LapTimeGoal, WorkoutStepGoals
 from .steps import AbstractWorkoutStep, WorkoutStep, RunWorkoutStep, RecoverWorkoutStep, RestWorkoutStep, WarmUpWorkoutStep, CoolDownWorkoutStep
 from .steps import RepetitionStep
 from .workout import Workout
 
 from .exceptions import InvalidGoalTypeError, InvalidStepTypeError
+from .repair import KEY_ALIASES, repair_json
+from .resolver import DEFAULT_SCORE_THRESHOLD, GOAL, STEP, TypeResolver, default_resolver
 
 
 
 # Encode / Decode
 
-DEFAULT_SCORE_THRESHOLD = 77
-
 F: TypeAlias = float | None
 def get_limits(data) -> Tuple[F, F, F]:
     # Support both min / minimum and max / maximum
@@ -36,6 +35,9 @@ def get_limits(data) -> Tuple[F, F, F]:
 
 # Perform a fuzzy Levenshtein distance match to allow for a few spelling errors, etc.
 def selectFuzzyMatch(target: str, options: List[str], score_cutoff: int = DEFAULT_SCORE_THRESHOLD):
+    # thefuzz is only imported once a type doesn't match exactly. Well-formed
+    # workouts never need it.
+    from thefuzz import process
     return process.extractOne(target, options, score_cutoff=score_cutoff)
  
 def get_type_from_dict(data) -> str:
@@ -44,9 +46,16 @@ def get_type_from_dict(data) -> str:
 
 class WorkoutDecoder(json.JSONDecoder):
     
-    def __init__(self, *args, **kwargs):
+    def __init__(self, *args, repair: bool = True, resolver: TypeResolver | None = None, **kwargs):
         json.JSONDecoder.__init__(self, object_hook=self.object_hook, *args, **kwargs)
 
+        # Try to fix malformed JSON (see repair.py) before giving up on it
+        self.repair = repair
+
+        # Works out misspelled and aliased types (see resolver.py). The shared
+        # one remembers every spelling it has seen.
+        self.resolver = resolver if resolver is not None else default_resolver()
+
     def decode(self, s, **kwargs):
         """
         Decode JSON from a string.
@@ -54,14 +63,41 @@ class WorkoutDecoder(json.JSONDecoder):
         This function is a wrapper around the usual decode function because we
         want to perform some post-processing steps.
         """
+        (workout, _) = self.decode_with_repairs(s, **kwargs)
+        return workout
+
+    def decode_with_repairs(self, s, **kwargs) -> Tuple[Workout, List[str]]:
+        """
+        Same as decode, but also returns the names of the repairs that were
+        needed to make s decode. Well-formed JSON never goes through the
+        repair stage, so the list is empty for it.
+        """
+
+        (obj, repairs) = self.parse(s, super().decode, **kwargs)
+        return (self.as_workout(obj), repairs)
+
+    def parse(self, s, decode, **kwargs) -> Tuple[object, List[str]]:
+        """Run decode on s, repairing s first if it isn't valid JSON"""
 
         # Just in case...  The LLM sometimes generates this since the template
         # uses the backticks to indicate code.
         s = s.strip('```') 
 
         # Decode the JSON string as usual
-        obj = super().decode(s, **kwargs)
-
+        repairs = []
+        try:
+            obj = decode(s, **kwargs)
+        except json.JSONDecodeError:
+            if not self.repair:
+                raise
+            (repaired, repairs) = repair_json(s)
+            if len(repairs) == 0:
+                raise
+            obj = decode(repaired, **kwargs)
+        return (obj, repairs)
+
+    @staticmethod
+    def as_workout(obj) -> Workout:
         # Obj *should* be a list, but in case it's not...
         if isinstance(obj, Workout):
             return obj
@@ -75,29 +111,28 @@ class WorkoutDecoder(json.JSONDecoder):
 
         if KEYS.TYPE not in data:
             return data
+
+        # Well-formed JSON skips repair_json, so the aliased keys are handled
+        # here too. The real key wins if both are present.
+        for (alias, key) in KEY_ALIASES.items():
+            if alias in data:
+                value = data.pop(alias)
+                data.setdefault(key, value)
         
         step_type = get_type_from_dict(data)
-        
-        # Otherwise... process the data as something else
-        if step_type == TYPES.WORKOUT:
-            return self.decode_workout(data)
-        if step_type == TYPES.REPETITION:
-            return self.decode_repetition(data)
-        elif step_type in TYPES.WORKOUT_STEPS.keys():
-            return self.decode_step(step_type, data)
-            #return WorkoutStep.from_dict(data)
-        elif step_type in TYPES.STEP_GOALS.keys():
-            return self.decode_goal(step_type, data)
-        else:
-            # Run the more expensive fuzzy match step
-            if fuzz.ratio(step_type, TYPES.REPETITION) >= DEFAULT_SCORE_THRESHOLD:
-                #data[KEYS.TYPE] = TYPES.REPETITION  # Overwrite so that the dictionary matches
+
+        # Exact types first, then the fuzzy matches
+        resolved = self.resolver.resolve(step_type)
+        if resolved is not None:
+            (kind, resolved_type) = resolved
+            if kind == TYPES.WORKOUT:
+                return self.decode_workout(data)
+            if kind == TYPES.REPETITION:
                 return self.decode_repetition(data)
-            elif (extracted := selectFuzzyMatch(step_type, TYPES.WORKOUT_STEPS.keys())) is not None:
-                #data[KEYS.TYPE] = extracted[0] # Overwrite so that the dictionary matches
-                return self.decode_step(extracted[0], data)
-            elif (extracted := selectFuzzyMatch(step_type, TYPES.STEP_GOALS.keys())) is not None:
-                return self.decode_goal(extracted[0], data)
+            elif kind == STEP:
+                return self.decode_step(resolved_type, data)
+            elif kind == GOAL:
+                return self.decode_goal(resolved_type, data)
         
         raise InvalidStepTypeError(step_type)
 
@@ -246,6 +281,104 @@ class WorkoutDecoder(json.JSONDecoder):
         # return data
     
 
+class WorkoutEncoder(json.JSONEncoder):
+    """
+    Encode workouts into the same JSON format the LLM is asked to produce, so
+    the output can be read back with WorkoutDecoder. Keys with None values are
+    omitted.
+    """
+
+    _STEP_TYPES = {
+        RunWorkoutStep: TYPES.RUN,
+        RecoverWorkoutStep: TYPES.RECOVER,
+        RestWorkoutStep: TYPES.REST,
+        WarmUpWorkoutStep: TYPES.WARM_UP,
+        CoolDownWorkoutStep: TYPES.COOL_DOWN,
+    }
+
+    _GOAL_TYPES = {
+        SpeedGoal: TYPES.SPEED,
+        HeartRateGoal: TYPES.HEART_RATE,
+        HeartRateZoneGoal: TYPES.HEART_RATE_ZONE,
+        CadenceGoal: TYPES.CADENCE,
+        PowerGoal: TYPES.POWER,
+        LapTimeGoal: TYPES.LAP_TIME,
+    }
+
+    def default(self, o):
+        if isinstance(o, Workout):
+            return self.encode_workout(o)
+        if isinstance(o, RepetitionStep):
+            return self.encode_repetition(o)
+        if isinstance(o, WorkoutStep):
+            return self.encode_step(o)
+        if isinstance(o, AbstractWorkoutStepGoal):
+            return self.encode_goal(o)
+        return super().default(o)
+
+    def encode_workout(self, workout: Workout) -> dict:
+        return self._without_none({
+            KEYS.TYPE: TYPES.WORKOUT,
+            KEYS.NAME: workout.name,
+            KEYS.STEPS: workout.steps,
+            KEYS.NOTES: workout.notes,
+        })
+
+    def encode_repetition(self, step: RepetitionStep) -> dict:
+        return self._without_none({
+            KEYS.TYPE: TYPES.REPETITION,
+            KEYS.VALUE: step.value,
+            KEYS.MINIMUM: step.minimum,
+            KEYS.MAXIMUM: step.maximum,
+            KEYS.STEPS: step.steps,
+            KEYS.NOTES: step.notes,
+            KEYS.GOALS: self._goal_list(step.goals),
+        })
+
+    def encode_step(self, step: WorkoutStep) -> dict:
+        step_type = self._STEP_TYPES.get(type(step))
+        if step_type is None:
+            raise InvalidStepTypeError(type(step).__name__)
+
+        return self._without_none({
+            KEYS.TYPE: step_type,
+            KEYS.VALUE: step.value,
+            KEYS.MINIMUM: step.minimum,
+            KEYS.MAXIMUM: step.maximum,
+            KEYS.UNIT: step.unit,
+            KEYS.NOTES: step.notes,
+            KEYS.GOALS: self._goal_list(step.goals),
+        })
+
+    def encode_goal(self, goal: AbstractWorkoutStepGoal) -> dict:
+        goal_type = self._GOAL_TYPES.get(type(goal))
+        if goal_type is None:
+            raise InvalidGoalTypeError(type(goal).__name__)
+
+        return self._without_none({
+            KEYS.TYPE: goal_type,
+            KEYS.VALUE: goal.value,
+            KEYS.MINIMUM: goal.minimum,
+            KEYS.MAXIMUM: goal.maximum,
+        })
+
+    def _goal_list(self, goals: WorkoutStepGoals | None) -> List[AbstractWorkoutStepGoal] | None:
+        if goals is None:
+            return None
+
+        result = [
+            goal for goal in (goals.cadence, goals.heart_rate, goals.heart_rate_zone, goals.lap_time, goals.power, goals.speed)
+            if goal is not None and not goal.is_empty
+        ]
+        if len(result) > 0:
+            return result
+        return None
+
+    @staticmethod
+    def _without_none(data: dict) -> dict:
+        return {key: value for (key, value) in data.items() if value is not None}
+
+
 # # Move this to encode / decode! 
 # def to_dict(self):
 #     data = { KEYS.TYPE: goal_type }
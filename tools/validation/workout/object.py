@@ -5,10 +5,22 @@ import uuid
 class WorkoutObject(object):
     """
     This is the base class for all workout objects: steps, goals, etc.
+
+    All of them use __slots__, since tens of thousands can be held at once.
+    The uuid is only made the first time something asks for it.
     """
 
-    def __init__(self):
-        self.uuid = uuid.uuid4().hex.upper()
+    __slots__ = ('_uuid',)
+
+    @property
+    def uuid(self) -> str:
+        try:
+            return self._uuid
+        except AttributeError:
+            # object.__setattr__, because the shared empty goals refuse
+            # everything else
+            object.__setattr__(self, '_uuid', uuid.uuid4().hex.upper())
+            return self._uuid
 
     # Override this to provide some customization.
     def to_str(self, depth: int = 0) -> str:
@@ -0,0 +1,189 @@
+import re
+
+from typing import List, Tuple
+
+from .constants import keys as KEYS
+
+
+# Names of the repairs, as reported by repair_json
+EXTRACTED_BLOCK = 'extracted_block'
+REMOVED_TRAILING_COMMAS = 'removed_trailing_commas'
+BALANCED_BRACKETS = 'balanced_brackets'
+CLOSED_STRING = 'closed_string'
+NORMALIZED_KEYS = 'normalized_keys'
+
+# Keys the LLM likes to use instead of the ones in the prompt. The decoder
+# already accepts "min" and "max", so those are left alone.
+KEY_ALIASES = {
+    'units': KEYS.UNIT,
+    'target': KEYS.VALUE,
+    'note': KEYS.NOTES,
+    'goal': KEYS.GOALS,
+    'title': KEYS.NAME,
+}
+
+_CLOSERS = {'{': '}', '[': ']'}
+
+# A key (with or without its colon) that was cut off before its value
+_DANGLING_KEY = re.compile(r'([{,])\s*"(?:[^"\\]|\\.)*"\s*:?\s*$')
+
+# An array only starts the block if it holds objects or strings, so that
+# prose such as "[1] means step one" before the object is skipped
+_ARRAY_START = re.compile(r'\[\s*[{"]')
+
+
+def repair_json(text: str) -> Tuple[str, List[str]]:
+    """
+    Fix the defects LLMs commonly introduce into JSON output.
+
+    The outermost JSON object or array is extracted from any surrounding
+    prose or code fences, trailing commas are dropped, key aliases such as
+    "units" are renamed, and truncated output is closed off. Strings are
+    never modified. Returns the repaired text and the names of the repairs
+    that were applied, in the order above. Valid JSON without aliases comes
+    back unchanged with no repairs.
+    """
+    repairs = []
+
+    start = _find_start(text)
+    if start is None:
+        return (text, repairs)
+    if len(text[:start].strip().strip('`').strip()) > 0:
+        repairs.append(EXTRACTED_BLOCK)
+
+    output = []
+    stack = []
+    in_string = False
+    escape = False
+    string_start = 0
+    end = len(text)
+
+    position = start
+    while position < len(text):
+        character = text[position]
+
+        if in_string:
+            output.append(character)
+            if escape:
+                escape = False
+            elif character == '\\':
+                escape = True
+            elif character == '"':
+                in_string = False
+                _normalize_key(text, position, string_start, stack, output, repairs)
+            position += 1
+            continue
+
+        if character == '"':
+            in_string = True
+            string_start = len(output)
+            output.append(character)
+        elif character in _CLOSERS:
+            stack.append(character)
+            output.append(character)
+        elif character in '}]':
+            if len(stack) == 0:
+                end = position
+                break
+
+            if _CLOSERS[stack[-1]] != character:
+                if _matches_deeper(stack, character):
+                    # Close whatever was left open inside, e.g. a missing ']'
+                    while _CLOSERS[stack[-1]] != character:
+                        _drop_trailing_comma(output, repairs)
+                        output.append(_CLOSERS[stack.pop()])
+                    _add_repair(repairs, BALANCED_BRACKETS)
+                else:
+                    # A stray closer. Drop it.
+                    _add_repair(repairs, BALANCED_BRACKETS)
+                    position += 1
+                    continue
+
+            _drop_trailing_comma(output, repairs)
+            stack.pop()
+            output.append(character)
+            if len(stack) == 0:
+                end = position + 1
+                break
+        else:
+            output.append(character)
+        position += 1
+
+    if end < len(text) and len(text[end:].strip().strip('`').strip()) > 0:
+        _add_repair(repairs, EXTRACTED_BLOCK)
+
+    # The output was cut off. Close it up.
+    if in_string:
+        if escape:
+            output.pop()
+        output.append('"')
+        _add_repair(repairs, CLOSED_STRING)
+
+    if len(stack) > 0:
+        repaired = ''.join(output).rstrip()
+        while True:
+            trimmed = repaired.rstrip().rstrip(',').rstrip()
+            if stack[-1] == '{' and (match := _DANGLING_KEY.search(trimmed)) is not None:
+                trimmed = trimmed[:match.start()] + (match.group(1) if match.group(1) == '{' else '')
+            if trimmed == repaired:
+                break
+            repaired = trimmed
+        repaired = re.sub(r':\s*$', ': null', repaired)
+        output = [repaired]
+        while len(stack) > 0:
+            output.append(_CLOSERS[stack.pop()])
+        _add_repair(repairs, BALANCED_BRACKETS)
+
+    # Report in a stable order
+    order = [EXTRACTED_BLOCK, REMOVED_TRAILING_COMMAS, NORMALIZED_KEYS, CLOSED_STRING, BALANCED_BRACKETS]
+    repairs = sorted(set(repairs), key=order.index)
+    if len(repairs) == 0:
+        return (text, repairs)
+    return (''.join(output), repairs)
+
+
+def _find_start(text: str) -> int | None:
+    object_start = text.find('{')
+    array = _ARRAY_START.search(text)
+    if array is not None and (object_start < 0 or array.start() < object_start):
+        return array.start()
+    return object_start if object_start >= 0 else None
+
+
+def _add_repair(repairs: List[str], repair: str):
+    if repair not in repairs:
+        repairs.append(repair)
+
+
+def _matches_deeper(stack: List[str], character: str) -> bool:
+    opener = '{' if character == '}' else '['
+    return opener in stack
+
+
+def _drop_trailing_comma(output: List[str], repairs: List[str]):
+    """Remove a comma (and the whitespace after it) right before a closer"""
+    index = len(output) - 1
+    while index >= 0 and output[index].isspace():
+        index -= 1
+    if index >= 0 and output[index] == ',':
+        del output[index]
+        _add_repair(repairs, REMOVED_TRAILING_COMMAS)
+
+
+def _normalize_key(text: str, position: int, string_start: int, stack: List[str], output: List[str], repairs: List[str]):
+    """Rename the string that just closed if it is an aliased object key"""
+    if len(stack) == 0 or stack[-1] != '{':
+        return
+
+    # It is only a key when a colon follows
+    following = position + 1
+    while following < len(text) and text[following].isspace():
+        following += 1
+    if following >= len(text) or text[following] != ':':
+        return
+
+    key = ''.join(output[string_start + 1:-1])
+    alias = KEY_ALIASES.get(key)
+    if alias is not None:
+        output[string_start:] = list(f'"{alias}"')
+        _add_repair(repairs, NORMALIZED_KEYS)
@@ -0,0 +1,215 @@
+import threading
+
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from .constants import types as TYPES
+from .exceptions import InvalidGoalTypeError, InvalidStepTypeError
+
+
+DEFAULT_SCORE_THRESHOLD = 77
+
+# How many spellings the resolver remembers
+MEMO_SIZE = 1024
+
+# What a type resolves to, besides the workout and repetition types
+STEP = 'step'
+GOAL = 'goal'
+
+
+# thefuzz's ascii_only
+_NON_ASCII = {i: None for i in range(128, 256)}
+
+
+def _process_query(text: str) -> str:
+    """
+    The form thefuzz's extractOne compares a spelling in: its own processor
+    and then the one it hands rapidfuzz, which drops non-ASCII characters
+    """
+    from rapidfuzz.utils import default_process
+    return default_process(default_process(text).translate(_NON_ASCII))
+
+
+def _process_choice(text: str) -> str:
+    from rapidfuzz.utils import default_process
+    return default_process(text.translate(_NON_ASCII))
+
+
+class _AliasTable(object):
+    """
+    One alias table (step or goal types) with its indexes.
+
+    The aliases keep their order, since the first of two equally good fuzzy
+    matches wins. The normalized index finds the alias a fuzzy match would
+    score 100 without scoring anything. The character index skips aliases
+    that share no character at all with the spelling: every score thefuzz
+    combines in WRatio is then 0, so they could never pass the threshold.
+    (Longer n-grams would prune more, but partial and token-set scores can
+    pass without sharing any of them, so the results could change.)
+    """
+
+    def __init__(self, aliases: Dict[str, str]):
+        from rapidfuzz import fuzz, process
+        self._extract_one = process.extractOne
+        self._scorer = fuzz.WRatio
+
+        self.aliases = aliases
+        self.keys = list(aliases.keys())
+        self.processed = [_process_choice(key) for key in self.keys]
+
+        self.normalized = {}
+        for (key, processed) in zip(self.keys, self.processed):
+            self.normalized.setdefault(processed, key)
+
+        self.characters: Dict[str, int] = {}
+        for (index, processed) in enumerate(self.processed):
+            for character in set(processed):
+                self.characters[character] = self.characters.get(character, 0) | (1 << index)
+
+    def candidates(self, processed: str) -> List[int]:
+        mask = 0
+        for character in set(processed):
+            mask |= self.characters.get(character, 0)
+        return [index for index in range(len(self.keys)) if mask & (1 << index)]
+
+    def match(self, processed: str, score_cutoff: int) -> str | None:
+        """The alias process.extractOne would pick, or None"""
+        if len(processed) == 0:
+            return None
+
+        key = self.normalized.get(processed)
+        if key is not None:
+            return key
+
+        candidates = self.candidates(processed)
+        extracted = self._extract_one(
+            processed,
+            [self.processed[index] for index in candidates],
+            scorer=self._scorer,
+            processor=None,
+            score_cutoff=score_cutoff,
+        )
+        if extracted is None:
+            return None
+        return self.keys[candidates[extracted[2]]]
+
+
+class TypeResolver(object):
+    """
+    Works out what the "type" of a decoded object means.
+
+    Resolves exactly as WorkoutDecoder always has: the exact (lowercased)
+    types first, then a fuzzy match against "repetition", the step aliases
+    and the goal aliases in that order, each with the same threshold. The
+    aliases are indexed up front and the answers are remembered, so noisy
+    output that repeats a misspelling only pays for it once.
+
+    Deployments can add their own aliases, e.g. {'strides': 'run'}. They
+    must map onto one of the valid step or goal types.
+    """
+
+    def __init__(
+        self,
+        step_aliases: Dict[str, str] | None = None,
+        goal_aliases: Dict[str, str] | None = None,
+        score_cutoff: int = DEFAULT_SCORE_THRESHOLD,
+        memo_size: int = MEMO_SIZE,
+    ):
+        self.score_cutoff = score_cutoff
+        self.memo_size = memo_size
+
+        steps = dict(TYPES.WORKOUT_STEPS)
+        for (alias, step_type) in (step_aliases or {}).items():
+            if step_type not in TYPES.VALID_STEPS or step_type == TYPES.REPETITION:
+                raise InvalidStepTypeError(step_type)
+            steps.setdefault(alias.lower(), step_type)
+
+        goals = dict(TYPES.STEP_GOALS)
+        for (alias, goal_type) in (goal_aliases or {}).items():
+            if goal_type not in TYPES.VALID_STEP_GOALS:
+                raise InvalidGoalTypeError(goal_type)
+            goals.setdefault(alias.lower(), goal_type)
+
+        # The tables are built on the first fuzzy match, since they need
+        # rapidfuzz
+        self._aliases = (steps, goals)
+        self._tables = None
+        self._ratio = None
+        self._memo = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def steps(self) -> Dict[str, str]:
+        return self._aliases[0]
+
+    @property
+    def goals(self) -> Dict[str, str]:
+        return self._aliases[1]
+
+    def resolve(self, value: str) -> Tuple[str, str] | None:
+        """
+        What value names, as (kind, type): kind is TYPES.WORKOUT,
+        TYPES.REPETITION, STEP or GOAL, and type is the valid type it stands
+        for. None if it doesn't name anything.
+        """
+        value = value.lower()
+        if value == TYPES.WORKOUT:
+            return (TYPES.WORKOUT, TYPES.WORKOUT)
+        if value == TYPES.REPETITION:
+            return (TYPES.REPETITION, TYPES.REPETITION)
+        if value in self.steps:
+            return (STEP, self.steps[value])
+        if value in self.goals:
+            return (GOAL, self.goals[value])
+
+        with self._lock:
+            if value in self._memo:
+                self._memo.move_to_end(value)
+                return self._memo[value]
+
+        resolved = self._resolve_fuzzy(value)
+
+        with self._lock:
+            self._memo[value] = resolved
+            while len(self._memo) > self.memo_size:
+                self._memo.popitem(last=False)
+        return resolved
+
+    def _resolve_fuzzy(self, value: str) -> Tuple[str, str] | None:
+        (steps, goals) = self._get_tables()
+
+        # thefuzz's ratio, which doesn't process the strings but rounds
+        if int(round(self._ratio(value, TYPES.REPETITION))) >= self.score_cutoff:
+            return (TYPES.REPETITION, TYPES.REPETITION)
+
+        processed = _process_query(value)
+        if (key := steps.match(processed, self.score_cutoff)) is not None:
+            return (STEP, steps.aliases[key])
+        if (key := goals.match(processed, self.score_cutoff)) is not None:
+            return (GOAL, goals.aliases[key])
+        return None
+
+    def _get_tables(self) -> Tuple[_AliasTable, _AliasTable]:
+        with self._lock:
+            if self._tables is None:
+                from rapidfuzz import fuzz
+                self._ratio = fuzz.ratio
+                self._tables = tuple(_AliasTable(aliases) for aliases in self._aliases)
+            return self._tables
+
+    def cache_info(self) -> Dict[str, int]:
+        with self._lock:
+            return {'size': len(self._memo), 'max_size': self.memo_size}
+
+
+_default = None
+_default_lock = threading.Lock()
+
+
+def default_resolver() -> TypeResolver:
+    """The resolver decoders share unless they're given another one"""
+    global _default
+    with _default_lock:
+        if _default is None:
+            _default = TypeResolver()
+        return _default
@@ -0,0 +1,589 @@
+import re
+
+from typing import List, Tuple
+
+from .steps import AbstractWorkoutStep, CoolDownWorkoutStep, RecoverWorkoutStep, RepetitionStep, RestWorkoutStep, RunWorkoutStep, WarmUpWorkoutStep
+from .workout import Workout
+
+
+# These mirror the abbreviations described in the extraction prompt
+PACES = {
+    'e': 'easy pace',
+    'easy': 'easy pace',
+    'l': 'long run pace',
+    'i': 'interval pace',
+    'r': 'repetition pace',
+    't': 'tempo pace',
+    'tempo': 'tempo pace',
+    'st': 'stride',
+    'stride': 'stride',
+    'strides': 'stride',
+    'mp': 'marathon pace',
+    'hmp': 'half marathon pace',
+}
+
+LABELS = {
+    'wu': WarmUpWorkoutStep,
+    'w/u': WarmUpWorkoutStep,
+    'warmup': WarmUpWorkoutStep,
+    'warm-up': WarmUpWorkoutStep,
+    'cd': CoolDownWorkoutStep,
+    'c/d': CoolDownWorkoutStep,
+    'cooldown': CoolDownWorkoutStep,
+    'cool-down': CoolDownWorkoutStep,
+    'rest': RestWorkoutStep,
+    'recover': RecoverWorkoutStep,
+    'recovery': RecoverWorkoutStep,
+}
+
+# (unit, multiplier)
+UNITS = {
+    'm': ('meters', 1),
+    'meter': ('meters', 1),
+    'meters': ('meters', 1),
+    'metre': ('meters', 1),
+    'metres': ('meters', 1),
+    'k': ('meters', 1000),
+    'km': ('meters', 1000),
+    'mi': ('miles', 1),
+    'mile': ('miles', 1),
+    'miles': ('miles', 1),
+    's': ('seconds', 1),
+    'sec': ('seconds', 1),
+    'secs': ('seconds', 1),
+    'second': ('seconds', 1),
+    'seconds': ('seconds', 1),
+    'min': ('seconds', 60),
+    'mins': ('seconds', 60),
+    'minute': ('seconds', 60),
+    'minutes': ('seconds', 60),
+    'h': ('seconds', 3600),
+    'hr': ('seconds', 3600),
+    'hrs': ('seconds', 3600),
+    'hour': ('seconds', 3600),
+    'hours': ('seconds', 3600),
+}
+
+METERS_PER_MILE = 1609.344
+
+# Recovery kinds that may follow "w/" or "with". On their own, as in
+# "200m jg", they are recovery steps too.
+RECOVERIES = {
+    'jg': (RecoverWorkoutStep, 'jog'),
+    'jog': (RecoverWorkoutStep, 'jog'),
+    'jogging': (RecoverWorkoutStep, 'jog'),
+    'walk': (RecoverWorkoutStep, 'walk'),
+    'float': (RecoverWorkoutStep, 'float'),
+    'recovery': (RecoverWorkoutStep, None),
+    'rec': (RecoverWorkoutStep, None),
+    'rest': (RestWorkoutStep, None),
+}
+
+# Distances that name a race pace, as in "10k pace", "5k/10k pace" or "at mile pace"
+RACE_DISTANCES = {'k', 'km', 'mi', 'mile'}
+
+# Words that carry no information of their own
+FILLERS = {'pace', 'at', '@', 'of', 'recoveries', 'between', 'reps', 'run'}
+
+# These introduce a target time, as in "6x1k @ 3:30" or "4 miles at 7:00 pace"
+TARGETS = {'at', '@'}
+
+SEPARATORS = {'+', ',', ';', 'then', 'and', '.'}
+TIMES = {'x', '×', '*', 'by', 'times'}
+WITH = {'w/', 'with', '/'}
+
+# Unitless quantities: small numbers are miles ("2 E"), large numbers are track
+# distances in meters ("4 x 400 R").
+METERS_THRESHOLD = 100
+MAXIMUM_LADDER_STEPS = 50
+
+# Confidence multiplier for a quantity whose unit had to be guessed without a
+# pace or label to back it up
+UNIT_GUESS_PENALTY = 0.8
+
+# Confidence multiplier for a step without any quantity ("E", "w/ jog"),
+# which is enough to send the input to the LLM. A bare warm-up or cool-down
+# ("cd") is fine, since the prompt leaves its value empty too, unless nothing
+# in the workout has a quantity.
+MISSING_QUANTITY_PENALTY = 0.5
+
+# Confidence multiplier for two items without a separator between them, as
+# in "6x1k 3:30". The second one is more likely part of the first.
+MISSING_SEPARATOR_PENALTY = 0.5
+
+_TOKEN = re.compile(
+    r'\s*(?:'
+    r'(?P<time>\d+:\d{2})'
+    r'|(?P<number>\d+(?:\.\d+)?|\.\d+)'
+    r'|(?P<word>w/u|c/d|w/|warm[- ]?up|cool[- ]?down|[a-z]+)'
+    r'|(?P<symbol>[-+,;()×*@/.])'
+    r')'
+)
+
+
+class _Token(object):
+
+    def __init__(self, kind: str, text: str, value=None):
+        self.kind = kind
+        self.text = text
+        self.value = value
+
+    def __repr__(self) -> str:
+        return f"{self.kind}:{self.text}"
+
+
+class _Quantity(object):
+
+    def __init__(self, value=None, minimum=None, maximum=None, unit: str | None = None):
+        self.value = value
+        self.minimum = minimum
+        self.maximum = maximum
+        self.unit = unit
+
+
+class ShorthandParseError(ValueError):
+    pass
+
+
+def tokenize(text: str) -> List[_Token]:
+    """Split the shorthand into tokens. Unknown characters are skipped."""
+    tokens = []
+    text = text.lower()
+    position = 0
+    while position < len(text):
+        match = _TOKEN.match(text, position)
+        if match is None or match.end() == position:
+            # Not part of the grammar. Count it against the confidence.
+            if not text[position].isspace():
+                tokens.append(_Token('unknown', text[position]))
+            position += 1
+            continue
+
+        position = match.end()
+        if match.group('time') is not None:
+            (minutes, seconds) = match.group('time').split(':')
+            tokens.append(_Token('time', match.group('time'), int(minutes) * 60 + int(seconds)))
+        elif match.group('number') is not None:
+            number = float(match.group('number'))
+            if number.is_integer():
+                number = int(number)
+            tokens.append(_Token('number', match.group('number'), number))
+        elif match.group('word') is not None:
+            word = match.group('word').replace(' ', '-')
+            tokens.append(_Token('word', word))
+        else:
+            tokens.append(_Token('symbol', match.group('symbol')))
+    return tokens
+
+
+def _normalized(number):
+    if isinstance(number, float) and number.is_integer():
+        return int(number)
+    return number
+
+
+class ShorthandParser(object):
+    """
+    A deterministic parser for the coach shorthand described in the extraction
+    prompt, such as "2 E + 6x1k I w/ 2:00 JG + 2 E" or "3 mi wu, 4 x 400 R, cd".
+
+    parse returns the workout along with a confidence between 0 and 1. The
+    confidence is the share of the input the grammar understood, reduced for
+    every unit that had to be guessed and more for every step without a
+    quantity or item without a separator. Anything the grammar does not know
+    lowers the confidence, so callers can hand those inputs to the LLM.
+
+    The parser keeps no state between calls and is safe to share.
+    """
+
+    def parse(self, text: str) -> Tuple[Workout | None, float]:
+        tokens = tokenize(text)
+        if len(tokens) == 0:
+            return (None, 0.0)
+
+        parser = _Parser(tokens)
+        steps = parser._parse_sequence(closing=None)
+        if len(steps) == 0:
+            return (None, 0.0)
+
+        total = sum(len(x.text) for x in tokens)
+        confidence = (total - parser._skipped) / total * parser._penalty
+        if parser._quantities == 0:
+            confidence *= MISSING_QUANTITY_PENALTY
+        return (Workout(steps=steps), confidence)
+
+
+class _Parser(object):
+    """Recursive descent over the tokens of a single input"""
+
+    def __init__(self, tokens: List[_Token]):
+        self._tokens = tokens
+        self._position = 0
+        self._skipped = 0
+        self._penalty = 1.0
+        self._quantities = 0
+
+    # ------------------------------
+    # TOKEN HELPERS
+    # ------------------------------
+
+    def _peek(self, offset: int = 0) -> _Token | None:
+        index = self._position + offset
+        if index < len(self._tokens):
+            return self._tokens[index]
+        return None
+
+    def _peek_text(self, offset: int = 0) -> str | None:
+        token = self._peek(offset)
+        return token.text if token is not None else None
+
+    def _next(self) -> _Token:
+        token = self._tokens[self._position]
+        self._position += 1
+        return token
+
+    def _skip_fillers(self):
+        while self._peek_text() in FILLERS:
+            self._position += 1
+
+    # ------------------------------
+    # GRAMMAR
+    # ------------------------------
+
+    def _parse_sequence(self, closing: str | None) -> List[AbstractWorkoutStep]:
+        """sequence := item (separator item)*"""
+        steps = []
+        separated = True
+        while self._peek() is not None and self._peek_text() != closing:
+            if self._peek_text() in SEPARATORS:
+                self._position += 1
+                separated = True
+                continue
+
+            if not separated:
+                self._penalty *= MISSING_SEPARATOR_PENALTY
+            separated = False
+
+            start = self._position
+            try:
+                steps.extend(self._parse_item())
+            except ShorthandParseError:
+                # Throw away everything up to the next separator
+                self._position = start
+                while self._peek() is not None and self._peek_text() not in SEPARATORS and self._peek_text() != closing:
+                    self._skipped += len(self._next().text)
+        return steps
+
+    def _parse_item(self) -> List[AbstractWorkoutStep]:
+        """item := ladder | pyramid | repetition | interval"""
+        if self._peek_text() == 'ladder' or (self._peek_text() in ('descending', 'ascending') and self._peek_text(1) == 'ladder'):
+            return self._parse_ladder()
+
+        if self._peek() is not None and self._peek().kind == 'number':
+            pyramid = self._parse_pyramid()
+            if pyramid is not None:
+                return pyramid
+
+            repetition = self._parse_repetition()
+            if repetition is not None:
+                return repetition
+
+        return self._parse_interval()
+
+    def _parse_repetition(self) -> List[AbstractWorkoutStep] | None:
+        """repetition := count ('x' | 'by') body"""
+        start = self._position
+        (value, minimum, maximum) = self._parse_count()
+        if self._peek_text() not in TIMES:
+            self._position = start
+            return None
+        self._position += 1
+
+        if self._peek_text() == '(':
+            self._position += 1
+            steps = self._parse_sequence(closing=')')
+            if self._peek_text() != ')':
+                raise ShorthandParseError('Unbalanced parenthesis')
+            self._position += 1
+            if len(steps) == 0:
+                raise ShorthandParseError('Empty repetition')
+        else:
+            steps = self._parse_interval()
+
+        steps.extend(self._parse_recovery())
+
+        # A single repetition is just the steps themselves
+        if value == 1 and minimum is None and maximum is None:
+            return steps
+        return [RepetitionStep(value=value, minimum=minimum, maximum=maximum, steps=steps)]
+
+    def _parse_count(self) -> Tuple[int | None, int | None, int | None]:
+        """count := number | number ('-' | 'to') number"""
+        first = self._next().value
+        if self._peek_text() in ('-', 'to') and self._peek(1) is not None and self._peek(1).kind == 'number':
+            self._position += 1
+            second = self._next().value
+            return (None, min(first, second), max(first, second))
+        return (first, None, None)
+
+    def _parse_pyramid(self) -> List[AbstractWorkoutStep] | None:
+        """pyramid := number ('-' number){2,} unit?  e.g. 400-800-1200-800-400"""
+        numbers = [self._peek().value]
+        offset = 1
+        while self._peek_text(offset) == '-' and self._peek(offset + 1) is not None and self._peek(offset + 1).kind == 'number':
+            numbers.append(self._peek(offset + 1).value)
+            offset += 2
+
+        if len(numbers) < 3:
+            return None
+
+        self._position += offset
+        self._quantities += 1
+        quantities = [self._finish_quantity(_Quantity(value=x)) for x in numbers]
+        notes = self._parse_notes()
+        return [RunWorkoutStep(value=x.value, unit=x.unit, notes=notes) for x in quantities]
+
+    def _parse_ladder(self) -> List[AbstractWorkoutStep]:
+        """ladder := 'ladder' 'from' quantity 'to' quantity ('by' | 'x') quantity"""
+        if self._peek_text() in ('descending', 'ascending'):
+            self._position += 1
+        self._position += 1
+
+        if self._peek_text() == 'from':
+            self._position += 1
+        start = self._parse_quantity(allow_range=False)
+        if self._peek_text() != 'to':
+            raise ShorthandParseError('Expected "to" in ladder')
+        self._position += 1
+        stop = self._parse_quantity(allow_range=False)
+        if self._peek_text() not in ('by', 'x', '×'):
+            raise ShorthandParseError('Expected a step size in ladder')
+        self._position += 1
+        size = self._parse_quantity(allow_range=False)
+
+        quantities = (start, stop, size)
+        if any(x.value is None for x in quantities):
+            raise ShorthandParseError('Ladders need fixed values')
+
+        # The whole ladder shares one unit, guessed from the longest rung
+        unit = start.unit or stop.unit or size.unit
+        if unit is None:
+            unit = self._finish_quantity(_Quantity(value=max(start.value, stop.value))).unit
+        for quantity in quantities:
+            if quantity.unit is None:
+                quantity.unit = unit
+
+        if len({x.unit for x in quantities}) != 1 or size.value <= 0:
+            raise ShorthandParseError('Inconsistent ladder')
+
+        direction = 1 if stop.value >= start.value else -1
+        count = int(abs(stop.value - start.value) // size.value) + 1
+        if count > MAXIMUM_LADDER_STEPS:
+            raise ShorthandParseError('Ladder is too long')
+
+        self._quantities += 1
+        notes = self._parse_notes()
+        return [
+            RunWorkoutStep(value=_normalized(start.value + direction * i * size.value), unit=start.unit, notes=notes)
+            for i in range(count)
+        ]
+
+    def _parse_interval(self) -> List[AbstractWorkoutStep]:
+        """interval := any order of quantity, pace, label and target, followed by an optional recovery"""
+        quantity = None
+        pace = None
+        label = None
+        target = None
+
+        while True:
+            if pace is None:
+                pace = self._parse_race_pace()
+                if pace is not None:
+                    continue
+
+            if target is None and quantity is not None:
+                target = self._parse_target()
+                if target is not None:
+                    continue
+
+            self._skip_fillers()
+            token = self._peek()
+            if token is None:
+                break
+
+            if token.kind in ('number', 'time') and quantity is None:
+                quantity = self._parse_quantity()
+            elif token.text in PACES and pace is None:
+                self._position += 1
+                pace = PACES[token.text]
+            elif token.text in LABELS and label is None:
+                self._position += 1
+                label = LABELS[token.text]
+            elif token.text in RECOVERIES and label is None and pace is None:
+                # "200m jg" is a recovery, the same as "w/ 200m jg"
+                self._position += 1
+                (label, pace) = RECOVERIES[token.text]
+            else:
+                break
+
+        if quantity is None and pace is None and label is None:
+            raise ShorthandParseError(f'Unexpected {self._peek()}')
+
+        if quantity is None:
+            if label not in (WarmUpWorkoutStep, CoolDownWorkoutStep):
+                self._penalty *= MISSING_QUANTITY_PENALTY
+            quantity = _Quantity()
+        else:
+            self._quantities += 1
+            if quantity.unit is None and pace is None and label is None:
+                self._penalty *= UNIT_GUESS_PENALTY
+            self._finish_quantity(quantity, default_miles=pace is not None)
+
+        step_type = label or RunWorkoutStep
+        notes = ', '.join(x for x in (pace, target) if x is not None) or None
+        steps = [step_type(value=quantity.value, minimum=quantity.minimum, maximum=quantity.maximum, unit=quantity.unit, notes=notes)]
+        steps.extend(self._parse_recovery())
+        return steps
+
+    def _parse_recovery(self) -> List[AbstractWorkoutStep]:
+        """recovery := ('w/' | 'with' | '/') quantity? kind"""
+        if self._peek_text() not in WITH:
+            return []
+        self._position += 1
+
+        quantity = None
+        token = self._peek()
+        if token is not None and token.kind in ('number', 'time'):
+            quantity = self._parse_quantity()
+            self._finish_quantity(quantity)
+
+        kind = self._peek_text()
+        if kind not in RECOVERIES:
+            raise ShorthandParseError(f'Unknown recovery {kind}')
+        self._position += 1
+        if self._peek_text() in ('recovery', 'recoveries'):
+            self._position += 1
+
+        (step_type, notes) = RECOVERIES[kind]
+        if quantity is None:
+            self._penalty *= MISSING_QUANTITY_PENALTY
+            quantity = _Quantity()
+        else:
+            self._quantities += 1
+        return [step_type(value=quantity.value, minimum=quantity.minimum, maximum=quantity.maximum, unit=quantity.unit, notes=notes)]
+
+    def _parse_quantity(self, allow_range: bool = True) -> _Quantity:
+        """quantity := time | number unit? | number ('-' | 'to') number unit?"""
+        token = self._next()
+        if token.kind == 'time':
+            return _Quantity(value=token.value, unit='seconds')
+        if token.kind != 'number':
+            raise ShorthandParseError(f'Expected a number, found {token}')
+
+        quantity = _Quantity(value=token.value)
+        if allow_range and self._peek_text() in ('-', 'to') and self._peek(1) is not None and self._peek(1).kind == 'number':
+            self._position += 1
+            second = self._next().value
+            quantity = _Quantity(minimum=min(token.value, second), maximum=max(token.value, second))
+
+        # "1-min rest"
+        if self._peek_text() == '-' and self._peek_text(1) in UNITS:
+            self._position += 1
+
+        unit = self._peek_text()
+        # "400s" is usually a plural of 400 meters, not 400 seconds
+        if unit in UNITS and not (unit == 's' and (quantity.value or quantity.maximum or 0) >= METERS_THRESHOLD):
+            self._position += 1
+            (name, multiplier) = UNITS[unit]
+            quantity.unit = name
+            for attribute in ('value', 'minimum', 'maximum'):
+                number = getattr(quantity, attribute)
+                if number is not None:
+                    setattr(quantity, attribute, _normalized(number * multiplier))
+        elif unit == 's':
+            self._position += 1
+        return quantity
+
+    def _finish_quantity(self, quantity: _Quantity, default_miles: bool = False) -> _Quantity:
+        """Resolve a missing unit with the prompt's rules"""
+        if quantity.unit is None:
+            size = quantity.value if quantity.value is not None else quantity.maximum
+            if size is not None and size >= METERS_THRESHOLD:
+                quantity.unit = 'meters'
+            elif default_miles or size is not None:
+                quantity.unit = 'miles'
+        return quantity
+
+    def _parse_target(self) -> str | None:
+        """target := ('at' | '@') (time | number unit?) ('/' distance)? 'pace'?, kept as the step's notes"""
+        token = self._peek(1)
+        if self._peek_text() not in TARGETS or token is None or token.kind not in ('time', 'number'):
+            return None
+        self._position += 2
+
+        text = token.text
+        if token.kind == 'number' and self._peek_text() in UNITS:
+            text += self._next().text
+        # "6:30/mi" is a pace, not a recovery
+        if self._peek_text() == '/' and self._peek_text(1) in RACE_DISTANCES:
+            self._position += 1
+            text += '/' + self._next().text
+        if self._peek_text() == 'pace':
+            self._position += 1
+            text += ' pace'
+        return f'at {text}'
+
+    def _parse_race_pace(self) -> str | None:
+        """race pace := ('at' | '@')? distance ('/' distance)* 'pace', where 'pace' may be left out after 'at'"""
+        start = self._position
+        after_at = self._peek_text() in ('at', '@')
+        if after_at:
+            self._position += 1
+
+        distances = []
+        while True:
+            distance = self._parse_race_distance()
+            if distance is None:
+                break
+            distances.append(distance)
+            if self._peek_text() != '/':
+                break
+            # "/" also introduces a recovery, so only take it before another distance
+            self._position += 1
+            if self._parse_race_distance(peek=True) is None:
+                self._position -= 1
+                break
+
+        if len(distances) > 0:
+            if self._peek_text() == 'pace':
+                self._position += 1
+                return '/'.join(distances) + ' pace'
+            if after_at:
+                return '/'.join(distances) + ' pace'
+        self._position = start
+        return None
+
+    def _parse_race_distance(self, peek: bool = False) -> str | None:
+        """distance := number ('k' | 'km' | 'mi' | 'mile') | 'mile'"""
+        token = self._peek()
+        if token is None:
+            return None
+        if token.kind == 'number' and self._peek_text(1) in RACE_DISTANCES:
+            unit = self._peek_text(1)
+            if not peek:
+                self._position += 2
+            return f'{token.text}{unit}' if unit in ('k', 'km') else f'{token.text} {unit}'
+        if token.text in ('mi', 'mile'):
+            if not peek:
+                self._position += 1
+            return 'mile'
+        return None
+
+    def _parse_notes(self) -> str | None:
+        race_pace = self._parse_race_pace()
+        if race_pace is not None:
+            return race_pace
+        self._skip_fillers()
+        if self._peek_text() in PACES:
+            return PACES[self._next().text]
+        return None
@@ -1,6 +1,6 @@
 from typing import List, Self, TypeAlias
 
-from ..goals import AbstractWorkoutStepGoal, WorkoutStepGoals
+from ..goals import EMPTY_GOALS, AbstractWorkoutStepGoal, WorkoutStepGoals
 from ..object import WorkoutObject
 from ..utilities import collection_is_similar
 
@@ -9,9 +9,9 @@ OptionalGoals: TypeAlias =  List[AbstractWorkoutStepGoal] | WorkoutStepGoals | N
 
 class AbstractWorkoutStep(WorkoutObject):
 
-    def __init__(self, value, minimum=None, maximum=None, notes: str | None = None, goals: OptionalGoals = None):
-        super().__init__()
+    __slots__ = ('value', 'minimum', 'maximum', 'notes', 'goals')
 
+    def __init__(self, value, minimum=None, maximum=None, notes: str | None = None, goals: OptionalGoals = None):
         if value is None:
             if maximum is not None:
                 if minimum is not None:
@@ -32,6 +32,9 @@ class AbstractWorkoutStep(WorkoutObject):
         self.notes = notes
         if isinstance(goals, WorkoutStepGoals):
             self.goals = goals
+        elif not goals:
+            # Most steps have no goals, and they all share the same empty set
+            self.goals = EMPTY_GOALS
         else:
             self.goals = WorkoutStepGoals.from_list(goals)
         # Goals should be a structure because there can only be one of each type
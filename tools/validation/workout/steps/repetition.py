@@ -7,6 +7,8 @@ from ..utilities import collection_is_similar
 
 class RepetitionStep(AbstractWorkoutStep):
 
+    __slots__ = ('steps',)
+
     def __init__(self, value, minimum=None, maximum=None, steps: list[AbstractWorkoutStep] = [], notes: str | None = None, goals: list[AbstractWorkoutStepGoal] | None = None):
         super().__init__(value=value, minimum=minimum, maximum=maximum, notes=notes, goals=goals)
 
@@ -6,6 +6,8 @@ from ..utilities import compress_values, values_are_compressible
 
 class WorkoutStep(AbstractWorkoutStep):
 
+    __slots__ = ('unit',)
+
     def __init__(self, value=None, minimum=None, maximum=None, unit: str = 'meters', goals: OptionalGoals = None, notes: str | None = None):
         super().__init__(value=value, minimum=minimum, maximum=maximum, goals=goals, notes=notes)
         self.unit = unit
@@ -72,17 +74,17 @@ class WorkoutStep(AbstractWorkoutStep):
 # different warnings, etc.
 
 class CoolDownWorkoutStep(WorkoutStep):
-    pass
+    __slots__ = ()
 
 class RecoverWorkoutStep(WorkoutStep):
-    pass
+    __slots__ = ()
 
 class RestWorkoutStep(WorkoutStep):
-    pass
+    __slots__ = ()
 
 class RunWorkoutStep(WorkoutStep):
-    pass
+    __slots__ = ()
 
 class WarmUpWorkoutStep(WorkoutStep):
-    pass
+    __slots__ = ()
 
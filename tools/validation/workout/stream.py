@@ -0,0 +1,199 @@
+import json
+import re
+
+from typing import List
+
+from .constants import keys as KEYS
+from .constants import types as TYPES
+from .exceptions import InvalidTypeError, InvalidWorkoutPrefixError
+from .json import WorkoutDecoder
+from .repair import repair_json
+from .steps import AbstractWorkoutStep
+from .workout import Workout
+
+
+# WorkoutDecoder.decode strips backticks from both ends and then lets the JSON
+# decoder skip whitespace. That is exactly what may surround the JSON value.
+_LEADING = re.compile(r'`*\s*')
+_TRAILING = re.compile(r'\s*`*')
+
+# The top-level object announces its type first most of the time
+_TOP_LEVEL_TYPE = re.compile(r'\{\s*"' + KEYS.TYPE + r'"\s*:\s*"([^"\\]*)"')
+
+
+class IncrementalWorkoutDecoder(object):
+    """
+    Decode a workout while the LLM is still generating it.
+
+    Feed the token chunks in order. Each call to feed returns the steps and
+    repetitions whose closing brace arrived in that chunk, innermost first.
+    Once the stream finishes, close returns the same Workout that
+    WorkoutDecoder.decode would return for the full text.
+
+    As soon as the text can no longer become a valid workout (a top-level
+    value that is not an object or array, an unknown step type, ...) feed
+    raises InvalidWorkoutPrefixError so the caller can cancel the stream and
+    stop paying for tokens.
+
+    When the decoder repairs (the default), the stream gets the same repairs
+    as decode_with_repairs: prose around the JSON value is skipped, and each
+    step is repaired on its own before it is emitted. Text that is too broken
+    to repair piece by piece is buffered and left to close. With
+    WorkoutDecoder(repair=False), any text around the value is rejected.
+    """
+
+    def __init__(self, decoder: WorkoutDecoder | None = None):
+        self.decoder = decoder if decoder is not None else WorkoutDecoder()
+        self.text = ''
+
+        self._position = 0       # Next character to scan
+        self._start = None       # Index of the top-level '{' or '['
+        self._end = None         # Index just past the top-level value
+        self._stack = []         # (character, index) of the open containers
+        self._in_string = False
+        self._escape = False
+        self._buffering = False  # Stop scanning and leave everything to close
+
+    def feed(self, chunk: str) -> List[AbstractWorkoutStep]:
+        """Add a chunk of text and return the steps completed by it"""
+        self.text += chunk
+        completed = []
+        if self._buffering:
+            return completed
+
+        text = self.text
+        while self._position < len(text) and not self._buffering:
+            position = self._position
+            character = text[position]
+            self._position += 1
+
+            if self._start is None:
+                if character == '{' or character == '[':
+                    self._check_leading(position)
+                    self._start = position
+                    self._stack.append((character, position))
+                else:
+                    self._check_leading(position + 1)
+                continue
+
+            if self._end is not None:
+                self._check_trailing()
+                if self.decoder.repair:
+                    self._buffering = True
+                continue
+
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif character == '\\':
+                    self._escape = True
+                elif character == '"':
+                    self._in_string = False
+                continue
+
+            if character == '"':
+                self._in_string = True
+                self._check_array_element(position)
+            elif character == '{' or character == '[':
+                self._check_array_element(position)
+                self._stack.append((character, position))
+            elif character == '}' or character == ']':
+                self._close_container(character, position, completed)
+            elif not character.isspace() and character not in ',:':
+                self._check_array_element(position)
+
+        if not self._buffering and self._start is not None and self._end is None and len(self._stack) == 1:
+            self._check_top_level_type()
+
+        return completed
+
+    def close(self) -> Workout:
+        """Finish decoding. The result is identical to WorkoutDecoder.decode."""
+        return self.decoder.decode(self.text)
+
+    @property
+    def is_complete(self) -> bool:
+        """True once the top-level JSON value has been closed"""
+        return self._end is not None
+
+    # ------------------------------
+    # SCANNING
+    # ------------------------------
+
+    def _close_container(self, character: str, position: int, completed: List[AbstractWorkoutStep]):
+        (opening, start) = self._stack.pop()
+        if (opening == '{') != (character == '}'):
+            if self.decoder.repair:
+                # repair_json balances the brackets, but only the whole text
+                self._buffering = True
+                return
+            raise InvalidWorkoutPrefixError(f"mismatched '{character}'", position)
+
+        if len(self._stack) == 0:
+            self._end = position + 1
+            return
+
+        if opening == '{':
+            step = self._decode_fragment(start, position + 1)
+            if isinstance(step, AbstractWorkoutStep):
+                completed.append(step)
+
+    def _decode_fragment(self, start: int, end: int):
+        """Decode a complete nested object with the usual hooks and repairs"""
+        fragment = self.text[start:end]
+        try:
+            return self._loads(fragment, start)
+        except json.JSONDecodeError as e:
+            if not self.decoder.repair:
+                raise InvalidWorkoutPrefixError(str(e), start) from e
+
+        (repaired, _) = repair_json(fragment)
+        try:
+            return self._loads(repaired, start)
+        except json.JSONDecodeError:
+            # Too broken to fix on its own. The whole text may still be.
+            self._buffering = True
+            return None
+
+    def _loads(self, fragment: str, start: int):
+        try:
+            return json.loads(fragment, object_hook=self.decoder.object_hook)
+        except json.JSONDecodeError:
+            raise
+        except (InvalidTypeError, TypeError, ValueError) as e:
+            # The full document contains this object, so it would fail too
+            raise InvalidWorkoutPrefixError(str(e), start) from e
+
+    # ------------------------------
+    # VALIDATION
+    # ------------------------------
+
+    def _check_leading(self, end: int):
+        if self.decoder.repair:
+            return
+        if _LEADING.fullmatch(self.text, 0, end) is None:
+            raise InvalidWorkoutPrefixError('text before the JSON value', 0)
+
+    def _check_trailing(self):
+        if self.decoder.repair:
+            return
+        if _TRAILING.fullmatch(self.text, self._end) is None:
+            raise InvalidWorkoutPrefixError('text after the JSON value', self._end)
+
+    def _check_array_element(self, position: int):
+        """Workout arrays only ever contain steps, so elements must be objects"""
+        if len(self._stack) == 1 and self._stack[0][0] == '[' and self.text[position] != '{':
+            raise InvalidWorkoutPrefixError('array elements must be step objects', position)
+
+    def _check_top_level_type(self):
+        if self._stack[0][0] != '{':
+            return
+
+        match = _TOP_LEVEL_TYPE.match(self.text, self._start)
+        if match is None:
+            return
+
+        # Goals on their own are never a workout
+        top_level_type = match.group(1).lower()
+        if top_level_type in TYPES.STEP_GOALS.keys():
+            raise InvalidWorkoutPrefixError(f'top-level type "{top_level_type}" is not a workout or a step', self._start)
@@ -0,0 +1,197 @@
+from bisect import bisect_right
+from typing import Iterable, Iterator, List, Tuple
+
+from .shorthand import METERS_PER_MILE, UNITS
+from .steps import AbstractWorkoutStep, RepetitionStep
+from .workout import Workout
+
+
+TIME = 'time'
+DISTANCE = 'distance'
+
+
+def repetitions(step: RepetitionStep) -> int:
+    """How many times the steps of a repetition run. No value means once."""
+    return int(step.value) if step.value is not None else 1
+
+
+def expand(steps: Iterable[AbstractWorkoutStep]) -> Iterator[Tuple[AbstractWorkoutStep, Tuple[int, ...]]]:
+    """
+    The steps in the order they're performed, with repetitions expanded, as
+    (step, laps). laps has the iteration of each enclosing repetition,
+    outermost first. Nothing is copied, so a 50x repetition costs no more
+    than a single one.
+    """
+    stack = [(iter(steps), None, 0, 0)]
+    laps = []
+    while len(stack) > 0:
+        (children, repetition, lap, count) = stack[-1]
+        step = next(children, None)
+        if step is None:
+            stack.pop()
+            if repetition is not None:
+                laps.pop()
+                if lap + 1 < count:
+                    stack.append((iter(repetition.steps), repetition, lap + 1, count))
+                    laps.append(lap + 1)
+        elif isinstance(step, RepetitionStep):
+            count = repetitions(step)
+            if count > 0:
+                stack.append((iter(step.steps), step, 0, count))
+                laps.append(0)
+        else:
+            yield (step, tuple(laps))
+
+
+def measure(step: AbstractWorkoutStep, pace: float | None = None) -> Tuple[float, float]:
+    """
+    The (seconds, meters) of a plain step. Steps in seconds have no distance
+    and steps in meters have no time unless a pace (seconds per meter) is
+    given to estimate it. Steps without a value or a known unit are (0, 0).
+    """
+    (unit, multiplier) = UNITS.get((step.unit or '').strip().lower(), (None, None))
+    if step.value is None or unit is None:
+        return (0.0, 0.0)
+
+    if unit == 'seconds':
+        seconds = step.value * multiplier
+        return (seconds, seconds / pace if pace else 0.0)
+    meters = step.value * multiplier * (METERS_PER_MILE if unit == 'miles' else 1)
+    return (meters * pace if pace else 0.0, meters)
+
+
+class TimelinePosition(object):
+    """
+    A step of the expanded workout: which one it is (index, counting from
+    0 in the expanded order), the iteration of each enclosing repetition,
+    where it starts and how far into it the position is.
+    """
+
+    __slots__ = ('step', 'laps', 'index', 'start_time', 'start_distance', 'offset')
+
+    def __init__(self, step: AbstractWorkoutStep, laps: Tuple[int, ...], index: int, start_time: float, start_distance: float, offset: float = 0.0):
+        self.step = step
+        self.laps = laps
+        self.index = index
+        self.start_time = start_time
+        self.start_distance = start_distance
+        self.offset = offset
+
+    def __repr__(self) -> str:
+        return f'TimelinePosition({self.index}, laps={self.laps}, start_time={self.start_time}, start_distance={self.start_distance}, offset={self.offset})'
+
+
+class _Block(object):
+    """
+    The steps of a workout or of one iteration of a repetition, with
+    prefix sums of the expanded steps, seconds and meters before each one
+    """
+
+    __slots__ = ('steps', 'blocks', 'counts', 'seconds', 'meters')
+
+    def __init__(self, steps: List[AbstractWorkoutStep], pace: float | None):
+        self.steps = steps
+        self.blocks = []
+        self.counts = [0]
+        self.seconds = [0.0]
+        self.meters = [0.0]
+        for step in steps:
+            if isinstance(step, RepetitionStep):
+                block = _Block(step.steps, pace)
+                times = max(repetitions(step), 0)
+                (count, seconds, meters) = (times * block.count, times * block.duration, times * block.distance)
+            else:
+                block = None
+                count = 1
+                (seconds, meters) = measure(step, pace)
+            self.blocks.append(block)
+            self.counts.append(self.counts[-1] + count)
+            self.seconds.append(self.seconds[-1] + seconds)
+            self.meters.append(self.meters[-1] + meters)
+
+    @property
+    def count(self) -> int:
+        return self.counts[-1]
+
+    @property
+    def duration(self) -> float:
+        return self.seconds[-1]
+
+    @property
+    def distance(self) -> float:
+        return self.meters[-1]
+
+
+class Timeline(object):
+    """
+    Looks up the step that's active at a time or distance into a workout.
+
+    Every list of steps gets prefix sums of its seconds and meters, with
+    each repetition counted as its value times its steps. A lookup bisects
+    the top level, then divides its way into repetitions and bisects again,
+    so it takes O(depth * log(steps)) and the index is the size of the
+    workout as written, never the expanded one.
+    """
+
+    def __init__(self, workout: Workout | List[AbstractWorkoutStep], pace: float | None = None):
+        self.steps = workout.steps if isinstance(workout, Workout) else workout
+        self.pace = pace
+        self._root = _Block(self.steps or [], pace)
+
+    def __len__(self) -> int:
+        """The number of steps once expanded"""
+        return self._root.count
+
+    def __iter__(self) -> Iterator[TimelinePosition]:
+        (seconds, meters) = (0.0, 0.0)
+        for (index, (step, laps)) in enumerate(expand(self.steps or [])):
+            yield TimelinePosition(step, laps, index, seconds, meters)
+            (step_seconds, step_meters) = measure(step, self.pace)
+            seconds += step_seconds
+            meters += step_meters
+
+    @property
+    def duration(self) -> float:
+        return self._root.duration
+
+    @property
+    def distance(self) -> float:
+        return self._root.distance
+
+    def at_time(self, seconds: float) -> TimelinePosition | None:
+        """The step running this many seconds in, None outside the workout"""
+        return self._find(TIME, seconds)
+
+    def at_distance(self, meters: float) -> TimelinePosition | None:
+        """The step running this many meters in, None outside the workout"""
+        return self._find(DISTANCE, meters)
+
+    def _find(self, axis: str, target: float) -> TimelinePosition | None:
+        block = self._root
+        sums = block.seconds if axis == TIME else block.meters
+        if not 0 <= target < sums[-1]:
+            return None
+
+        (index, seconds, meters) = (0, 0.0, 0.0)
+        laps = []
+        while True:
+            sums = block.seconds if axis == TIME else block.meters
+            # Right, so steps that take no time (or distance) are skipped
+            position = min(max(bisect_right(sums, target) - 1, 0), len(block.steps) - 1)
+            index += block.counts[position]
+            seconds += block.seconds[position]
+            meters += block.meters[position]
+            target -= sums[position]
+
+            inner = block.blocks[position]
+            if inner is None:
+                return TimelinePosition(block.steps[position], tuple(laps), index, seconds, meters, target)
+
+            period = inner.duration if axis == TIME else inner.distance
+            lap = min(int(target // period), repetitions(block.steps[position]) - 1)
+            laps.append(lap)
+            index += lap * inner.count
+            seconds += lap * inner.duration
+            meters += lap * inner.distance
+            target -= lap * period
+            block = inner
@@ -9,6 +9,8 @@ class Workout(object):
     The first step may be repetition, which makes the workout seem useless,
     but it's not!
     """
+
+    __slots__ = ('name', 'steps', 'notes')
     
     def __init__(self, name: str | None = None, steps: list[AbstractWorkoutStep] | None = [], notes: str | None = None ):
         self.name = name